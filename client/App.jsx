@@ -7,6 +7,7 @@ import { TooltipProvider } from "@/components/ui/tooltip";
 import { QueryClient, QueryClientProvider } from "@tanstack/react-query";
 import { BrowserRouter, Routes, Route } from "react-router-dom";
 import { useAuth } from "@/hooks/use-auth";
+import { useDefectEvents } from "@/lib/api";
 import { ProtectedRoute } from "@/components/ProtectedRoute";
 import Index from "./pages/Index";
 import Defects from "./pages/Defects";
@@ -19,7 +20,10 @@ import NotFound from "./pages/NotFound";
 const queryClient = new QueryClient();
 
 const AppRoutes = () => {
-  const { isAuthenticated, loading } = useAuth();
+  const { user, isAuthenticated, loading } = useAuth();
+
+  // Изменения дефектов приходят с сервера потоком событий
+  useDefectEvents(user?.token);
 
   // Если данные о статусе загрузки ещё не получены, показываем загрузку
   if (loading) {
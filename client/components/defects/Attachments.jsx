@@ -1,10 +1,10 @@
-import { useState } from "react";
+import { useEffect, useState } from "react";
 import { Button } from "@/components/ui/button";
 import { Card, CardContent, CardHeader, CardTitle } from "@/components/ui/card";
 import { Badge } from "@/components/ui/badge";
 import { Upload, File, Image, X, Download } from "lucide-react";
 import { useAuth } from "@/hooks/use-auth";
-import { useAddAttachment, useRemoveAttachment } from "@/lib/api";
+import { fetchBlob, openAttachment, useAddAttachment, useRemoveAttachment } from "@/lib/api";
 
 export function Attachments({ defectId, attachments = [], onAddAttachment, onRemoveAttachment }) {
   const [uploading, setUploading] = useState(false);
@@ -20,21 +20,13 @@ export function Attachments({ defectId, attachments = [], onAddAttachment, onRem
     
     try {
       for (const file of files) {
-        await addAttachment.mutateAsync({
+        const result = await addAttachment.mutateAsync({
           defectId,
           file
         });
         
         // Вызываем callback для обновления локального состояния
-        const attachment = {
-          id: `att_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`,
-          name: file.name,
-          size: file.size,
-          type: file.type,
-          url: URL.createObjectURL(file), // Временная ссылка для демо
-          uploadedAt: new Date().toISOString(),
-          uploadedBy: "current_user"
-        };
+        const attachment = result.attachment;
         
         onAddAttachment(attachment);
       }
@@ -97,7 +89,7 @@ export function Attachments({ defectId, attachments = [], onAddAttachment, onRem
                 <p className="mb-2 text-sm text-gray-500">
                   <span className="font-semibold">Нажмите для загрузки</span> или перетащите файлы
                 </p>
-                <p className="text-xs text-gray-500">PNG, JPG, PDF, DOC до 10MB</p>
+                <p className="text-xs text-gray-500">PNG, JPG, PDF, DOC до 100MB</p>
               </div>
               <input
                 type="file"
@@ -122,7 +114,13 @@ export function Attachments({ defectId, attachments = [], onAddAttachment, onRem
             attachments.map((attachment) => (
               <div key={attachment.id} className="flex items-center gap-3 p-3 border rounded-lg">
                 <div className="flex-shrink-0">
-                  {getFileIcon(attachment.type)}
+                  {attachment.thumbnailUrl ? (
+                    <button onClick={() => openAttachment(attachment, { preview: true })}>
+                      <Thumbnail url={attachment.thumbnailUrl} alt={attachment.name} />
+                    </button>
+                  ) : (
+                    getFileIcon(attachment.type)
+                  )}
                 </div>
                 <div className="flex-1 min-w-0">
                   <p className="text-sm font-medium truncate">{attachment.name}</p>
@@ -134,7 +132,7 @@ export function Attachments({ defectId, attachments = [], onAddAttachment, onRem
                   <Button
                     variant="outline"
                     size="sm"
-                    onClick={() => window.open(attachment.url, '_blank')}
+                    onClick={() => openAttachment(attachment)}
                   >
                     <Download className="h-4 w-4" />
                   </Button>
@@ -157,3 +155,29 @@ export function Attachments({ defectId, attachments = [], onAddAttachment, onRem
     </Card>
   );
 }
+
+// Миниатюра фото: загружается с авторизацией, ссылка на blob освобождается при размонтировании
+function Thumbnail({ url, alt }) {
+  const [src, setSrc] = useState(null);
+
+  useEffect(() => {
+    let objectUrl = null;
+    let cancelled = false;
+
+    fetchBlob(url)
+      .then(blob => {
+        if (cancelled) return;
+        objectUrl = URL.createObjectURL(blob);
+        setSrc(objectUrl);
+      })
+      .catch(() => setSrc(null));
+
+    return () => {
+      cancelled = true;
+      if (objectUrl) URL.revokeObjectURL(objectUrl);
+    };
+  }, [url]);
+
+  if (!src) return <Image className="h-4 w-4" />;
+  return <img src={src} alt={alt} className="h-12 w-12 rounded object-cover" loading="lazy" />;
+}
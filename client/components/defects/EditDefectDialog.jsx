@@ -12,7 +12,7 @@ import {
   DialogHeader,
   DialogTitle,
 } from "@/components/ui/dialog";
-import { useProjects, useEngineers, useUpdateDefect } from "@/lib/api";
+import { useDefect, useProjects, useEngineers, useUpdateDefect } from "@/lib/api";
 
 export function EditDefectDialog({ open, onOpenChange, defect }) {
   const [form, setForm] = useState({
@@ -28,6 +28,8 @@ export function EditDefectDialog({ open, onOpenChange, defect }) {
   const { data: projects } = useProjects();
   const { data: engineers } = useEngineers();
   const updateDefect = useUpdateDefect();
+  // В строке списка нет описания — полная карточка загружается при открытии
+  const { data: details } = useDefect(defect?.id, { enabled: open });
 
   // Заполняем форму данными дефекта при открытии
   useEffect(() => {
@@ -35,17 +37,17 @@ export function EditDefectDialog({ open, onOpenChange, defect }) {
       setForm({
         projectId: defect.projectId || "",
         title: defect.title || "",
-        description: defect.description || "",
+        description: details?.description || "",
         priority: defect.priority || "medium",
         assigneeId: defect.assigneeId || undefined,
         dueDate: defect.dueDate || undefined,
         status: defect.status || "new"
       });
     }
-  }, [defect, open]);
+  }, [defect, details, open]);
 
   const handleSubmit = async () => {
-    if (!form.projectId || !form.title || !defect) return;
+    if (!form.projectId || !form.title || !defect || !details) return;
     
     try {
       await updateDefect.mutateAsync({
@@ -174,7 +176,7 @@ export function EditDefectDialog({ open, onOpenChange, defect }) {
           </Button>
           <Button 
             onClick={handleSubmit} 
-            disabled={!form.projectId || !form.title || updateDefect.isLoading}
+            disabled={!form.projectId || !form.title || !details || updateDefect.isLoading}
           >
             {updateDefect.isLoading ? "Сохранение..." : "Сохранить"}
           </Button>
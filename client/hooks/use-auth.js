@@ -1,27 +1,16 @@
-import { useState, useEffect } from "react";
+import { useSyncExternalStore } from "react";
 import bcrypt from "bcryptjs"; // Импортируем bcryptjs для хэширования паролей
+import { getSession, logoutSession, saveSession, subscribeSession } from "../lib/api";
 
+// Пользователь берется из общего хранилища сессии (lib/api): все компоненты,
+// включая поток событий в App, сразу видят вход, выход и обновленный токен
 export function useAuth() {
-  const [user, setUser] = useState(null);
-  const [loading, setLoading] = useState(true);
-
-  // Загружаем данные о пользователе из localStorage
-  useEffect(() => {
-    const storedUser = localStorage.getItem("user");
-    console.log('useAuth: загружаем пользователя из localStorage:', storedUser);
-    if (storedUser) {
-      const userData = JSON.parse(storedUser);
-      console.log('useAuth: парсим пользователя:', userData);
-      setUser(userData);
-    }
-    setLoading(false);
-  }, []);
+  const user = useSyncExternalStore(subscribeSession, getSession);
 
   // Функция для логина - теперь принимает объект пользователя от сервера
   const login = (userData) => {
     console.log('useAuth: логин пользователя:', userData);
-    setUser(userData);
-    localStorage.setItem("user", JSON.stringify(userData));
+    saveSession(userData);
   };
 
   // Функция для регистрации
@@ -46,16 +35,12 @@ export function useAuth() {
       };
 
       // Сохраняем нового пользователя в localStorage
-      setUser(newUser);
-      localStorage.setItem("user", JSON.stringify(newUser));
+      saveSession(newUser);
     });
   };
 
-  // Функция для выхода
-  const logout = () => {
-    setUser(null);
-    localStorage.removeItem("user");
-  };
+  // Функция для выхода: токен отзывается на сервере
+  const logout = () => logoutSession();
 
   // Проверка на наличие роли
   const hasRole = (role) => {
@@ -71,7 +56,7 @@ export function useAuth() {
   
   return {
     user,
-    loading,
+    loading: false,
     login,
     logout,
     hasRole,
@@ -1,23 +1,160 @@
+import { useEffect } from "react";
 import { useQuery, useMutation, useQueryClient } from "@tanstack/react-query";
 
 const API_URL = "http://localhost:8080"; // Убедитесь, что сервер работает на этом порту
 
+// Сессия: пользователь с токеном доступа в localStorage ("user").
+// Токен живет AUTH_TOKEN_TTL (по умолчанию 12 ч); за REFRESH_BEFORE_MS до истечения он обновляется
+// через /api/token/refresh — по таймеру и перед запросом, если таймер не успел.
+// Ответ 401, истекший или отсутствующий токен завершают сессию и ведут на /login.
+// Сессия — общее хранилище: useAuth подписывается на него и видит вход, выход и новый токен.
+const SESSION_KEY = "user";
+const REFRESH_BEFORE_MS = 5 * 60_000;
+
+const readStoredSession = () => JSON.parse(localStorage.getItem(SESSION_KEY) || "null");
+
+let currentSession = readStoredSession();
+const sessionListeners = new Set();
+let refreshing = null;
+let refreshTimer = null;
+
+export function getSession() {
+  return currentSession;
+}
+
+export function subscribeSession(listener) {
+  sessionListeners.add(listener);
+  return () => sessionListeners.delete(listener);
+}
+
+function setSession(session) {
+  currentSession = session;
+  sessionListeners.forEach((listener) => listener());
+}
+
+const expiresAt = (session) => (session?.tokenExpiresAt ? Date.parse(session.tokenExpiresAt) : Infinity);
+
+// Сессия без токена (сохранена до появления токенов) или с истекшим токеном недействительна
+export function isSessionValid(session) {
+  return Boolean(session?.token) && expiresAt(session) > Date.now();
+}
+
+function scheduleRefresh(session) {
+  clearTimeout(refreshTimer);
+  if (!isSessionValid(session) || expiresAt(session) === Infinity) return;
+
+  const delay = Math.max(expiresAt(session) - REFRESH_BEFORE_MS - Date.now(), 0);
+  refreshTimer = setTimeout(() => refreshSession().catch(() => {}), delay);
+}
+
+export function saveSession(session) {
+  localStorage.setItem(SESSION_KEY, JSON.stringify(session));
+  setSession(session);
+  scheduleRefresh(session);
+}
+
+export function clearSession() {
+  clearTimeout(refreshTimer);
+  localStorage.removeItem(SESSION_KEY);
+  setSession(null);
+}
+
+// Сессия закончилась: данные пользователя удаляются, приложение открывает страницу входа
+export function expireSession() {
+  clearSession();
+  if (window.location.pathname !== "/login") {
+    window.location.assign("/login");
+  }
+}
+
+// Одновременные запросы ждут одного обновления: старый токен сервер отзывает
+export function refreshSession() {
+  if (!refreshing) {
+    const session = getSession();
+    refreshing = fetch(`${API_URL}/api/token/refresh`, {
+      method: "POST",
+      headers: { "Authorization": `Bearer ${session?.token}` }
+    })
+      .then(async (res) => {
+        if (!res.ok) {
+          expireSession();
+          throw new Error("Сессия истекла, войдите снова");
+        }
+        const data = await res.json();
+        const next = { ...data.user, token: data.token, tokenExpiresAt: data.expiresAt };
+        saveSession(next);
+        return next;
+      })
+      .finally(() => {
+        refreshing = null;
+      });
+  }
+  return refreshing;
+}
+
+// Выход: токен отзывается на сервере, даже если ответа не дождаться
+export async function logoutSession() {
+  const session = getSession();
+  clearSession();
+  if (!session?.token) return;
+
+  await fetch(`${API_URL}/api/logout`, {
+    method: "POST",
+    headers: { "Authorization": `Bearer ${session.token}` }
+  }).catch((error) => console.error("Ошибка при выходе:", error));
+}
+
+// fetch с токеном текущей сессии: обновляет токен перед истечением, на 401 завершает сессию
+async function authorizedFetch(url, init) {
+  let session = getSession();
+  if (session && !isSessionValid(session)) {
+    expireSession();
+    throw new Error("Сессия истекла, войдите снова");
+  }
+  if (session && expiresAt(session) - Date.now() < REFRESH_BEFORE_MS) {
+    session = await refreshSession();
+  }
+
+  const res = await fetch(`${API_URL}${url}`, {
+    ...init,
+    headers: {
+      ...(session?.token && { "Authorization": `Bearer ${session.token}` }),
+      ...init?.headers
+    }
+  });
+
+  if (res.status === 401) {
+    expireSession();
+    throw new Error("Сессия истекла, войдите снова");
+  }
+  return res;
+}
+
+// Сессия, сохраненная до перезагрузки страницы: недействительная удаляется, для остальной ставится таймер
+if (currentSession && !isSessionValid(currentSession)) {
+  clearSession();
+} else {
+  scheduleRefresh(currentSession);
+}
+
+// Вход, выход и обновление токена в другой вкладке
+window.addEventListener("storage", (event) => {
+  if (event.key !== SESSION_KEY && event.key !== null) return;
+  const session = readStoredSession();
+  setSession(session);
+  scheduleRefresh(session);
+});
+
 // Функция для отправки запросов на сервер
 export async function http(url, init) {
-  const user = JSON.parse(localStorage.getItem("user") || "null");
-  const token = user?.id;
-
-  const headers = {
-    ...(token && { "Authorization": `Bearer ${token}` }),
-    ...init?.headers
-  };
+  const headers = { ...init?.headers };
 
   // Не добавляем Content-Type для FormData, браузер сам установит multipart/form-data
   if (!(init?.body instanceof FormData)) {
     headers["Content-Type"] = "application/json";
   }
 
-  const res = await fetch(`${API_URL}${url}`, {
+  const res = await authorizedFetch(url, {
     ...init,
     headers
   });
@@ -47,7 +184,9 @@ export function useUsers() {
 export function useEngineers() {
   return useQuery({
     queryKey: ["engineers"],
-    queryFn: () => http("/api/users/engineers")
+    queryFn: () => http("/api/users/engineers"),
+    // Совпадает с Cache-Control сервера; дальше запросы проверяются по ETag
+    staleTime: 60_000
   });
 }
 
@@ -55,7 +194,8 @@ export function useEngineers() {
 export function useProjects() {
   return useQuery({
     queryKey: ["projects"],
-    queryFn: () => http("/api/projects")
+    queryFn: () => http("/api/projects"),
+    staleTime: 60_000
   });
 }
 
@@ -73,6 +213,15 @@ export function useDefects(query) {
   });
 }
 
+// Хук для получения одного дефекта со всеми полями (список отдает сокращенную проекцию)
+export function useDefect(id, { enabled = true } = {}) {
+  return useQuery({
+    queryKey: ["defect", id],
+    queryFn: () => http(`/api/defects/${id}`),
+    enabled: enabled && Boolean(id)
+  });
+}
+
 // Хук для получения статистики дефектов
 export function useStats() {
   return useQuery({
@@ -134,18 +283,10 @@ export function useDeleteDefect() {
 
 // Функция для скачивания CSV с дефектами
 export function downloadCsv() {
-  const user = JSON.parse(localStorage.getItem("user") || "null");
-  const token = user?.id;
-  
-  const url = "/api/defects/export";
   const a = document.createElement("a");
   
   // Создаем запрос с авторизацией
-  fetch(url, {
-    headers: {
-      ...(token && { "Authorization": `Bearer ${token}` })
-    }
-  })
+  authorizedFetch("/api/defects/export")
   .then(response => {
     if (!response.ok) {
       throw new Error('Ошибка при скачивании файла');
@@ -167,6 +308,31 @@ export function downloadCsv() {
   });
 }
 
+// Загружает файл с авторизацией (img и window.open не передают заголовок Authorization)
+export async function fetchBlob(url) {
+  const response = await authorizedFetch(url);
+  if (!response.ok) {
+    throw new Error('Ошибка при скачивании файла');
+  }
+  return response.blob();
+}
+
+// Открывает файл вложения во временной ссылке на blob; для фото — превью, если оно готово
+export function openAttachment(attachment, { preview = false } = {}) {
+  const url = preview && attachment.previewUrl ? attachment.previewUrl : attachment.url;
+
+  fetchBlob(url)
+    .then(blob => {
+      const objectUrl = window.URL.createObjectURL(blob);
+      window.open(objectUrl, '_blank');
+      setTimeout(() => window.URL.revokeObjectURL(objectUrl), 60_000);
+    })
+    .catch(error => {
+      console.error("Ошибка при скачивании вложения:", error);
+      alert("Ошибка при скачивании файла");
+    });
+}
+
 // Хук для обновления статуса дефекта
 export function useUpdateDefectStatus() {
   const queryClient = useQueryClient();
@@ -238,3 +404,61 @@ export function useRemoveAttachment() {
     },
   });
 }
+
+// Подписка на изменения дефектов (SSE): кэш React Query правится по событиям,
+// а не перезапрашивается по таймеру. EventSource сам переподключается и передает Last-Event-ID.
+export function useDefectEvents(token) {
+  const queryClient = useQueryClient();
+
+  useEffect(() => {
+    if (!token) return;
+
+    const source = new EventSource(`${API_URL}/api/events?access_token=${encodeURIComponent(token)}`);
+
+    const patchListItem = (id, patch) => {
+      queryClient.setQueriesData({ queryKey: ["defects"] }, (data) => data?.items && {
+        ...data,
+        items: data.items.map((d) => (d.id === id ? { ...d, ...patch(d) } : d))
+      });
+    };
+    const refreshLists = () => {
+      queryClient.invalidateQueries({ queryKey: ["defects"] });
+      queryClient.invalidateQueries({ queryKey: ["stats"] });
+    };
+
+    const handlers = {
+      created: refreshLists,
+      imported: refreshLists,
+      deleted: ({ defectId }) => {
+        queryClient.removeQueries({ queryKey: ["defect", defectId] });
+        refreshLists();
+      },
+      status: ({ defectId, status }) => {
+        patchListItem(defectId, () => ({ status }));
+        queryClient.invalidateQueries({ queryKey: ["defect", defectId] });
+        queryClient.invalidateQueries({ queryKey: ["stats"] });
+      },
+      updated: ({ defectId, changes }) => {
+        patchListItem(defectId, () => changes);
+        queryClient.invalidateQueries({ queryKey: ["defect", defectId] });
+        queryClient.invalidateQueries({ queryKey: ["stats"] });
+      },
+      comment: ({ defectId }) => {
+        patchListItem(defectId, (d) => ({ commentCount: (d.commentCount ?? 0) + 1 }));
+        queryClient.invalidateQueries({ queryKey: ["defect", defectId] });
+      },
+      attachment: ({ defectId }) => {
+        queryClient.invalidateQueries({ queryKey: ["defect", defectId] });
+        queryClient.invalidateQueries({ queryKey: ["defects"] });
+      },
+      // Пропущенные события восстановить нельзя — перезапрашиваем все
+      reset: () => queryClient.invalidateQueries(),
+    };
+
+    for (const [type, handle] of Object.entries(handlers)) {
+      source.addEventListener(type, (e) => handle(JSON.parse(e.data)));
+    }
+
+    return () => source.close();
+  }, [token, queryClient]);
+}
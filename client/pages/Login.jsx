@@ -43,8 +43,9 @@ export default function Login() {
 
       if (response.ok) {
         // Успешный вход
-        login(data.user);  // Используем хук для установки пользователя
-        localStorage.setItem("user", JSON.stringify(data.user)); // Сохраняем пользователя в localStorage
+        // Сохраняем пользователя вместе с подписанным токеном доступа
+        const userWithToken = { ...data.user, token: data.token, tokenExpiresAt: data.expiresAt };
+        login(userWithToken);  // Используем хук для установки пользователя
         navigate(from, { replace: true }); // Перенаправление на нужную страницу
       } else {
         setError(data.message || "Ошибка авторизации");
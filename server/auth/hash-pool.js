@@ -0,0 +1,153 @@
+import os from 'os';
+import { Worker } from 'worker_threads';
+import { Histogram } from '../metrics/histogram.js';
+
+// Пул потоков для bcrypt: хэширование и проверка паролей не блокируют цикл событий.
+// Очередь ограничена; при переполнении операция отклоняется с кодом HASH_POOL_SATURATED.
+
+const WORKER_URL = new URL('./hash-worker.js', import.meta.url);
+
+export class HashPoolSaturatedError extends Error {
+  constructor() {
+    super("Пул хэширования перегружен");
+    this.code = "HASH_POOL_SATURATED";
+  }
+}
+
+export class HashPool {
+  constructor({ size = Math.max(1, Math.min(4, os.cpus().length - 1)), maxQueue = 64 } = {}) {
+    this.size = size;
+    this.maxQueue = maxQueue;
+    this.workers = [];
+    this.idle = [];
+    this.queue = [];
+    this.tasks = new Map();
+    this.nextTaskId = 1;
+    this.backend = null;
+    this.rejected = 0;
+    this.latency = { hash: new Histogram(), compare: new Histogram() };
+
+    for (let i = 0; i < size; i++) {
+      this.spawn();
+    }
+  }
+
+  spawn() {
+    const worker = new Worker(WORKER_URL);
+    worker.currentTask = null;
+
+    worker.on("message", (message) => {
+      if (message.type === "ready") {
+        this.backend = message.backend;
+        return;
+      }
+      this.finish(worker, message.error ? new Error(message.error) : null, message.result);
+    });
+
+    // Упавший поток заменяется новым, его текущая задача завершается ошибкой
+    worker.on("error", (err) => {
+      console.error("Ошибка в потоке хэширования:", err.message);
+      this.replace(worker, err);
+    });
+    worker.on("exit", (code) => {
+      if (code !== 0 && !this.closed) {
+        this.replace(worker, new Error(`Поток хэширования завершился с кодом ${code}`));
+      }
+    });
+
+    this.workers.push(worker);
+    this.idle.push(worker);
+  }
+
+  replace(worker, err) {
+    if (!this.workers.includes(worker)) return;
+
+    this.workers = this.workers.filter((w) => w !== worker);
+    this.idle = this.idle.filter((w) => w !== worker);
+    if (worker.currentTask) {
+      this.settle(worker.currentTask, err);
+    }
+    if (!this.closed) {
+      this.spawn();
+      this.drain();
+    }
+  }
+
+  hash(password, rounds) {
+    return this.submit("hash", [password, rounds]);
+  }
+
+  compare(password, hash) {
+    return this.submit("compare", [password, hash]);
+  }
+
+  submit(op, args) {
+    return new Promise((resolve, reject) => {
+      if (this.closed) {
+        return reject(new Error("Пул хэширования закрыт"));
+      }
+
+      const task = { id: this.nextTaskId++, op, args, resolve, reject, startedAt: performance.now() };
+
+      if (this.idle.length === 0 && this.queue.length >= this.maxQueue) {
+        this.rejected++;
+        return reject(new HashPoolSaturatedError());
+      }
+
+      this.queue.push(task);
+      this.drain();
+    });
+  }
+
+  drain() {
+    while (this.idle.length > 0 && this.queue.length > 0) {
+      const worker = this.idle.pop();
+      const task = this.queue.shift();
+      worker.currentTask = task;
+      worker.postMessage({ id: task.id, op: task.op, args: task.args });
+    }
+  }
+
+  finish(worker, err, result) {
+    const task = worker.currentTask;
+    worker.currentTask = null;
+    this.idle.push(worker);
+
+    if (task) {
+      this.settle(task, err, result);
+    }
+    this.drain();
+  }
+
+  settle(task, err, result) {
+    this.latency[task.op].observe(performance.now() - task.startedAt);
+    if (err) {
+      task.reject(err);
+    } else {
+      task.resolve(result);
+    }
+  }
+
+  stats() {
+    return {
+      backend: this.backend,
+      size: this.size,
+      busy: this.workers.length - this.idle.length,
+      queued: this.queue.length,
+      maxQueue: this.maxQueue,
+      rejected: this.rejected,
+      latency: {
+        hash: this.latency.hash.snapshot(),
+        compare: this.latency.compare.snapshot(),
+      },
+    };
+  }
+
+  async close() {
+    this.closed = true;
+    for (const task of this.queue.splice(0)) {
+      task.reject(new Error("Пул хэширования закрыт"));
+    }
+    await Promise.all(this.workers.map((worker) => worker.terminate()));
+  }
+}
@@ -0,0 +1,28 @@
+// Поток пула хэширования паролей.
+// Использует нативный bcrypt, если он собран, иначе bcryptjs; хэши совместимы.
+
+import { parentPort } from 'worker_threads';
+
+const loadBackend = async () => {
+  try {
+    const native = await import('bcrypt');
+    return { name: "bcrypt", impl: native.default ?? native };
+  } catch {
+    const js = await import('bcryptjs');
+    return { name: "bcryptjs", impl: js.default ?? js };
+  }
+};
+
+const backend = await loadBackend();
+parentPort.postMessage({ type: "ready", backend: backend.name });
+
+parentPort.on("message", async ({ id, op, args }) => {
+  try {
+    const result = op === "hash"
+      ? await backend.impl.hash(args[0], args[1])
+      : await backend.impl.compare(args[0], args[1]);
+    parentPort.postMessage({ id, result });
+  } catch (err) {
+    parentPort.postMessage({ id, error: err.message });
+  }
+});
@@ -0,0 +1,95 @@
+// Список отозванных токенов.
+// Отзыв конкретного токена хранится по jti, отзыв всех токенов пользователя —
+// как момент времени, до которого выданные токены недействительны.
+// Записи хранятся в памяти и дублируются в таблицу revoked_tokens, чтобы пережить перезапуск.
+// revokeToken и revokeUser возвращают запись, чтобы ее можно было передать другим процессам (remember).
+
+export class RevocationList {
+  constructor(db) {
+    this.db = db;
+    this.tokens = new Map();
+    this.users = new Map();
+  }
+
+  load(callback) {
+    const now = Date.now();
+
+    this.db.run("DELETE FROM revoked_tokens WHERE expiresAt <= ?", [now], (err) => {
+      if (err) return callback(err);
+
+      this.db.all("SELECT id, revokedAt, expiresAt FROM revoked_tokens", (err, rows) => {
+        if (err) return callback(err);
+
+        for (const row of rows) {
+          this.remember(row.id, row.revokedAt, row.expiresAt);
+        }
+        callback(null, rows.length);
+      });
+    });
+  }
+
+  remember(id, revokedAt, expiresAt) {
+    const separator = id.indexOf(":");
+    const kind = id.slice(0, separator);
+    const key = id.slice(separator + 1);
+    if (kind === "jti") {
+      this.tokens.set(key, expiresAt);
+    } else if (kind === "user") {
+      this.users.set(key, { revokedAt, expiresAt });
+    }
+  }
+
+  persist(id, revokedAt, expiresAt) {
+    this.db.run(
+      "INSERT OR REPLACE INTO revoked_tokens (id, revokedAt, expiresAt) VALUES (?, ?, ?)",
+      [id, revokedAt, expiresAt],
+      (err) => {
+        if (err) {
+          console.error("Ошибка при сохранении отзыва токена:", err.message);
+        }
+      }
+    );
+  }
+
+  // Отзыв одного токена до истечения его срока действия
+  revokeToken(payload) {
+    const id = `jti:${payload.jti}`;
+    const expiresAt = payload.exp * 1000;
+    const revokedAt = Date.now();
+    this.remember(id, revokedAt, expiresAt);
+    this.persist(id, revokedAt, expiresAt);
+    return { id, revokedAt, expiresAt };
+  }
+
+  // Отзыв всех выданных пользователю токенов (смена роли, удаление).
+  // Запись нужна не дольше максимального срока жизни токена.
+  revokeUser(userId, maxTokenTtlSeconds) {
+    const id = `user:${userId}`;
+    const revokedAt = Date.now();
+    const expiresAt = revokedAt + maxTokenTtlSeconds * 1000;
+    this.remember(id, revokedAt, expiresAt);
+    this.persist(id, revokedAt, expiresAt);
+    return { id, revokedAt, expiresAt };
+  }
+
+  isRevoked(payload) {
+    const now = Date.now();
+
+    const tokenExpiresAt = this.tokens.get(payload.jti);
+    if (tokenExpiresAt !== undefined) {
+      if (tokenExpiresAt > now) return true;
+      this.tokens.delete(payload.jti);
+    }
+
+    const userRevocation = this.users.get(String(payload.sub));
+    if (userRevocation) {
+      if (userRevocation.expiresAt <= now) {
+        this.users.delete(String(payload.sub));
+      } else if (payload.iat * 1000 <= userRevocation.revokedAt) {
+        return true;
+      }
+    }
+
+    return false;
+  }
+}
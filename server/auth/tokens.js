@@ -0,0 +1,64 @@
+import crypto from 'crypto';
+
+// Подписанные токены в формате JWT (HS256).
+// Токен несет id, email и роль пользователя, поэтому проверка не требует обращения к базе.
+
+const HEADER = Buffer.from(JSON.stringify({ alg: "HS256", typ: "JWT" })).toString("base64url");
+
+const sign = (data, secret) => crypto.createHmac("sha256", secret).update(data).digest();
+
+export function signToken(user, { secret, ttlSeconds }) {
+  // iat с дробной частью: отзыв токенов пользователя сравнивается с точностью до миллисекунды
+  const iat = Date.now() / 1000;
+  const payload = {
+    sub: user.id,
+    email: user.email,
+    role: user.role,
+    iat,
+    exp: Math.floor(iat) + ttlSeconds,
+    jti: crypto.randomBytes(12).toString("base64url"),
+  };
+
+  const body = `${HEADER}.${Buffer.from(JSON.stringify(payload)).toString("base64url")}`;
+  const signature = sign(body, secret).toString("base64url");
+
+  return { token: `${body}.${signature}`, payload };
+}
+
+// Возвращает payload действительного токена или null.
+// Подпись сравнивается за постоянное время.
+export function verifyToken(token, { secret }) {
+  if (typeof token !== "string") return null;
+
+  const parts = token.split(".");
+  if (parts.length !== 3 || parts[0] !== HEADER) return null;
+
+  const expected = sign(`${parts[0]}.${parts[1]}`, secret);
+  const actual = Buffer.from(parts[2], "base64url");
+  if (actual.length !== expected.length || !crypto.timingSafeEqual(actual, expected)) {
+    return null;
+  }
+
+  let payload;
+  try {
+    payload = JSON.parse(Buffer.from(parts[1], "base64url").toString("utf8"));
+  } catch {
+    return null;
+  }
+
+  if (!payload || typeof payload.exp !== "number" || payload.exp * 1000 <= Date.now()) {
+    return null;
+  }
+
+  return payload;
+}
+
+// Секрет берется из AUTH_SECRET; без него генерируется случайный на время жизни процесса
+export function resolveTokenSecret() {
+  if (process.env.AUTH_SECRET) {
+    return process.env.AUTH_SECRET;
+  }
+
+  console.warn("AUTH_SECRET не задан: используется временный секрет, токены станут недействительны после перезапуска");
+  return crypto.randomBytes(32).toString("hex");
+}
@@ -0,0 +1,46 @@
+import cluster from 'cluster';
+
+// Канал инвалидации кэшей между процессами кластера.
+// Каждый процесс держит свои кэши (сессии, отзывы токенов), поэтому изменение,
+// сделанное в одном процессе, рассылается остальным через IPC основного процесса.
+// Вне кластера publish ничего не делает: локальный кэш уже обновлен вызывающим кодом.
+
+const CHANNEL = "cache:invalidate";
+
+const handlers = new Set();
+let listening = false;
+
+// Отправить событие остальным процессам
+export function publishInvalidation(event) {
+  if (!cluster.isWorker || !process.connected) return;
+  process.send({ channel: CHANNEL, event });
+}
+
+// Подписаться на события из других процессов
+export function onInvalidation(handler) {
+  handlers.add(handler);
+
+  if (cluster.isWorker && !listening) {
+    listening = true;
+    process.on("message", (message) => {
+      if (message?.channel !== CHANNEL) return;
+      for (const h of handlers) {
+        h(message.event);
+      }
+    });
+  }
+
+  return () => handlers.delete(handler);
+}
+
+// В основном процессе: пересылает событие всем процессам, кроме отправителя
+export function relayInvalidations(source, message) {
+  if (message?.channel !== CHANNEL) return false;
+
+  for (const worker of Object.values(cluster.workers)) {
+    if (worker && worker !== source && worker.isConnected()) {
+      worker.send(message);
+    }
+  }
+  return true;
+}
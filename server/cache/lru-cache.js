@@ -0,0 +1,81 @@
+// Ограниченный по размеру LRU-кэш с временем жизни записей.
+// Map хранит ключи в порядке вставки: первый ключ — самый давно использованный.
+
+export class LruCache {
+  constructor({ max = 1000, ttlMs = 60_000, onEvict } = {}) {
+    this.max = max;
+    this.ttlMs = ttlMs;
+    this.onEvict = onEvict;
+    this.entries = new Map();
+    this.hits = 0;
+    this.misses = 0;
+    this.evictions = 0;
+  }
+
+  // Возвращает undefined при промахе; null — допустимое сохраненное значение
+  get(key) {
+    const entry = this.entries.get(key);
+
+    if (!entry) {
+      this.misses++;
+      return undefined;
+    }
+
+    if (entry.expiresAt <= Date.now()) {
+      this.remove(key, entry);
+      this.misses++;
+      return undefined;
+    }
+
+    // Переносим в конец как недавно использованный
+    this.entries.delete(key);
+    this.entries.set(key, entry);
+    this.hits++;
+    return entry.value;
+  }
+
+  set(key, value, ttlMs = this.ttlMs) {
+    const existing = this.entries.get(key);
+    if (existing) {
+      this.remove(key, existing);
+    }
+
+    this.entries.set(key, { value, expiresAt: Date.now() + ttlMs });
+
+    while (this.entries.size > this.max) {
+      const [oldestKey, oldest] = this.entries.entries().next().value;
+      this.remove(oldestKey, oldest);
+      this.evictions++;
+    }
+  }
+
+  delete(key) {
+    const entry = this.entries.get(key);
+    if (entry) {
+      this.remove(key, entry);
+    }
+  }
+
+  clear() {
+    for (const [key, entry] of this.entries) {
+      this.remove(key, entry);
+    }
+  }
+
+  remove(key, entry) {
+    this.entries.delete(key);
+    this.onEvict?.(key, entry.value);
+  }
+
+  stats() {
+    const lookups = this.hits + this.misses;
+    return {
+      size: this.entries.size,
+      max: this.max,
+      hits: this.hits,
+      misses: this.misses,
+      evictions: this.evictions,
+      hitRatio: lookups > 0 ? this.hits / lookups : 0,
+    };
+  }
+}
@@ -0,0 +1,145 @@
+import { newId } from '../routes/utils.js';
+import { readCacheVersion } from '../db/cache-versions.js';
+
+// Каталог проектов в памяти.
+// Проекты меняются редко, поэтому они загружаются один раз, stages разбираются из JSON
+// заранее, а список для /api/projects хранится готовым буфером вместе с ETag.
+// Создание и изменение пишут в SQLite и сразу перезагружают каталог (write-through);
+// остальные процессы кластера перезагружают его по событию из канала инвалидации.
+
+const isIsoDate = (value) => typeof value === "string" && !Number.isNaN(Date.parse(value));
+
+// Проверка данных проекта; partial — для изменения (все поля необязательны).
+// Возвращает текст ошибки или null.
+export function validateProjectInput(input, { partial = false } = {}) {
+  if (!input || typeof input !== "object" || Array.isArray(input)) {
+    return "Ожидается объект проекта";
+  }
+
+  for (const field of ["name", "code", "location"]) {
+    const value = input[field];
+    if (value === undefined && partial) continue;
+    if (typeof value !== "string" || !value.trim()) {
+      return "name, code и location обязательны";
+    }
+  }
+
+  if (input.stages !== undefined) {
+    if (!Array.isArray(input.stages)) {
+      return "stages должен быть массивом";
+    }
+    for (const stage of input.stages) {
+      if (!stage || typeof stage.name !== "string" || !stage.name.trim()) {
+        return "У каждого этапа должно быть название";
+      }
+      if ((stage.startDate && !isIsoDate(stage.startDate)) || (stage.endDate && !isIsoDate(stage.endDate))) {
+        return "Недопустимая дата этапа";
+      }
+    }
+  }
+
+  return null;
+}
+
+const normalizeStages = (stages = []) => stages.map((stage) => ({
+  id: stage.id || newId("s"),
+  name: stage.name.trim(),
+  ...(stage.startDate && { startDate: stage.startDate }),
+  ...(stage.endDate && { endDate: stage.endDate }),
+}));
+
+export class ProjectCatalog {
+  constructor(db) {
+    this.db = db;
+    this.projects = new Map();
+    this.body = Buffer.from("[]");
+    this.version = null;
+    this.loadSequence = 0;
+    this.readyPromise = new Promise((resolve) => {
+      this.resolveReady = resolve;
+    });
+  }
+
+  // Промис первой успешной загрузки; загрузку запускает код старта сервера
+  ready() {
+    return this.readyPromise;
+  }
+
+  get etag() {
+    return `W/"projects-${this.version}"`;
+  }
+
+  has(id) {
+    return this.projects.has(id);
+  }
+
+  get(id) {
+    return this.projects.get(id);
+  }
+
+  // Загрузка из базы; результат более ранней параллельной загрузки отбрасывается
+  load(callback = () => {}) {
+    const sequence = ++this.loadSequence;
+
+    readCacheVersion(this.db, "projects", (err, version) => {
+      if (err) return callback(err);
+
+      this.db.all("SELECT * FROM projects ORDER BY rowid", (err, rows) => {
+        if (err) return callback(err);
+        if (sequence !== this.loadSequence) return callback(null);
+
+        const list = rows.map((project) => ({ ...project, stages: JSON.parse(project.stages) }));
+        this.projects = new Map(list.map((project) => [project.id, project]));
+        this.body = Buffer.from(JSON.stringify(list));
+        this.version = version;
+        this.resolveReady();
+        callback(null);
+      });
+    });
+  }
+
+  // Создание проекта; callback(err, project)
+  create(input, callback) {
+    const project = {
+      id: input.id || newId("p"),
+      name: input.name.trim(),
+      code: input.code.trim(),
+      location: input.location.trim(),
+      stages: normalizeStages(input.stages),
+    };
+
+    this.db.run(
+      "INSERT INTO projects (id, name, code, location, stages) VALUES (?, ?, ?, ?, ?)",
+      [project.id, project.name, project.code, project.location, JSON.stringify(project.stages)],
+      (err) => {
+        if (err) return callback(err);
+        this.load((err) => callback(err, this.get(project.id) ?? project));
+      }
+    );
+  }
+
+  // Изменение проекта; callback(err, project) — project === null, если проекта нет
+  update(id, input, callback) {
+    const current = this.projects.get(id);
+    if (!current) return callback(null, null);
+
+    const project = {
+      ...current,
+      ...(input.name !== undefined && { name: input.name.trim() }),
+      ...(input.code !== undefined && { code: input.code.trim() }),
+      ...(input.location !== undefined && { location: input.location.trim() }),
+      ...(input.stages !== undefined && { stages: normalizeStages(input.stages) }),
+    };
+
+    const catalog = this;
+    this.db.run(
+      "UPDATE projects SET name = ?, code = ?, location = ?, stages = ? WHERE id = ?",
+      [project.name, project.code, project.location, JSON.stringify(project.stages), id],
+      function (err) {
+        if (err) return callback(err);
+        if (this.changes === 0) return callback(null, null);
+        catalog.load((err) => callback(err, catalog.get(id) ?? project));
+      }
+    );
+  }
+}
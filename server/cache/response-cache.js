@@ -0,0 +1,114 @@
+import crypto from 'crypto';
+import { LruCache } from './lru-cache.js';
+
+// Кэш готовых JSON-ответов для маршрутов чтения и условные запросы.
+// Ключ — маршрут, строка запроса и роль пользователя; запись хранит версию данных,
+// из которой получен ответ. Версия (счетчик таблицы или строки) читается на каждом
+// запросе одним коротким запросом: совпал If-None-Match — 304, совпала версия в кэше —
+// готовый буфер без обращения к данным.
+// Записи помечены тегами ("projects", "defect:<id>"), чтобы обработчики записи
+// могли удалять именно затронутые ответы.
+
+export class ResponseCache {
+  constructor({ max = 5000, ttlMs = 10 * 60_000 } = {}) {
+    this.keysByTag = new Map();
+    this.cache = new LruCache({
+      max,
+      ttlMs,
+      onEvict: (key, entry) => {
+        const keys = this.keysByTag.get(entry.tag);
+        keys?.delete(key);
+        if (keys?.size === 0) this.keysByTag.delete(entry.tag);
+      },
+    });
+  }
+
+  get(key, version) {
+    const entry = this.cache.get(key);
+    return entry && entry.version === version ? entry : undefined;
+  }
+
+  set(key, tag, version, etag, body) {
+    this.cache.set(key, { tag, version, etag, body });
+
+    let keys = this.keysByTag.get(tag);
+    if (!keys) {
+      keys = new Set();
+      this.keysByTag.set(tag, keys);
+    }
+    keys.add(key);
+  }
+
+  invalidate(tag) {
+    for (const key of [...(this.keysByTag.get(tag) ?? [])]) {
+      this.cache.delete(key);
+    }
+  }
+
+  clear() {
+    this.cache.clear();
+  }
+
+  stats() {
+    return { ...this.cache.stats(), tags: this.keysByTag.size };
+  }
+}
+
+const makeEtag = (...parts) =>
+  `W/"${crypto.createHash("sha1").update(parts.join("\n")).digest("base64url").slice(0, 22)}"`;
+
+// If-None-Match может содержать список тегов или *
+export function matchesEtag(header, etag) {
+  if (!header) return false;
+  if (header.trim() === "*") return true;
+  return header.split(",").some((candidate) => candidate.trim() === etag);
+}
+
+// Обработчик GET с ETag и кэшем ответов.
+// readVersion(req, cb) — cb(err, version); version === null означает, что ресурса нет (404).
+// load(req, cb) — cb(err, body) с данными ответа.
+export function cachedJson(cache, { tag, cacheControl, readVersion, load, notFoundMessage, errorMessage }) {
+  return (req, res) => {
+    readVersion(req, (err, version) => {
+      if (err) {
+        console.error(`${errorMessage}:`, err.message);
+        return res.status(500).json({ message: errorMessage });
+      }
+      if (version === null) {
+        return res.status(404).json({ message: notFoundMessage });
+      }
+
+      const resolvedTag = typeof tag === "function" ? tag(req) : tag;
+      const key = `${req.path}?${new URLSearchParams(req.query).toString()}|${req.user?.role ?? ""}`;
+      const etag = makeEtag(key, resolvedTag, version);
+
+      res.setHeader("ETag", etag);
+      res.setHeader("Cache-Control", cacheControl);
+
+      if (matchesEtag(req.headers["if-none-match"], etag)) {
+        return res.status(304).end();
+      }
+
+      const cached = cache.get(key, version);
+      if (cached) {
+        res.setHeader("Content-Type", "application/json; charset=utf-8");
+        return res.send(cached.body);
+      }
+
+      load(req, (err, body) => {
+        if (err) {
+          console.error(`${errorMessage}:`, err.message);
+          return res.status(500).json({ message: errorMessage });
+        }
+        if (body === null) {
+          return res.status(404).json({ message: notFoundMessage });
+        }
+
+        const buffer = Buffer.from(JSON.stringify(body));
+        cache.set(key, resolvedTag, version, etag, buffer);
+        res.setHeader("Content-Type", "application/json; charset=utf-8");
+        res.send(buffer);
+      });
+    });
+  };
+}
@@ -0,0 +1,72 @@
+import { LruCache } from './lru-cache.js';
+
+// Кэш сессий: токен -> { token, payload, user }.
+// Недействительные токены тоже кэшируются (значение null), чтобы повторно не проверять подпись.
+// Запись живет не дольше срока действия самого токена.
+
+export class SessionCache {
+  constructor({ max = 10_000, ttlMs = 60_000 } = {}) {
+    this.tokensByUser = new Map();
+    this.cache = new LruCache({
+      max,
+      ttlMs,
+      onEvict: (token, session) => this.unindex(token, session),
+    });
+  }
+
+  // undefined — промах, null — токен недействителен
+  get(token) {
+    return this.cache.get(token);
+  }
+
+  set(token, session) {
+    if (!session) {
+      this.cache.set(token, null);
+      return;
+    }
+
+    const ttlMs = Math.min(this.cache.ttlMs, session.payload.exp * 1000 - Date.now());
+    this.cache.set(token, session, ttlMs);
+
+    const key = String(session.user.id);
+    if (!this.tokensByUser.has(key)) {
+      this.tokensByUser.set(key, new Set());
+    }
+    this.tokensByUser.get(key).add(token);
+  }
+
+  invalidateToken(token) {
+    this.cache.delete(token);
+  }
+
+  // При смене роли или удалении пользователя сбрасываем все его сессии
+  invalidateUser(userId) {
+    const tokens = this.tokensByUser.get(String(userId));
+    if (!tokens) return;
+
+    for (const token of [...tokens]) {
+      this.cache.delete(token);
+    }
+  }
+
+  clear() {
+    this.cache.clear();
+  }
+
+  unindex(token, session) {
+    if (!session) return;
+
+    const key = String(session.user.id);
+    const tokens = this.tokensByUser.get(key);
+    if (!tokens) return;
+
+    tokens.delete(token);
+    if (tokens.size === 0) {
+      this.tokensByUser.delete(key);
+    }
+  }
+
+  stats() {
+    return this.cache.stats();
+  }
+}
@@ -0,0 +1,174 @@
+import 'dotenv/config';
+import cluster from 'cluster';
+import os from 'os';
+import { once } from 'events';
+import { fileURLToPath } from 'url';
+import { Database } from './db/database.js';
+import { runMigrations } from './db/migrations.js';
+import { seedDatabase } from './db/seed.js';
+import { resolveTokenSecret } from './auth/tokens.js';
+import { HashPool } from './auth/hash-pool.js';
+import { relayInvalidations } from './cache/invalidation-bus.js';
+import { relayMetrics } from './metrics/cluster-metrics.js';
+import { DEFAULT_RETAIN_DAYS } from './db/event-archive.js';
+import { EventArchiver } from './jobs/event-archiver.js';
+
+// Запуск сервера в режиме кластера: N рабочих процессов слушают один порт.
+// Основной процесс один раз применяет миграции и наполняет базу, затем запускает
+// рабочие процессы и перезапускает упавшие.
+// SIGHUP — поочередный перезапуск без простоя: новый процесс начинает слушать порт,
+// и только после этого старый плавно останавливается.
+// SIGTERM/SIGINT — плавная остановка всех процессов.
+//
+// Изменения схемы применяются при старте основного процесса; для новых миграций
+// его нужно перезапустить целиком.
+//
+// Перенос старых событий журнала в архив выполняет основной процесс, а не рабочие.
+//
+// Запуск: node server/cluster.js (число процессов — WEB_CONCURRENCY, по умолчанию число ядер)
+
+const availableCores = () => os.availableParallelism?.() ?? os.cpus().length;
+
+const WORKER_COUNT = Number(process.env.WEB_CONCURRENCY) || availableCores();
+const SHUTDOWN_TIMEOUT_MS = Number(process.env.SHUTDOWN_TIMEOUT_MS) || 10_000;
+const RESPAWN_DELAY_MS = 1000;
+const BCRYPT_ROUNDS = 10;
+const DATABASE_PATH = process.env.DATABASE_PATH || './database.db';
+
+let stopping = false;
+let restarting = false;
+let archive = null;
+
+const forkWorker = () => {
+  const worker = cluster.fork();
+  worker.on("message", (message) => relayInvalidations(worker, message) || relayMetrics(worker, message));
+  return worker;
+};
+
+// Плавная остановка одного процесса; если он не успел — принудительное завершение
+const stopWorker = async (worker) => {
+  if (worker.isDead()) return;
+
+  const exited = once(worker, "exit");
+  const timer = setTimeout(() => worker.process.kill("SIGKILL"), SHUTDOWN_TIMEOUT_MS);
+  worker.disconnect();
+  await exited;
+  clearTimeout(timer);
+};
+
+// Новый процесс запускается до остановки старого, поэтому порт не остается без обработчика
+const rollingRestart = async () => {
+  if (restarting || stopping) return;
+  restarting = true;
+  console.log("Поочередный перезапуск рабочих процессов...");
+
+  try {
+    for (const worker of Object.values(cluster.workers)) {
+      const replacement = forkWorker();
+      await Promise.race([
+        once(replacement, "listening"),
+        once(replacement, "exit").then(([code]) => {
+          throw new Error(`новый процесс завершился с кодом ${code} до начала работы`);
+        }),
+      ]);
+      await stopWorker(worker);
+    }
+    console.log("Перезапуск завершен");
+  } catch (err) {
+    console.error("Перезапуск прерван:", err.message);
+  } finally {
+    restarting = false;
+  }
+};
+
+const shutdown = async () => {
+  if (stopping) return;
+  stopping = true;
+  console.log("Остановка рабочих процессов...");
+
+  await Promise.all(Object.values(cluster.workers).map(stopWorker));
+  if (archive) {
+    await archive.archiver.close();
+    await archive.db.close();
+  }
+  process.exit(0);
+};
+
+// Миграции и наполнение базы выполняются до запуска рабочих процессов
+const prepareDatabase = (callback) => {
+  const db = new Database(DATABASE_PATH, { readers: 0 });
+  const hashPool = new HashPool({ size: 1 });
+
+  const finish = (err) => {
+    hashPool.close()
+      .then(() => db.close())
+      .then(() => callback(err), callback);
+  };
+
+  db.open((err) => {
+    if (err) return finish(err);
+
+    runMigrations(db.writer, (err, result) => {
+      if (err) return finish(err);
+
+      console.log(`Версия схемы базы данных: ${result.version}`);
+      seedDatabase(db, { hashPool, rounds: BCRYPT_ROUNDS }).then(() => finish(null), finish);
+    });
+  });
+};
+
+// Отдельное соединение основного процесса для периодического переноса событий в архив
+const startEventArchiver = () => {
+  const db = new Database(DATABASE_PATH, { readers: 0 });
+  const archiver = new EventArchiver(db, {
+    dir: process.env.EVENT_ARCHIVE_DIR || './archive/events',
+    retainDays: Number(process.env.EVENT_RETAIN_DAYS) || DEFAULT_RETAIN_DAYS,
+  });
+
+  db.open((err) => {
+    if (err) {
+      return console.error("Ошибка при подключении к базе данных для архива событий:", err.message);
+    }
+    archiver.start();
+  });
+  return { db, archiver };
+};
+
+const isMain = process.argv[1] && fileURLToPath(import.meta.url) === process.argv[1];
+
+if (isMain && cluster.isPrimary) {
+  // Общий секрет нужен, чтобы токен, выданный одним процессом, принимали остальные
+  process.env.AUTH_SECRET = resolveTokenSecret();
+  // Потоки bcrypt делятся между процессами, а не создаются по 4 в каждом
+  process.env.HASH_POOL_SIZE ||= String(Math.max(1, Math.floor(availableCores() / WORKER_COUNT)));
+
+  cluster.setupPrimary({ exec: fileURLToPath(new URL('./simple-server.js', import.meta.url)) });
+
+  prepareDatabase((err) => {
+    if (err) {
+      console.error("Ошибка при подготовке базы данных:", err.message);
+      process.exit(1);
+    }
+
+    archive = startEventArchiver();
+
+    console.log(`Запуск ${WORKER_COUNT} рабочих процессов`);
+    for (let i = 0; i < WORKER_COUNT; i++) {
+      forkWorker();
+    }
+
+    // Упавший процесс заменяется новым; плановая остановка (disconnect) не считается падением
+    cluster.on("exit", (worker, code, signal) => {
+      if (stopping || worker.exitedAfterDisconnect) return;
+
+      console.error(`Рабочий процесс ${worker.process.pid} завершился (${signal || code}), перезапуск`);
+      setTimeout(() => {
+        if (!stopping) forkWorker();
+      }, RESPAWN_DELAY_MS);
+    });
+
+    process.on("SIGHUP", rollingRestart);
+    process.on("SIGTERM", shutdown);
+    process.on("SIGINT", shutdown);
+  });
+}
@@ -0,0 +1,29 @@
+// Счетчики версий таблиц для условных запросов (ETag).
+// Триггеры увеличивают версию при любом изменении таблицы, поэтому проверка
+// актуальности ответа — одно чтение по первичному ключу, одинаковое для всех процессов кластера.
+
+const VERSIONED_TABLES = ["projects", "users"];
+
+const versionTriggers = (table) => ["insert", "update", "delete"].map((event) => `
+  CREATE TRIGGER IF NOT EXISTS ${table}_version_${event} AFTER ${event.toUpperCase()} ON ${table} BEGIN
+    UPDATE cache_versions SET version = version + 1 WHERE name = '${table}';
+  END;
+`).join("");
+
+export const CACHE_VERSIONS_SCHEMA_SQL = `
+  CREATE TABLE IF NOT EXISTS cache_versions (
+    name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+  ) WITHOUT ROWID;
+
+  INSERT OR IGNORE INTO cache_versions (name, version) VALUES ${VERSIONED_TABLES.map((t) => `('${t}', 0)`).join(", ")};
+
+  ${VERSIONED_TABLES.map(versionTriggers).join("")}
+`;
+
+export function readCacheVersion(db, name, callback) {
+  db.get("SELECT version FROM cache_versions WHERE name = ?", [name], (err, row) => {
+    if (err) return callback(err);
+    callback(null, row ? row.version : 0);
+  });
+}
@@ -0,0 +1,164 @@
+// Проверка планов запросов списка дефектов через EXPLAIN QUERY PLAN.
+// Завершается с кодом 1, если какой-либо запрос выполняет полный просмотр таблицы defects
+// или сортирует во временном B-дереве страницу, которая должна читаться из индекса по порядку.
+//
+// Из индекса по порядку читаются все страницы без полнотекстового поиска, кроме сортировок
+// по title и dueDate вместе с фильтрами: для них пришлось бы заводить индекс на каждое
+// сочетание фильтров, и сортируются только строки, прошедшие фильтр.
+// Поиск (q) сортирует найденные строки: их число ограничено совпадениями в defects_fts.
+// Страница по курсору таких запросов должна начинаться поиском по индексу с позиции курсора
+// (SEARCH ... (createdAt,id)<(?,?)), иначе далекая страница просматривает все предыдущие строки.
+// Исключение — dueDate по убыванию: после непустого срока идут строки без срока.
+// Пачки экспорта CSV идут по (createdAt, id) и проверяются так же, как страницы списка.
+//
+// Использование: node server/db/check-query-plans.js [путь к базе]
+
+import sqlite3 from 'sqlite3';
+import { fileURLToPath } from 'url';
+import { buildDefectExportBatchQuery, buildDefectFilters, buildDefectListQuery, DEFECT_SORT_FIELDS, encodeCursor } from './defect-queries.js';
+import { runMigrations } from './migrations.js';
+import { CSV_COLUMNS } from '../routes/csv-export.js';
+
+const SAMPLE_ROW = {
+  id: "d_000",
+  createdAt: "2024-01-01T00:00:00.000Z",
+  dueDate: "2024-02-01T00:00:00.000Z",
+  title: "Дефект",
+  priority: "high",
+  status: "new",
+};
+
+// Сочетания фильтров, которые реально отправляет клиент
+const FILTER_CASES = [
+  {},
+  { status: "new" },
+  { priority: "high" },
+  { projectId: "p1" },
+  { assigneeId: "u1" },
+  { projectId: "p1", status: "new" },
+  { projectId: "p1", priority: "high" },
+  { status: "in_progress", priority: "critical" },
+  { q: "трещина" },
+  { q: "протечка воды", status: "new" },
+  { q: "дефект", projectId: "p1", priority: "high" },
+];
+
+// Сортировки, которые с любым сочетанием фильтров идут по индексу (миграции 2 и 13)
+const INDEX_ORDERED_SORTS = ["createdAt", "priority", "status"];
+
+export function requiresIndexOrder({ q, sort, ...filters }) {
+  if (q) return false;
+  const filtered = ["status", "priority", "projectId", "assigneeId"].some((field) => filters[field]);
+  return !filtered || INDEX_ORDERED_SORTS.includes(sort);
+}
+
+export function listQueryCases() {
+  const cases = [];
+
+  for (const filters of FILTER_CASES) {
+    for (const sort of DEFECT_SORT_FIELDS) {
+      for (const order of ["asc", "desc"]) {
+        const cursor = encodeCursor(SAMPLE_ROW, sort, order === "asc" ? "ASC" : "DESC");
+        for (const query of [
+          { ...filters, sort, order },
+          { ...filters, sort, order, cursor },
+        ]) {
+          const built = buildDefectListQuery(query);
+          const ordered = requiresIndexOrder(query);
+          cases.push({
+            name: `list ${JSON.stringify(query)}`,
+            sql: built.sql,
+            params: built.params,
+            ordered,
+            seek: ordered && query.cursor !== undefined && !(sort === "dueDate" && order === "desc"),
+          });
+        }
+      }
+    }
+    if (filters.q) {
+      const built = buildDefectListQuery({ ...filters, sort: "relevance" });
+      cases.push({ name: `list ${JSON.stringify({ ...filters, sort: "relevance" })}`, sql: built.sql, params: built.params });
+    }
+    const { countSql, countParams } = buildDefectListQuery(filters);
+    cases.push({ name: `count ${JSON.stringify(filters)}`, sql: countSql, params: countParams });
+
+    for (const after of [null, SAMPLE_ROW]) {
+      const built = buildDefectExportBatchQuery(buildDefectFilters(filters), CSV_COLUMNS, after, 1000);
+      const ordered = !filters.q;
+      cases.push({
+        name: `export ${JSON.stringify({ ...filters, after: after?.id })}`,
+        sql: built.sql,
+        params: built.params,
+        ordered,
+        seek: ordered && after !== null,
+      });
+    }
+  }
+
+  cases.push({ name: "stats", sql: "SELECT dimension, key, count FROM defect_counters WHERE projectId = ? AND count > 0", params: [""] });
+
+  return cases;
+}
+
+// Полный просмотр — это SCAN по самой таблице, без индекса
+export function isFullTableScan(detail) {
+  return /^SCAN (TABLE )?defects\b/.test(detail) && !/USING (COVERING )?INDEX/.test(detail);
+}
+
+// Поиск по индексу с условием на строку значений ключа: начало страницы по курсору
+export function isKeysetSeek(detail) {
+  return /^SEARCH defects USING (COVERING )?INDEX \w+ \(.*\([\w,]+\)[<>]\(/.test(detail);
+}
+
+// Сортировка строк запроса целиком (или хвоста ключа) вместо чтения индекса по порядку
+export function isTempSort(detail) {
+  return /TEMP B-TREE FOR (RIGHT PART OF |LAST TERM OF )?ORDER BY/.test(detail);
+}
+
+function explain(db, sql, params) {
+  return new Promise((resolve, reject) => {
+    db.all(`EXPLAIN QUERY PLAN ${sql}`, params, (err, rows) => (err ? reject(err) : resolve(rows)));
+  });
+}
+
+export async function checkQueryPlans(db) {
+  const failures = [];
+  const cases = listQueryCases();
+
+  for (const testCase of cases) {
+    const plan = await explain(db, testCase.sql, testCase.params);
+    const details = plan.map((row) => row.detail);
+    const scans = details.filter(isFullTableScan);
+    const sorts = testCase.ordered ? details.filter(isTempSort) : [];
+    const unseekable = testCase.seek && !details.some(isKeysetSeek);
+    if (scans.length > 0 || sorts.length > 0 || unseekable) {
+      failures.push({ name: testCase.name, sql: testCase.sql, plan: plan.map((row) => row.detail) });
+    }
+  }
+
+  return { checked: cases.length, failures };
+}
+
+const isMain = process.argv[1] && fileURLToPath(import.meta.url) === process.argv[1];
+
+if (isMain) {
+  const dbPath = process.argv[2] || process.env.DATABASE_PATH || './database.db';
+  const db = new sqlite3.Database(dbPath);
+
+  runMigrations(db, async (err) => {
+    if (err) {
+      console.error(err.message);
+      process.exit(2);
+    }
+
+    try {
+      const report = await checkQueryPlans(db);
+      console.log(JSON.stringify(report, null, 2));
+      db.close();
+      process.exit(report.failures.length > 0 ? 1 : 0);
+    } catch (e) {
+      console.error("Ошибка при проверке планов запросов:", e.message);
+      process.exit(2);
+    }
+  });
+}
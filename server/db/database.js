@@ -0,0 +1,335 @@
+import sqlite3 from 'sqlite3';
+import { performance } from 'perf_hooks';
+import { LruCache } from '../cache/lru-cache.js';
+
+// Слой доступа к SQLite: одно соединение для записи и несколько только для чтения.
+// База работает в режиме WAL, поэтому чтения списков и карточек дефектов идут
+// параллельно с записью и не ждут ее завершения.
+// Подготовленные запросы кэшируются по тексту SQL отдельно для каждого соединения.
+//
+// Методы get/all/run/exec принимают callback последним аргументом (как sqlite3);
+// без callback возвращают Promise. В callback run this содержит changes и lastID.
+//
+// onQuery(sql, durationMs, err, query) вызывается по завершении каждого запроса
+// (метрики, профилировщик); query — { kind, params, result, statement }.
+
+const DEFAULT_READERS = 4;
+const DEFAULT_STATEMENT_CACHE_SIZE = 200;
+const DEFAULT_BUSY_TIMEOUT_MS = 5000;
+
+const splitArgs = (params, callback) => {
+  if (typeof params === "function") {
+    return [[], params];
+  }
+  return [params ?? [], callback];
+};
+
+// Вызывает callback или возвращает Promise, если callback не передан
+const withCallback = (callback, start) => {
+  if (callback) {
+    start(callback);
+    return undefined;
+  }
+  return new Promise((resolve, reject) => {
+    start((err, result) => (err ? reject(err) : resolve(result)));
+  });
+};
+
+// Простая очередь: задачи выполняются строго по одной
+class Mutex {
+  constructor() {
+    this.locked = false;
+    this.waiting = [];
+  }
+
+  // task(release) обязан вызвать release по завершении
+  lock(task) {
+    if (this.locked) {
+      this.waiting.push(task);
+      return;
+    }
+    this.locked = true;
+    task(() => this.unlock());
+  }
+
+  unlock() {
+    const next = this.waiting.shift();
+    if (next) {
+      next(() => this.unlock());
+    } else {
+      this.locked = false;
+    }
+  }
+}
+
+// Соединение sqlite3 с кэшем подготовленных запросов
+class Connection {
+  constructor(raw, { statementCacheSize, onQuery }) {
+    this.raw = raw;
+    this.pending = 0;
+    this.onQuery = onQuery;
+    this.statements = new LruCache({
+      max: statementCacheSize,
+      ttlMs: Infinity,
+      onEvict: (sql, statement) => statement.finalize(),
+    });
+  }
+
+  statement(sql) {
+    let statement = this.statements.get(sql);
+    if (!statement) {
+      statement = this.raw.prepare(sql, (err) => {
+        // Ошибка подготовки придет во все поставленные в очередь вызовы; запрос не кэшируем
+        if (err) this.statements.delete(sql);
+      });
+      this.statements.set(sql, statement);
+    }
+    return statement;
+  }
+
+  // Считает незавершенные запросы соединения и время их выполнения; this исходного callback сохраняется
+  track(kind, sql, params, callback) {
+    const connection = this;
+    const started = connection.onQuery ? performance.now() : 0;
+    connection.pending++;
+    return function (...args) {
+      connection.pending--;
+      connection.onQuery?.(sql, performance.now() - started, args[0], { kind, params, result: args[1], statement: this });
+      callback.apply(this, args);
+    };
+  }
+
+  get(sql, params, callback) {
+    const statement = this.statement(sql);
+    statement.get(params, this.track("get", sql, params, callback));
+    // get не доходит до конца выборки: сбрасываем запрос, чтобы освободить снимок чтения
+    statement.reset();
+  }
+
+  all(sql, params, callback) {
+    this.statement(sql).all(params, this.track("all", sql, params, callback));
+  }
+
+  run(sql, params, callback) {
+    this.statement(sql).run(params, this.track("run", sql, params, callback));
+  }
+
+  exec(sql, callback) {
+    this.raw.exec(sql, this.track("exec", sql, [], callback));
+  }
+
+  close(callback) {
+    this.statements.clear();
+    this.raw.close(callback);
+  }
+}
+
+// Транзакция на соединении записи; доступна только внутри Database.transaction
+class Transaction {
+  constructor(connection) {
+    this.connection = connection;
+  }
+
+  get(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    return withCallback(callback, (cb) => this.connection.get(sql, params, cb));
+  }
+
+  all(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    return withCallback(callback, (cb) => this.connection.all(sql, params, cb));
+  }
+
+  // Promise разрешается объектом { changes, lastID }
+  run(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    if (callback) {
+      this.connection.run(sql, params, callback);
+      return undefined;
+    }
+    return new Promise((resolve, reject) => {
+      this.connection.run(sql, params, function (err) {
+        if (err) return reject(err);
+        resolve({ changes: this.changes, lastID: this.lastID });
+      });
+    });
+  }
+
+  // Подготовленный запрос для многократного выполнения внутри транзакции (пакетные вставки).
+  // Запрос готовится сразу и берется из кэша соединения; выполнения идут через run,
+  // поэтому их видят onQuery (метрики, профилировщик) и счетчик pending.
+  prepare(sql) {
+    this.connection.statement(sql);
+    return {
+      run: (params) => this.run(sql, params),
+    };
+  }
+}
+
+export class Database {
+  constructor(filename, {
+    readers = Number(process.env.DB_READERS) || DEFAULT_READERS,
+    statementCacheSize = DEFAULT_STATEMENT_CACHE_SIZE,
+    busyTimeoutMs = DEFAULT_BUSY_TIMEOUT_MS,
+    onQuery,
+  } = {}) {
+    this.filename = filename;
+    this.readerCount = Math.max(0, readers);
+    this.statementCacheSize = statementCacheSize;
+    this.busyTimeoutMs = busyTimeoutMs;
+    this.onQuery = onQuery;
+    this.readers = [];
+    this.writeLock = new Mutex();
+
+    const raw = new sqlite3.Database(filename);
+    raw.configure("busyTimeout", busyTimeoutMs);
+    this.writerConnection = new Connection(raw, { statementCacheSize, onQuery });
+  }
+
+  // Сырое соединение записи — для миграций и служебных скриптов
+  get writer() {
+    return this.writerConnection.raw;
+  }
+
+  // Включает WAL на соединении записи и открывает соединения для чтения.
+  // До завершения open чтения выполняются через соединение записи.
+  open(callback) {
+    const pragmas = `
+      PRAGMA journal_mode = WAL;
+      PRAGMA synchronous = NORMAL;
+      PRAGMA foreign_keys = ON;
+    `;
+
+    this.writerConnection.exec(pragmas, (err) => {
+      if (err) return callback(err);
+
+      let pending = this.readerCount;
+      let failed = false;
+      if (pending === 0) return callback(null);
+
+      for (let i = 0; i < this.readerCount; i++) {
+        const raw = new sqlite3.Database(this.filename, sqlite3.OPEN_READONLY, (err) => {
+          if (failed) return;
+          if (err) {
+            failed = true;
+            return callback(err);
+          }
+          raw.configure("busyTimeout", this.busyTimeoutMs);
+          this.readers.push(new Connection(raw, { statementCacheSize: this.statementCacheSize, onQuery: this.onQuery }));
+          if (--pending === 0) callback(null);
+        });
+      }
+    });
+  }
+
+  // Наименее загруженное соединение для чтения
+  reader() {
+    let best = this.writerConnection;
+    for (const connection of this.readers) {
+      if (best === this.writerConnection || connection.pending < best.pending) {
+        best = connection;
+      }
+    }
+    return best;
+  }
+
+  get(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    return withCallback(callback, (cb) => this.reader().get(sql, params, cb));
+  }
+
+  all(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    return withCallback(callback, (cb) => this.reader().all(sql, params, cb));
+  }
+
+  // Запись выполняется по одной, чтобы не попасть внутрь чужой транзакции.
+  // Promise разрешается объектом { changes, lastID }.
+  run(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    const start = (cb) => this.writeLock.lock((release) => {
+      this.writerConnection.run(sql, params, function (err) {
+        release();
+        cb.call(this, err);
+      });
+    });
+
+    if (callback) {
+      start(callback);
+      return undefined;
+    }
+    return new Promise((resolve, reject) => {
+      start(function (err) {
+        if (err) return reject(err);
+        resolve({ changes: this.changes, lastID: this.lastID });
+      });
+    });
+  }
+
+  exec(sql, callback) {
+    return withCallback(callback, (cb) => this.writeLock.lock((release) => {
+      this.writerConnection.exec(sql, (err) => {
+        release();
+        cb(err || null);
+      });
+    }));
+  }
+
+  // План запроса (EXPLAIN QUERY PLAN) на соединении для чтения.
+  // Запрос не попадает в кэш подготовленных запросов и в onQuery.
+  explain(sql, params, callback) {
+    [params, callback] = splitArgs(params, callback);
+    return withCallback(callback, (cb) => this.reader().raw.all(`EXPLAIN QUERY PLAN ${sql}`, params, cb));
+  }
+
+  // Выполняет work(tx) в транзакции BEGIN IMMEDIATE; work возвращает Promise.
+  // Результат work передается в callback (или возвращается Promise).
+  transaction(work, callback) {
+    return withCallback(callback, (cb) => this.writeLock.lock((release) => {
+      const connection = this.writerConnection;
+      const finish = (err, result) => {
+        release();
+        cb(err, result);
+      };
+
+      connection.exec("BEGIN IMMEDIATE", (err) => {
+        if (err) return finish(err);
+
+        Promise.resolve()
+          .then(() => work(new Transaction(connection)))
+          .then(
+            (result) => connection.exec("COMMIT", (err) => {
+              if (err) return connection.exec("ROLLBACK", () => finish(err));
+              finish(null, result);
+            }),
+            (err) => connection.exec("ROLLBACK", () => finish(err))
+          );
+      });
+    }));
+  }
+
+  stats() {
+    const describe = (connection) => ({
+      pending: connection.pending,
+      statements: connection.statements.stats(),
+    });
+    return {
+      writer: describe(this.writerConnection),
+      readers: this.readers.map(describe),
+    };
+  }
+
+  close(callback) {
+    const connections = [this.writerConnection, ...this.readers];
+    let pending = connections.length;
+    let firstError = null;
+    return withCallback(callback, (cb) => {
+      for (const connection of connections) {
+        connection.close((err) => {
+          firstError = firstError || err;
+          if (--pending === 0) cb(firstError);
+        });
+      }
+    });
+  }
+}
@@ -0,0 +1,211 @@
+// Журнал изменений дефектов: таблица только для добавления, одна строка на изменение.
+// Пишется в той же транзакции, что и само изменение, поэтому журнал не расходится с данными
+// и переживает удаление дефекта (внешнего ключа на defects нет).
+// seq — монотонный номер (AUTOINCREMENT не переиспользует номера удаленных строк):
+// он же id событий потока /api/events. Отчеты читаются в порядке (at, seq).
+// Старые события переносятся в сжатые помесячные файлы (server/db/event-archive.js),
+// сведения о файлах — в defect_event_segments.
+
+export const DEFECT_EVENTS_SCHEMA_SQL = `
+  CREATE TABLE IF NOT EXISTS defect_events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL,
+    defectId TEXT,
+    projectId TEXT,
+    actor TEXT,
+    at TEXT NOT NULL,
+    data TEXT
+  );
+  CREATE INDEX IF NOT EXISTS idx_defect_events_defect ON defect_events (defectId, at);
+  CREATE INDEX IF NOT EXISTS idx_defect_events_at ON defect_events (at);
+
+  CREATE TRIGGER IF NOT EXISTS defect_events_append_only
+  BEFORE UPDATE ON defect_events
+  BEGIN
+    SELECT RAISE(ABORT, 'Журнал событий дефектов не изменяется');
+  END;
+
+  CREATE TABLE IF NOT EXISTS defect_event_segments (
+    file TEXT PRIMARY KEY,
+    month TEXT NOT NULL,
+    firstSeq INTEGER NOT NULL,
+    lastSeq INTEGER NOT NULL,
+    firstAt TEXT NOT NULL,
+    lastAt TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    bytes INTEGER NOT NULL,
+    sha256 TEXT NOT NULL,
+    createdAt TEXT NOT NULL
+  ) WITHOUT ROWID;
+`;
+
+export const EVENT_LOG_TYPES = ["created", "imported", "updated", "status", "comment", "attachment", "deleted"];
+
+const INSERT_EVENTS_SQL = `
+  INSERT INTO defect_events (type, defectId, projectId, actor, at, data)
+  SELECT ?,
+         json_extract(value, '$.defectId'),
+         COALESCE(json_extract(value, '$.projectId'),
+                  (SELECT projectId FROM defects WHERE id = json_extract(value, '$.defectId'))),
+         ?, ?,
+         json_extract(value, '$.data')
+  FROM json_each(?)
+`;
+
+// Записывает события одного типа для нескольких дефектов внутри транзакции изменения.
+// entries — [{ defectId, projectId?, data }]; если projectId не указан, он читается из defects.
+export async function recordDefectEvents(tx, type, entries, { actor = null, at = new Date().toISOString() } = {}) {
+  if (entries.length === 0) return;
+
+  const rows = entries.map(({ defectId, projectId, data }) => ({ defectId, projectId: projectId ?? null, data: data ?? {} }));
+  await tx.run(INSERT_EVENTS_SQL, [type, actor, at, JSON.stringify(rows)]);
+}
+
+export function recordDefectEvent(tx, { type, defectId, projectId, data, actor, at }) {
+  return recordDefectEvents(tx, type, [{ defectId, projectId, data }], { actor, at });
+}
+
+export const toLogEvent = (row) => ({
+  seq: row.seq,
+  type: row.type,
+  defectId: row.defectId,
+  projectId: row.projectId,
+  actor: row.actor,
+  at: row.at,
+  data: row.data ? JSON.parse(row.data) : {},
+});
+
+// События после seq по порядку (чтение хвоста журнала)
+export function readEventsAfter(db, seq, limit, callback) {
+  db.all("SELECT * FROM defect_events WHERE seq > ? ORDER BY seq LIMIT ?", [seq, limit], (err, rows) => {
+    if (err) return callback(err);
+    callback(null, rows.map(toLogEvent));
+  });
+}
+
+// Границы журнала: { firstSeq, lastSeq }; lastSeq учитывает и перенесенные в архив события
+export function readEventBounds(db, callback) {
+  db.get(
+    `SELECT (SELECT MIN(seq) FROM defect_events) AS firstSeq,
+            MAX(COALESCE((SELECT MAX(seq) FROM defect_events), 0),
+                COALESCE((SELECT MAX(lastSeq) FROM defect_event_segments), 0)) AS lastSeq`,
+    (err, row) => {
+      if (err) return callback(err);
+      callback(null, { firstSeq: row.firstSeq, lastSeq: row.lastSeq });
+    }
+  );
+}
+
+export const MAX_EVENT_PAGE = 1000;
+export const DEFAULT_EVENT_PAGE = 200;
+
+const isTimestamp = (value) => typeof value === "string" && !Number.isNaN(Date.parse(value));
+
+// Курсор страницы журнала: последнее выданное событие (at, seq)
+export const encodeEventCursor = (event) => Buffer.from(JSON.stringify({ at: event.at, seq: event.seq })).toString("base64url");
+
+function decodeEventCursor(cursor) {
+  try {
+    const payload = JSON.parse(Buffer.from(String(cursor), "base64url").toString("utf8"));
+    return typeof payload?.at === "string" && Number.isInteger(payload.seq) ? payload : null;
+  } catch {
+    return null;
+  }
+}
+
+// Проверка фильтров запроса журнала: from, to (ISO-время, to не включается), defectId,
+// projectId, type (через запятую), actor, cursor, limit. Возвращает { filters } или { error }.
+export function parseEventFilters(query) {
+  const filters = {};
+
+  for (const field of ["from", "to"]) {
+    if (query[field] === undefined) continue;
+    if (!isTimestamp(query[field])) {
+      return { error: `Недопустимое значение ${field}: ожидается дата ISO 8601` };
+    }
+    filters[field] = new Date(query[field]).toISOString();
+  }
+
+  for (const field of ["defectId", "projectId", "actor"]) {
+    if (typeof query[field] === "string" && query[field]) filters[field] = query[field];
+  }
+
+  if (query.type !== undefined) {
+    const types = String(query.type).split(",").map((type) => type.trim()).filter(Boolean);
+    const unknown = types.find((type) => !EVENT_LOG_TYPES.includes(type));
+    if (unknown) {
+      return { error: `Неизвестный тип события: ${unknown}` };
+    }
+    filters.types = types;
+  }
+
+  if (query.cursor !== undefined) {
+    filters.after = decodeEventCursor(query.cursor);
+    if (!filters.after) {
+      return { error: "Недопустимый курсор" };
+    }
+  }
+
+  const limit = query.limit === undefined ? DEFAULT_EVENT_PAGE : Number(query.limit);
+  if (!Number.isInteger(limit) || limit < 1) {
+    return { error: "limit должен быть положительным целым числом" };
+  }
+  filters.limit = Math.min(limit, MAX_EVENT_PAGE);
+
+  return { filters };
+}
+
+// Подходит ли событие под фильтры (для событий из архивных файлов)
+export function matchesEventFilters(event, filters) {
+  const { after } = filters;
+  return (!filters.from || event.at >= filters.from) &&
+    (!filters.to || event.at < filters.to) &&
+    (!filters.defectId || event.defectId === filters.defectId) &&
+    (!filters.projectId || event.projectId === filters.projectId) &&
+    (!filters.actor || event.actor === filters.actor) &&
+    (!filters.types || filters.types.includes(event.type)) &&
+    (!after || event.at > after.at || (event.at === after.at && event.seq > after.seq));
+}
+
+// Страница событий горячей части журнала по фильтрам в порядке (at, seq).
+// Отчет за период читается по индексу at, история дефекта — по индексу (defectId, at).
+export function queryDefectEvents(db, filters, callback) {
+  const where = [];
+  const params = [];
+
+  if (filters.after) {
+    where.push("(at, seq) > (?, ?)");
+    params.push(filters.after.at, filters.after.seq);
+  }
+  if (filters.from) {
+    where.push("at >= ?");
+    params.push(filters.from);
+  }
+  if (filters.to) {
+    where.push("at < ?");
+    params.push(filters.to);
+  }
+  for (const field of ["defectId", "projectId", "actor"]) {
+    if (filters[field]) {
+      where.push(`${field} = ?`);
+      params.push(filters[field]);
+    }
+  }
+  if (filters.types) {
+    where.push("type IN (SELECT value FROM json_each(?))");
+    params.push(JSON.stringify(filters.types));
+  }
+
+  const limit = filters.limit ?? DEFAULT_EVENT_PAGE;
+  db.all(
+    `SELECT * FROM defect_events ${where.length ? `WHERE ${where.join(" AND ")}` : ""} ORDER BY at, seq LIMIT ?`,
+    [...params, limit + 1],
+    (err, rows) => {
+      if (err) return callback(err);
+
+      const hasMore = rows.length > limit;
+      const items = (hasMore ? rows.slice(0, limit) : rows).map(toLogEvent);
+      callback(null, { items, nextCursor: hasMore ? encodeEventCursor(items[items.length - 1]) : null });
+    }
+  );
+}
@@ -0,0 +1,264 @@
+// Построение SQL-запросов для списка дефектов
+
+export const DEFECT_SORT_FIELDS = ["createdAt", "title", "priority", "status", "dueDate"];
+
+// Совпадение в заголовке важнее совпадения в описании при ранжировании bm25
+const FTS_TITLE_WEIGHT = 10.0;
+const FTS_DESCRIPTION_WEIGHT = 1.0;
+
+export const DEFAULT_PAGE_SIZE = 20;
+export const MAX_PAGE_SIZE = 100;
+
+// Поля списка: колонки defects и счетчики связанных записей.
+// Счетчики считаются коррелированными подзапросами по индексам (defectId, ...)
+// только для строк страницы.
+const LIST_COLUMNS = [
+  "id", "projectId", "title", "description", "priority", "assigneeId",
+  "reporterId", "status", "dueDate", "createdAt", "updatedAt",
+];
+const LIST_COUNTS = {
+  commentCount: "(SELECT COUNT(*) FROM defect_comments WHERE defectId = defects.id)",
+  attachmentCount: "(SELECT COUNT(*) FROM defect_attachments WHERE defectId = defects.id)",
+};
+
+export const DEFECT_LIST_FIELDS = [...LIST_COLUMNS, ...Object.keys(LIST_COUNTS)];
+
+// Компактная проекция по умолчанию — то, что показывает таблица дефектов
+export const DEFAULT_LIST_FIELDS = [
+  "id", "projectId", "title", "status", "priority", "assigneeId",
+  "dueDate", "createdAt", "updatedAt", "commentCount", "attachmentCount",
+];
+
+// fields=title,status,... или fields=all; возвращает { fields } или { error }
+export function parseListFields(fields) {
+  if (fields === undefined || fields === "") {
+    return { fields: DEFAULT_LIST_FIELDS };
+  }
+  if (fields === "all") {
+    return { fields: DEFECT_LIST_FIELDS };
+  }
+
+  const requested = String(fields).split(",").map((field) => field.trim()).filter(Boolean);
+  const unknown = requested.find((field) => !DEFECT_LIST_FIELDS.includes(field));
+  if (unknown) {
+    return { error: `Неизвестное поле: ${unknown}` };
+  }
+  return { fields: requested };
+}
+
+const selectListFields = (fields) =>
+  fields.map((field) => (LIST_COUNTS[field] ? `${LIST_COUNTS[field]} AS ${field}` : `defects.${field}`)).join(", ");
+
+// Полнотекстовый запрос FTS5: каждое слово ищется по префиксу, слова объединяются через AND.
+// Префиксный поиск покрывает русские окончания ("трещин" находит "трещина", "трещины").
+// "ё" заменяется на "е", как в тексте индекса (миграция 11).
+export function buildFtsQuery(q) {
+  const terms = String(q).toLowerCase().replace(/ё/g, "е").match(/[\p{L}\p{N}]+/gu) || [];
+  return terms.map((term) => `"${term}"*`).join(" ");
+}
+
+// Источник строк и условия WHERE по фильтрам из query-параметров
+// (общие для списка, подсчета и экспорта).
+// При поиске выборку ведет индекс defects_fts: CROSS JOIN фиксирует порядок соединения,
+// поэтому стоимость зависит от числа совпадений, а не от размера таблицы.
+// Непустой q без букв и цифр (например "-") ничего не находит.
+export function buildDefectFilters({ q, status, priority, projectId, assigneeId } = {}) {
+  let from = "defects";
+  let where = "";
+  const params = [];
+
+  const ftsQuery = q ? buildFtsQuery(q) : "";
+  if (ftsQuery) {
+    from = `(SELECT rowid AS ftsRowid, bm25(defects_fts, ${FTS_TITLE_WEIGHT}, ${FTS_DESCRIPTION_WEIGHT}) AS score
+      FROM defects_fts WHERE defects_fts MATCH ?) AS fts
+      CROSS JOIN defects ON defects.rowid = fts.ftsRowid`;
+    params.push(ftsQuery);
+  } else if (q && String(q).trim()) {
+    where += " AND 0";
+  }
+  if (status) {
+    where += " AND status = ?";
+    params.push(status);
+  }
+  if (priority) {
+    where += " AND priority = ?";
+    params.push(priority);
+  }
+  if (projectId) {
+    where += " AND projectId = ?";
+    params.push(projectId);
+  }
+  if (assigneeId) {
+    where += " AND assigneeId = ?";
+    params.push(assigneeId);
+  }
+
+  return { from, where, params, search: Boolean(ftsQuery) };
+}
+
+// Ключ сортировки: поле, затем столбцы, упорядочивающие строки с равным значением.
+// Ключ совпадает с порядком столбцов индекса (миграции 2 и 13), поэтому страница
+// читается из индекса по порядку, без сортировки всех подходящих строк.
+// У priority и status мало значений: внутри значения строки идут по createdAt, как в индексах.
+const SORT_KEYS = {
+  createdAt: ["createdAt", "id"],
+  title: ["title", "id"],
+  dueDate: ["dueDate", "id"],
+  priority: ["priority", "createdAt", "id"],
+  status: ["status", "createdAt", "id"],
+};
+
+// Среди столбцов ключей NULL бывает только в dueDate
+const NULLABLE_SORT_FIELDS = ["dueDate"];
+
+// Поля сортировки, по которым есть и фильтр на равенство
+const FILTER_SORT_FIELDS = ["status", "priority"];
+
+const sortKey = (sortField) => SORT_KEYS[sortField];
+
+// Курсор непрозрачен для клиента: base64url от ключа сортировки последней строки и ее id
+export function encodeCursor(row, sortField, sortOrder) {
+  const v = sortKey(sortField).slice(0, -1).map((column) => row[column] ?? null);
+  const payload = { s: sortField, o: sortOrder, v, id: row.id };
+  return Buffer.from(JSON.stringify(payload)).toString("base64url");
+}
+
+export function decodeCursor(cursor) {
+  try {
+    const payload = JSON.parse(Buffer.from(cursor, "base64url").toString("utf8"));
+    if (!payload || typeof payload.id !== "string" || !DEFECT_SORT_FIELDS.includes(payload.s)) {
+      return null;
+    }
+    if (!Array.isArray(payload.v) || payload.v.length !== sortKey(payload.s).length - 1) {
+      return null;
+    }
+    return payload;
+  } catch {
+    return null;
+  }
+}
+
+// Условие "строго после курсора" для ORDER BY по ключу сортировки.
+// Сравнение строк значений (a, b, id) > (?, ?, ?) SQLite превращает в поиск по индексу
+// ключа: страница начинается с позиции курсора, а не с просмотра всех предыдущих строк.
+// SQLite ставит NULL первыми при ASC и последними при DESC, это учитывается явно;
+// после непустого dueDate при DESC идут еще строки без срока, и такой курсор — не диапазон.
+// Поле сортировки, равное значению фильтра (status=new&sort=status), в сравнение не входит:
+// иначе SQLite не совмещает равенство и диапазон по одному столбцу индекса.
+function buildKeysetCondition(sortField, sortOrder, cursor, filtered) {
+  const { v, id } = cursor;
+  const op = sortOrder === "ASC" ? ">" : "<";
+  let columns = sortKey(sortField);
+  let values = [...v, id];
+  if (filtered) {
+    columns = columns.slice(1);
+    values = values.slice(1);
+  }
+
+  if (v[0] === null) {
+    return sortOrder === "ASC"
+      ? { where: ` AND ((${sortField} IS NULL AND id > ?) OR ${sortField} IS NOT NULL)`, params: [id] }
+      : { where: ` AND (${sortField} IS NULL AND id < ?)`, params: [id] };
+  }
+
+  const after = `(${columns.join(", ")}) ${op} (${columns.map(() => "?").join(", ")})`;
+  if (sortOrder === "DESC" && NULLABLE_SORT_FIELDS.includes(sortField)) {
+    return { where: ` AND (${after} OR ${sortField} IS NULL)`, params: values };
+  }
+  return { where: ` AND ${after}`, params: values };
+}
+
+// Собирает запрос списка дефектов.
+// Режим курсора включается параметром cursor (пустая строка — первая страница),
+// иначе используется прежняя пагинация page/pageSize.
+// sort=relevance при непустом q упорядочивает по bm25 и поддерживает только page/pageSize.
+// fields задает проекцию; id и столбцы ключа сортировки выбираются всегда — они нужны для курсора.
+// pageSize больше MAX_PAGE_SIZE — ошибка, а не молчаливое усечение страницы.
+export function buildDefectListQuery(query = {}) {
+  const { sort = "createdAt", order = "desc", page = "1", pageSize = String(DEFAULT_PAGE_SIZE), cursor } = query;
+
+  const filters = buildDefectFilters(query);
+  const byRelevance = sort === "relevance" && filters.search;
+  const sortField = DEFECT_SORT_FIELDS.includes(sort) ? sort : "createdAt";
+  const sortOrder = order === "asc" ? "ASC" : "DESC";
+  const ps = Math.max(Number(pageSize) || DEFAULT_PAGE_SIZE, 1);
+  const p = Math.max(Number(page) || 1, 1);
+  const cursorMode = cursor !== undefined && !byRelevance;
+
+  if (ps > MAX_PAGE_SIZE) {
+    return { error: `pageSize не может быть больше ${MAX_PAGE_SIZE}` };
+  }
+
+  if (byRelevance && cursor) {
+    return { error: "Курсор не поддерживается для sort=relevance" };
+  }
+
+  const projection = parseListFields(query.fields);
+  if (projection.error) {
+    return { error: projection.error };
+  }
+  const fields = [...new Set(["id", ...projection.fields, ...sortKey(sortField)])];
+
+  let where = filters.where;
+  const params = [...filters.params];
+
+  if (cursorMode && cursor !== "") {
+    const decoded = decodeCursor(String(cursor));
+    if (!decoded || decoded.s !== sortField || decoded.o !== sortOrder) {
+      return { error: "Недопустимый курсор" };
+    }
+    const filtered = FILTER_SORT_FIELDS.includes(sortField) && Boolean(query[sortField]);
+    const keyset = buildKeysetCondition(sortField, sortOrder, decoded, filtered);
+    where += keyset.where;
+    params.push(...keyset.params);
+  }
+
+  const orderBy = byRelevance
+    ? "fts.score, id"
+    : sortKey(sortField).map((column) => `${column} ${sortOrder}`).join(", ");
+
+  // Лишняя строка показывает, есть ли следующая страница.
+  // LIMIT и OFFSET передаются параметрами, чтобы текст запроса не зависел от страницы
+  // и подготовленный запрос переиспользовался из кэша.
+  let sql = `SELECT ${selectListFields(fields)} FROM ${filters.from} WHERE 1=1${where} ORDER BY ${orderBy} LIMIT ?`;
+  params.push(ps + 1);
+  if (!cursorMode) {
+    sql += ` OFFSET ?`;
+    params.push((p - 1) * ps);
+  }
+
+  return {
+    sql,
+    params,
+    countSql: `SELECT COUNT(*) as total FROM ${filters.from} WHERE 1=1${filters.where}`,
+    countParams: filters.params,
+    sortField,
+    sortOrder,
+    page: p,
+    pageSize: ps,
+    cursorMode,
+  };
+}
+
+// Пачка строк потокового экспорта. Порядок (createdAt, id) совпадает с ключом списка
+// по умолчанию: при любом фильтре без q строки читаются из индекса по порядку (миграции 2 и 13),
+// а каждая следующая пачка начинается поиском по индексу с последней строки предыдущей.
+// after — { createdAt, id } последней выгруженной строки, null для первой пачки.
+export function buildDefectExportBatchQuery(filters, columns, after, limit) {
+  let where = filters.where;
+  const params = [...filters.params];
+
+  if (after) {
+    where += " AND (defects.createdAt, defects.id) > (?, ?)";
+    params.push(after.createdAt, after.id);
+  }
+
+  const sql = `SELECT ${columns.map((column) => `defects.${column}`).join(", ")}
+    FROM ${filters.from}
+    WHERE 1=1${where}
+    ORDER BY defects.createdAt, defects.id
+    LIMIT ?`;
+  params.push(limit);
+
+  return { sql, params };
+}
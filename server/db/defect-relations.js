@@ -0,0 +1,244 @@
+import { recordDefectEvent } from './defect-events.js';
+
+// История, комментарии и вложения дефекта хранятся в дочерних таблицах.
+// Функции возвращают те же JSON-структуры, что раньше хранились в колонках defects.
+
+const toHistoryEntry = (row) => ({
+  action: row.action,
+  timestamp: row.timestamp,
+  changes: row.changes ? JSON.parse(row.changes) : undefined,
+  reason: row.reason ?? undefined,
+  changedBy: row.changedBy,
+});
+
+const toComment = (row) => ({
+  id: row.id,
+  message: row.message,
+  authorId: row.authorId,
+  authorName: row.authorName ?? undefined,
+  createdAt: row.createdAt,
+});
+
+const toAttachment = (row) => ({
+  id: row.id,
+  name: row.name,
+  size: row.size,
+  type: row.type,
+  url: row.url,
+  uploadedAt: row.uploadedAt,
+  uploadedBy: row.uploadedBy,
+  sha256: row.sha256 ?? undefined,
+  thumbnailUrl: row.thumbnailUrl ?? undefined,
+  previewUrl: row.previewUrl ?? undefined,
+});
+
+// Загружает history, comments и attachments дефекта тремя индексированными запросами
+export function loadDefectRelations(db, defectId, callback) {
+  const queries = {
+    history: ["SELECT * FROM defect_history WHERE defectId = ? ORDER BY id", toHistoryEntry],
+    comments: ["SELECT * FROM defect_comments WHERE defectId = ? ORDER BY createdAt, id", toComment],
+    attachments: ["SELECT * FROM defect_attachments WHERE defectId = ? ORDER BY uploadedAt, id", toAttachment],
+  };
+
+  const result = {};
+  let pending = Object.keys(queries).length;
+  let failed = false;
+
+  for (const [key, [sql, mapRow]] of Object.entries(queries)) {
+    db.all(sql, [defectId], (err, rows) => {
+      if (failed) return;
+      if (err) {
+        failed = true;
+        return callback(err);
+      }
+      result[key] = rows.map(mapRow);
+      if (--pending === 0) callback(null, result);
+    });
+  }
+}
+
+// Изменения дочерних таблиц выполняются в одной транзакции с обновлением updatedAt дефекта
+// (оно же увеличивает version — версию карточки для ETag и кэша ответов) и записью в журнал defect_events.
+
+// Обновляет updatedAt дефекта; true, если дефект найден
+async function touchDefect(tx, defectId, timestamp) {
+  const { changes } = await tx.run("UPDATE defects SET updatedAt = ? WHERE id = ?", [timestamp, defectId]);
+  return changes > 0;
+}
+
+// Меняет статус и добавляет запись истории; callback(err, found)
+export function changeDefectStatus(db, defectId, status, entry, callback) {
+  db.transaction(async (tx) => {
+    const defect = await tx.get("SELECT projectId, status FROM defects WHERE id = ?", [defectId]);
+    if (!defect) return false;
+
+    await tx.run("UPDATE defects SET status = ?, updatedAt = ? WHERE id = ?", [status, entry.timestamp, defectId]);
+
+    await tx.run(
+      "INSERT INTO defect_history (defectId, action, timestamp, changes, reason, changedBy) VALUES (?, ?, ?, ?, ?, ?)",
+      [
+        defectId,
+        entry.action,
+        entry.timestamp,
+        entry.changes ? JSON.stringify(entry.changes) : null,
+        entry.reason ?? null,
+        entry.changedBy ?? null,
+      ]
+    );
+    await recordDefectEvent(tx, {
+      type: "status",
+      defectId,
+      projectId: defect.projectId,
+      actor: entry.changedBy,
+      at: entry.timestamp,
+      data: { status, previous: defect.status, reason: entry.reason ?? null },
+    });
+    return true;
+  }, callback);
+}
+
+// Добавляет комментарий; callback(err, found) — found=false, если дефекта нет.
+// actor — кто добавил (для журнала событий).
+export function appendComment(db, defectId, comment, actor, callback) {
+  db.transaction(async (tx) => {
+    if (!(await touchDefect(tx, defectId, comment.createdAt))) return false;
+
+    await tx.run(
+      "INSERT INTO defect_comments (id, defectId, message, authorId, authorName, createdAt) VALUES (?, ?, ?, ?, ?, ?)",
+      [comment.id, defectId, comment.message, comment.authorId ?? null, comment.authorName ?? null, comment.createdAt]
+    );
+    await recordDefectEvent(tx, { type: "comment", defectId, actor, at: comment.createdAt, data: { comment } });
+    return true;
+  }, callback);
+}
+
+// Файлы вложений лежат в хранилище по SHA-256 и могут быть общими для нескольких записей.
+// Перенос файла в хранилище выполняется внутри транзакции загрузки. Файл без ссылок
+// удаляется после COMMIT: если изменение откатится, файл останется на месте.
+
+// Сведения о вложении для журнала событий
+const fileInfo = (attachment) => ({
+  id: attachment.id,
+  name: attachment.name,
+  size: attachment.size,
+  type: attachment.type,
+  sha256: attachment.sha256 ?? null,
+});
+
+const findReference = (tx, sha256) =>
+  tx.get("SELECT 1 AS used FROM defect_attachments WHERE sha256 = ? LIMIT 1", [sha256]);
+
+// Хэши файлов, на которые больше не ссылается ни одно вложение; их задания превью снимаются
+async function collectOrphans(tx, hashes) {
+  const orphans = [];
+  for (const sha256 of hashes) {
+    if (!(await findReference(tx, sha256))) {
+      await tx.run("DELETE FROM preview_jobs WHERE sha256 = ?", [sha256]);
+      orphans.push(sha256);
+    }
+  }
+  return orphans;
+}
+
+// Удаляет файлы после COMMIT. Ссылки проверяются еще раз под блокировкой записи:
+// параллельная загрузка того же содержимого могла сослаться на файл уже после COMMIT.
+// Изменение в базе уже сохранено, поэтому ошибка удаления только оставляет лишний файл.
+async function releaseOrphans(db, hashes, releaseFile) {
+  if (hashes.length === 0) return;
+  try {
+    await db.transaction(async (tx) => {
+      for (const sha256 of hashes) {
+        if (!(await findReference(tx, sha256))) await releaseFile(sha256);
+      }
+    });
+  } catch (err) {
+    console.error("Ошибка при удалении файлов вложений:", err.message);
+  }
+}
+
+// Выполняет изменение и освобождает файлы, собранные work в orphans; callback(err, result)
+function withOrphanRelease(db, releaseFile, work, callback) {
+  const orphans = [];
+  db.transaction((tx) => work(tx, orphans))
+    .then(async (result) => {
+      await releaseOrphans(db, orphans, releaseFile);
+      return result;
+    })
+    .then((result) => callback(null, result), (err) => callback(err));
+}
+
+// Добавляет вложения одной транзакцией: либо все, либо ни одного;
+// callback(err, found) — found=false, если дефекта нет.
+// commitFile(tx, attachment, index) переносит загруженный файл в хранилище (или null для вложений без файла).
+export function appendAttachments(db, defectId, attachments, commitFile, callback) {
+  db.transaction(async (tx) => {
+    if (!(await touchDefect(tx, defectId, attachments[0].uploadedAt))) return false;
+
+    for (const [index, attachment] of attachments.entries()) {
+      await tx.run(
+        "INSERT INTO defect_attachments (id, defectId, name, size, type, url, uploadedAt, uploadedBy, sha256) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+          attachment.id,
+          defectId,
+          attachment.name,
+          attachment.size,
+          attachment.type,
+          attachment.url,
+          attachment.uploadedAt,
+          attachment.uploadedBy,
+          attachment.sha256 ?? null,
+        ]
+      );
+      await commitFile?.(tx, attachment, index);
+      await recordDefectEvent(tx, {
+        type: "attachment",
+        defectId,
+        actor: attachment.uploadedBy,
+        at: attachment.uploadedAt,
+        data: { action: "added", attachment: fileInfo(attachment) },
+      });
+    }
+    return true;
+  }, callback);
+}
+
+// Удаляет вложение; callback(err, removed).
+// releaseFile(sha256) вызывается, если файл больше никому не нужен.
+export function removeAttachment(db, defectId, attachmentId, actor, releaseFile, callback) {
+  withOrphanRelease(db, releaseFile, async (tx, orphans) => {
+    const row = await tx.get("SELECT * FROM defect_attachments WHERE id = ? AND defectId = ?", [attachmentId, defectId]);
+    if (!row) return false;
+
+    const timestamp = new Date().toISOString();
+    await tx.run("DELETE FROM defect_attachments WHERE id = ? AND defectId = ?", [attachmentId, defectId]);
+    await touchDefect(tx, defectId, timestamp);
+    await recordDefectEvent(tx, {
+      type: "attachment",
+      defectId,
+      actor,
+      at: timestamp,
+      data: { action: "removed", attachment: fileInfo(row) },
+    });
+    if (row.sha256) orphans.push(...(await collectOrphans(tx, [row.sha256])));
+    return true;
+  }, callback);
+}
+
+// Удаляет дефект вместе с дочерними записями (каскадно) и освобождает файлы вложений;
+// callback(err, deleted) — deleted = { projectId } или false, если дефекта нет.
+// В журнал попадает последнее состояние дефекта: дочерние записи удаляются, журнал остается.
+export function deleteDefect(db, defectId, actor, releaseFile, callback) {
+  withOrphanRelease(db, releaseFile, async (tx, orphans) => {
+    const defect = await tx.get("SELECT * FROM defects WHERE id = ?", [defectId]);
+    if (!defect) return false;
+
+    const rows = await tx.all(
+      "SELECT DISTINCT sha256 FROM defect_attachments WHERE defectId = ? AND sha256 IS NOT NULL",
+      [defectId]
+    );
+    await tx.run("DELETE FROM defects WHERE id = ?", [defectId]);
+    await recordDefectEvent(tx, { type: "deleted", defectId, projectId: defect.projectId, actor, data: { defect } });
+    orphans.push(...(await collectOrphans(tx, rows.map((row) => row.sha256))));
+    return { projectId: defect.projectId };
+  }, callback);
+}
@@ -0,0 +1,125 @@
+// Счетчики статистики дефектов (таблица defect_counters).
+// Триггеры на defects поддерживают счетчики при каждой записи, поэтому
+// /api/defects/stats читает несколько строк вместо агрегации всей таблицы.
+// projectId = '' — счетчики по всем проектам.
+
+const COUNTER_SOURCES = `
+  SELECT '' AS projectId, 'status' AS dimension, status AS key FROM defects
+  UNION ALL SELECT '', 'priority', priority FROM defects
+  UNION ALL SELECT '', 'month', substr(createdAt, 1, 7) FROM defects
+  UNION ALL SELECT projectId, 'status', status FROM defects
+  UNION ALL SELECT projectId, 'priority', priority FROM defects
+  UNION ALL SELECT projectId, 'month', substr(createdAt, 1, 7) FROM defects
+`;
+
+// Полный пересчет счетчиков из defects
+export const REBUILD_COUNTERS_SQL = `
+  DELETE FROM defect_counters;
+  INSERT INTO defect_counters (projectId, dimension, key, count)
+    SELECT projectId, dimension, key, COUNT(*) FROM (${COUNTER_SOURCES}) GROUP BY projectId, dimension, key;
+  UPDATE defect_counters_version SET version = version + 1;
+`;
+
+// Строки счетчиков для значений строки дефекта (prefix = new | old) с приращением delta
+const counterRows = (prefix, delta) => `
+  ('', 'status', ${prefix}.status, ${delta}),
+  ('', 'priority', ${prefix}.priority, ${delta}),
+  ('', 'month', substr(${prefix}.createdAt, 1, 7), ${delta}),
+  (${prefix}.projectId, 'status', ${prefix}.status, ${delta}),
+  (${prefix}.projectId, 'priority', ${prefix}.priority, ${delta}),
+  (${prefix}.projectId, 'month', substr(${prefix}.createdAt, 1, 7), ${delta})
+`;
+
+const upsertCounters = (rows) => `
+  INSERT INTO defect_counters (projectId, dimension, key, count) VALUES ${rows}
+    ON CONFLICT (projectId, dimension, key) DO UPDATE SET count = count + excluded.count;
+  UPDATE defect_counters_version SET version = version + 1;
+`;
+
+export const COUNTERS_SCHEMA_SQL = `
+  CREATE TABLE IF NOT EXISTS defect_counters (
+    projectId TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (projectId, dimension, key)
+  ) WITHOUT ROWID;
+
+  CREATE TABLE IF NOT EXISTS defect_counters_version (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL
+  );
+  INSERT OR IGNORE INTO defect_counters_version (id, version) VALUES (1, 0);
+
+  CREATE TRIGGER IF NOT EXISTS defect_counters_insert AFTER INSERT ON defects BEGIN
+    ${upsertCounters(counterRows("new", 1))}
+  END;
+
+  CREATE TRIGGER IF NOT EXISTS defect_counters_delete AFTER DELETE ON defects BEGIN
+    ${upsertCounters(counterRows("old", -1))}
+  END;
+
+  CREATE TRIGGER IF NOT EXISTS defect_counters_update AFTER UPDATE OF status, priority, projectId, createdAt ON defects
+  WHEN old.status IS NOT new.status
+    OR old.priority IS NOT new.priority
+    OR old.projectId IS NOT new.projectId
+    OR substr(old.createdAt, 1, 7) IS NOT substr(new.createdAt, 1, 7)
+  BEGIN
+    ${upsertCounters(`${counterRows("old", -1)}, ${counterRows("new", 1)}`)}
+  END;
+`;
+
+export function readStatsVersion(db, callback) {
+  db.get("SELECT version FROM defect_counters_version WHERE id = 1", (err, row) => {
+    if (err) return callback(err);
+    callback(null, row ? row.version : 0);
+  });
+}
+
+// Статистика в формате /api/defects/stats для всех проектов или одного проекта
+export function readDefectStats(db, projectId, callback) {
+  db.all(
+    "SELECT dimension, key, count FROM defect_counters WHERE projectId = ? AND count > 0",
+    [projectId || ""],
+    (err, rows) => {
+      if (err) return callback(err);
+
+      const byStatus = { new: 0, in_progress: 0, in_review: 0, closed: 0, cancelled: 0 };
+      const byPriority = { low: 0, medium: 0, high: 0, critical: 0 };
+      const monthlyCreated = [];
+
+      for (const row of rows) {
+        if (row.dimension === "status") byStatus[row.key] = row.count;
+        else if (row.dimension === "priority") byPriority[row.key] = row.count;
+        else if (row.dimension === "month") monthlyCreated.push({ month: row.key, count: row.count });
+      }
+
+      monthlyCreated.sort((a, b) => (a.month > b.month ? 1 : -1));
+      callback(null, { byStatus, byPriority, monthlyCreated });
+    }
+  );
+}
+
+export function rebuildDefectCounters(db, callback) {
+  db.exec(`BEGIN; ${REBUILD_COUNTERS_SQL} COMMIT;`, (err) => {
+    if (err) return db.exec("ROLLBACK", () => callback(err));
+    callback(null);
+  });
+}
+
+// Сравнение счетчиков с полным пересчетом; callback(err, mismatches)
+export function checkDefectCounters(db, callback) {
+  const sql = `
+    SELECT COALESCE(a.projectId, e.projectId) AS projectId,
+           COALESCE(a.dimension, e.dimension) AS dimension,
+           COALESCE(a.key, e.key) AS key,
+           COALESCE(a.count, 0) AS actual,
+           COALESCE(e.count, 0) AS expected
+    FROM (SELECT * FROM defect_counters WHERE count != 0) a
+    FULL OUTER JOIN (
+      SELECT projectId, dimension, key, COUNT(*) AS count FROM (${COUNTER_SOURCES}) GROUP BY projectId, dimension, key
+    ) e ON a.projectId = e.projectId AND a.dimension = e.dimension AND a.key = e.key
+    WHERE COALESCE(a.count, 0) != COALESCE(e.count, 0)
+  `;
+  db.all(sql, callback);
+}
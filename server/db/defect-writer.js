@@ -0,0 +1,50 @@
+import { recordDefectEvents } from './defect-events.js';
+
+// Пакетная запись дефектов: одна транзакция на пачку и один подготовленный запрос.
+// Ошибка отдельной строки (например, повтор id) откатывает только эту строку.
+
+const DEFECT_COLUMNS = ["id", "projectId", "title", "description", "priority", "assigneeId", "reporterId", "status", "dueDate", "createdAt", "updatedAt"];
+
+const insertSql = (orIgnore) => `
+  INSERT${orIgnore ? " OR IGNORE" : ""} INTO defects (${DEFECT_COLUMNS.join(", ")})
+  VALUES (${DEFECT_COLUMNS.map(() => "?").join(", ")})
+`;
+
+export const defectParams = (defect) => DEFECT_COLUMNS.map((column) => defect[column] ?? null);
+
+export const INSERT_DEFECT_SQL = insertSql(false);
+
+// Вставляет пачку дефектов в одной транзакции.
+// Результат: { inserted, errors: [{ index, message }] }, index — позиция в пачке.
+// ignoreExisting — существующие id пропускаются без ошибки (начальное наполнение).
+// event — тип события журнала для вставленных дефектов ("imported"), actor — кто их добавил;
+// без event журнал не пишется.
+export function insertDefectBatch(db, defects, { ignoreExisting = false, event = null, actor = null } = {}) {
+  return db.transaction(async (tx) => {
+    const insert = tx.prepare(insertSql(ignoreExisting));
+    // Вставки ставятся в очередь запроса сразу, без ожидания каждой по отдельности
+    const results = await Promise.allSettled(defects.map((defect) => insert.run(defectParams(defect))));
+
+    const errors = [];
+    const added = [];
+    results.forEach((result, index) => {
+      if (result.status === "fulfilled") {
+        if (result.value.changes > 0) added.push(defects[index]);
+      } else {
+        errors.push({ index, message: result.reason.message });
+      }
+    });
+
+    if (event) {
+      // Одна вставка в журнал на всю пачку
+      await recordDefectEvents(
+        tx,
+        event,
+        added.map((defect) => ({ defectId: defect.id, projectId: defect.projectId, data: { defect } })),
+        { actor }
+      );
+    }
+
+    return { inserted: added.length, errors };
+  });
+}
@@ -0,0 +1,233 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import readline from 'readline';
+import zlib from 'zlib';
+import { Transform } from 'stream';
+import { pipeline } from 'stream/promises';
+import { fileURLToPath } from 'url';
+import { Database } from './database.js';
+import { runMigrations } from './migrations.js';
+import { toLogEvent } from './defect-events.js';
+
+// Перенос старых событий журнала defect_events в сжатые помесячные файлы.
+// В архив уходят только целые месяцы, закончившиеся раньше чем retainDays дней назад.
+// Файл сегмента — NDJSON в gzip: defect-events-<YYYY-MM>-<firstSeq>-<lastSeq>.ndjson.gz.
+// Порядок: файл пишется во временный, сбрасывается на диск и ставится на место без
+// перезаписи; затем одной транзакцией добавляется запись в defect_event_segments и
+// удаляются перенесенные строки. Если транзакция не прошла, файл удаляется — события
+// остаются в базе и попадут в архив при следующем запуске.
+//
+// Запуск: node server/db/event-archive.js [путь к БД] [--retain-days=90] [--dir=./archive/events]
+
+export const DEFAULT_RETAIN_DAYS = 90;
+const READ_CHUNK = 5000;
+
+const monthStart = (month) => `${month}-01T00:00:00.000Z`;
+
+const nextMonth = (month) => {
+  const [year, index] = month.split("-").map(Number);
+  return new Date(Date.UTC(year, index, 1)).toISOString().slice(0, 7);
+};
+
+// Строки месяца по порядку (at, seq) порциями — индекс по at содержит и seq
+async function* readMonth(db, from, to) {
+  let after = null;
+  for (;;) {
+    const rows = after
+      ? await db.all(
+        "SELECT * FROM defect_events WHERE (at, seq) > (?, ?) AND at < ? ORDER BY at, seq LIMIT ?",
+        [after.at, after.seq, to, READ_CHUNK]
+      )
+      : await db.all(
+        "SELECT * FROM defect_events WHERE at >= ? AND at < ? ORDER BY at, seq LIMIT ?",
+        [from, to, READ_CHUNK]
+      );
+    if (rows.length === 0) return;
+    yield rows;
+    after = rows[rows.length - 1];
+  }
+}
+
+// Пишет события месяца во временный файл; возвращает сведения о сегменте или null, если событий нет
+async function writeSegmentFile(db, dir, month) {
+  const from = monthStart(month);
+  const to = monthStart(nextMonth(month));
+  const tmpPath = path.join(dir, `.${month}-${process.pid}-${crypto.randomUUID()}.tmp`);
+  const hash = crypto.createHash("sha256");
+  const info = { month, firstSeq: Infinity, lastSeq: 0, firstAt: null, lastAt: null, count: 0, bytes: 0 };
+
+  async function* lines() {
+    for await (const rows of readMonth(db, from, to)) {
+      let chunk = "";
+      for (const row of rows) {
+        info.firstSeq = Math.min(info.firstSeq, row.seq);
+        info.lastSeq = Math.max(info.lastSeq, row.seq);
+        info.firstAt ??= row.at;
+        info.lastAt = row.at;
+        info.count++;
+        chunk += `${JSON.stringify(toLogEvent(row))}\n`;
+      }
+      yield chunk;
+    }
+  }
+
+  const digest = new Transform({
+    transform(chunk, encoding, callback) {
+      hash.update(chunk);
+      info.bytes += chunk.length;
+      callback(null, chunk);
+    },
+  });
+
+  try {
+    await pipeline(lines(), zlib.createGzip({ level: 9 }), digest, fs.createWriteStream(tmpPath, { flags: "wx" }));
+    // Файл должен быть на диске до удаления строк из базы
+    const handle = await fs.promises.open(tmpPath, "r+");
+    await handle.sync().finally(() => handle.close());
+  } catch (err) {
+    await fs.promises.rm(tmpPath, { force: true });
+    throw err;
+  }
+
+  if (info.count === 0) {
+    await fs.promises.rm(tmpPath, { force: true });
+    return null;
+  }
+  return { ...info, from, to, tmpPath, sha256: hash.digest("hex") };
+}
+
+// Архивирует один месяц; возвращает запись сегмента или null, если месяц уже перенесен другим запуском
+async function archiveMonth(db, dir, month) {
+  const segment = await writeSegmentFile(db, dir, month);
+  if (!segment) return null;
+
+  const file = `defect-events-${month}-${segment.firstSeq}-${segment.lastSeq}.ndjson.gz`;
+  const target = path.join(dir, file);
+  try {
+    // link, а не rename: существующий файл другого запуска не перезаписывается
+    await fs.promises.link(segment.tmpPath, target);
+  } catch (err) {
+    if (err.code === "EEXIST") return null;
+    throw err;
+  } finally {
+    await fs.promises.rm(segment.tmpPath, { force: true });
+  }
+
+  const record = {
+    file,
+    month,
+    firstSeq: segment.firstSeq,
+    lastSeq: segment.lastSeq,
+    firstAt: segment.firstAt,
+    lastAt: segment.lastAt,
+    count: segment.count,
+    bytes: segment.bytes,
+    sha256: segment.sha256,
+    createdAt: new Date().toISOString(),
+  };
+
+  try {
+    await db.transaction(async (tx) => {
+      await tx.run(
+        `INSERT INTO defect_event_segments (file, month, firstSeq, lastSeq, firstAt, lastAt, count, bytes, sha256, createdAt)
+         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)`,
+        [
+          record.file, record.month, record.firstSeq, record.lastSeq, record.firstAt, record.lastAt,
+          record.count, record.bytes, record.sha256, record.createdAt,
+        ]
+      );
+      const { changes } = await tx.run(
+        "DELETE FROM defect_events WHERE at >= ? AND at < ? AND seq BETWEEN ? AND ?",
+        [segment.from, segment.to, segment.firstSeq, segment.lastSeq]
+      );
+      if (changes !== segment.count) {
+        throw new Error(`События за ${month} изменились во время переноса в архив`);
+      }
+    });
+  } catch (err) {
+    await fs.promises.rm(target, { force: true });
+    throw err;
+  }
+  return record;
+}
+
+// Переносит в архив все месяцы старше retainDays; возвращает список созданных сегментов
+export async function archiveDefectEvents(db, { dir, retainDays = DEFAULT_RETAIN_DAYS, now = new Date() }) {
+  await fs.promises.mkdir(dir, { recursive: true });
+
+  const cutoff = new Date(now.getTime() - retainDays * 24 * 60 * 60 * 1000).toISOString();
+  const archived = [];
+  const skipped = new Set();
+
+  for (;;) {
+    const oldest = await db.get(
+      "SELECT MIN(at) AS at FROM defect_events WHERE at >= ?",
+      [skipped.size > 0 ? monthStart(nextMonth([...skipped].pop())) : ""]
+    );
+    if (!oldest?.at) break;
+
+    const month = oldest.at.slice(0, 7);
+    if (monthStart(nextMonth(month)) > cutoff) break;
+
+    const record = await archiveMonth(db, dir, month);
+    if (record) {
+      archived.push(record);
+    } else {
+      skipped.add(month);
+    }
+  }
+
+  return archived;
+}
+
+// Сегменты, пересекающиеся с интервалом [from, to), по порядку seq
+export function listEventSegments(db, { from, to } = {}, callback) {
+  db.all(
+    `SELECT * FROM defect_event_segments
+     WHERE (? IS NULL OR lastAt >= ?) AND (? IS NULL OR firstAt < ?)
+     ORDER BY firstSeq`,
+    [from ?? null, from ?? null, to ?? null, to ?? null],
+    callback
+  );
+}
+
+// События из файла сегмента по одному
+export async function* readEventSegment(dir, segment) {
+  const input = fs.createReadStream(path.join(dir, segment.file)).pipe(zlib.createGunzip());
+  const lines = readline.createInterface({ input, crlfDelay: Infinity });
+  for await (const line of lines) {
+    if (line) yield JSON.parse(line);
+  }
+}
+
+const isMain = process.argv[1] && fileURLToPath(import.meta.url) === process.argv[1];
+
+if (isMain) {
+  const args = process.argv.slice(2);
+  const option = (name) => args.find((arg) => arg.startsWith(`--${name}=`))?.split("=")[1];
+  const dbPath = args.find((arg) => !arg.startsWith("--")) || process.env.DATABASE_PATH || './database.db';
+  const retainDays = Number(option("retain-days") ?? process.env.EVENT_RETAIN_DAYS ?? DEFAULT_RETAIN_DAYS);
+  const dir = option("dir") || process.env.EVENT_ARCHIVE_DIR || './archive/events';
+  const db = new Database(dbPath, { readers: 0 });
+
+  const fail = (err) => {
+    console.error("Ошибка при переносе событий в архив:", err.message);
+    process.exit(2);
+  };
+
+  db.open((err) => {
+    if (err) return fail(err);
+
+    runMigrations(db.writer, (err) => {
+      if (err) return fail(err);
+
+      archiveDefectEvents(db, { dir, retainDays })
+        .then((segments) => {
+          console.log(JSON.stringify({ dir, retainDays, segments }, null, 2));
+          return db.close();
+        })
+        .then(() => process.exit(0), fail);
+    });
+  });
+}
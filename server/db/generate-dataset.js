@@ -0,0 +1,389 @@
+import { fileURLToPath } from 'url';
+import { Database } from './database.js';
+import { runMigrations } from './migrations.js';
+import { insertMockProjects } from './seed.js';
+
+// Синтетический набор дефектов для нагрузочных тестов: от десятков тысяч до десятков миллионов строк.
+// Распределения статусов, приоритетов, проектов и исполнителей близки к реальным; у дефектов есть
+// история смены статусов, комментарии и вложения (только метаданные, без файлов в хранилище).
+// Каждый дефект строится из собственного генератора случайных чисел (seed, номер), поэтому
+// набор не зависит от размера пачек, а прерванная генерация продолжается с места остановки.
+// Даты отсчитываются от фиксированного момента until, а не от текущего времени.
+// Строки пишутся пачками: одна транзакция и по одному INSERT ... SELECT FROM json_each на таблицу.
+// Триггеры счетчиков статистики и полнотекстового индекса работают как при обычной записи.
+// Запускать при остановленном сервере: его кэши ответов о новых строках не узнают.
+//
+// Запуск: node server/db/generate-dataset.js [путь к БД] [--size=10k|1m|10m|<число>] [--seed=1]
+//         [--batch=5000] [--until=2026-01-01T00:00:00.000Z] [--days=730]
+
+export const DATASET_SIZES = { "10k": 10_000, "100k": 100_000, "1m": 1_000_000, "10m": 10_000_000 };
+export const DEFAULT_UNTIL = "2026-01-01T00:00:00.000Z";
+const DEFAULT_BATCH = 5000;
+const DEFAULT_DAYS = 730;
+const DAY_MS = 24 * 60 * 60 * 1000;
+
+const USERS = ["u1", "u2", "u3", "u4", "u5", "u6", "u7", "u8", "u9", "u10"];
+const STAFF = [
+  "engineer@example.com", "ivan.petrov@example.com", "anna.smirnova@example.com",
+  "sergey.kuznetsov@example.com", "elena.volkova@example.com", "dmitry.kozlov@example.com",
+  "manager@example.com", "maria.ivanova@example.com", "alexey.sidorov@example.com",
+];
+
+const DEFECT_KINDS = [
+  "Трещина", "Протечка", "Скол", "Отслоение", "Вздутие", "Коррозия", "Неровность", "Зазор",
+  "Деформация", "Повреждение", "Загрязнение", "Промерзание", "Прогиб", "Провисание", "Отсутствие",
+];
+const ELEMENTS = [
+  "штукатурки", "облицовочной плитки", "кровельного покрытия", "стяжки пола", "оконного блока",
+  "входной двери", "утеплителя", "гидроизоляции", "фасадной панели", "трубопровода отопления",
+  "кабельной трассы", "лакокрасочного покрытия", "плиты перекрытия", "лестничного марша",
+  "витражного остекления", "вентиляционного короба", "ламината", "подвесного потолка",
+];
+const PLACES = ["квартира", "лестничная клетка", "лифтовой холл", "техподполье", "паркинг", "кровля", "МОП", "офис"];
+const FINDINGS = [
+  "Выявлено при обходе технического надзора.",
+  "Обнаружено при приемке работ подрядчика.",
+  "Замечание заказчика по результатам осмотра.",
+  "Зафиксировано при контрольном замере.",
+  "Жалоба будущего собственника при предварительном осмотре.",
+];
+const DETAILS = [
+  "Ширина раскрытия до {n} мм.",
+  "Площадь поврежденного участка около {n} м².",
+  "Отклонение от проектного положения {n} мм.",
+  "Следы намокания на {n} участках.",
+  "Повреждение на длине около {n} м.",
+];
+const REQUIREMENTS = [
+  "Требуется устранить до сдачи этапа.",
+  "Необходима консультация проектировщика.",
+  "Требует замены материала.",
+  "Подрядчику выдано предписание.",
+  "Не влияет на несущую способность, устранить при отделке.",
+  "Критично для безопасности, работы на участке приостановлены.",
+];
+const COMMENTS = [
+  "Принято в работу.",
+  "Подрядчик уведомлен, ожидаем график устранения.",
+  "Материал заказан, поставка через неделю.",
+  "Работы выполнены, прошу проверить.",
+  "При повторном осмотре дефект не устранен полностью.",
+  "Фотофиксация приложена.",
+  "Согласовано с техническим надзором.",
+  "Перенесено на следующий этап работ.",
+];
+const REASONS = ["Плановые работы", "По предписанию технадзора", "Работы выполнены подрядчиком", "Повторная проверка", null];
+
+// mulberry32: быстрый детерминированный генератор на 32-битном состоянии
+function createRandom(seed) {
+  let state = seed >>> 0;
+  return () => {
+    state = (state + 0x6d2b79f5) | 0;
+    let t = Math.imul(state ^ (state >>> 15), 1 | state);
+    t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+    return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+  };
+}
+
+const pick = (random, items) => items[Math.floor(random() * items.length)];
+
+// Индекс по весам; веса заданы накопленными суммами
+const pickWeighted = (random, cumulative) => {
+  const r = random() * cumulative[cumulative.length - 1];
+  let index = 0;
+  while (cumulative[index] <= r) index++;
+  return index;
+};
+
+// Накопленные веса закона Ципфа: первый элемент встречается чаще остальных
+const zipfWeights = (count) => {
+  let sum = 0;
+  return Array.from({ length: count }, (_, i) => (sum += 1 / (i + 1)));
+};
+
+const PRIORITY_WEIGHTS = { values: ["critical", "high", "medium", "low"], cumulative: [10, 30, 70, 100] };
+const ASSIGNEE_WEIGHTS = zipfWeights(USERS.length);
+
+// Путь статусов до итогового: history — промежуточные переходы
+const STATUS_PATHS = {
+  new: [],
+  in_progress: ["in_progress"],
+  in_review: ["in_progress", "in_review"],
+  closed: ["in_progress", "in_review", "closed"],
+  cancelled: ["cancelled"],
+};
+
+const datasetPrefix = (seed) => `d_s${seed}_`;
+const defectId = (seed, index) => `${datasetPrefix(seed)}${String(index).padStart(8, "0")}`;
+
+// Дефект номер index вместе с историей, комментариями и вложениями
+export function buildSyntheticDefect(index, { seed, projectIds, projectWeights, untilMs, days }) {
+  const random = createRandom(Math.imul(seed, 0x9e3779b1) + index);
+  const id = defectId(seed, index);
+
+  // Новых дефектов больше, чем старых: возраст смещен к началу интервала
+  const ageDays = days * random() ** 1.6;
+  const createdMs = Math.floor(untilMs - ageDays * DAY_MS);
+
+  // Чем старше дефект, тем вероятнее, что он закрыт
+  let status;
+  if (random() < 0.07) {
+    status = "cancelled";
+  } else if (random() < Math.exp(-ageDays / 45)) {
+    const r = random();
+    status = r < 0.3 ? "new" : r < 0.8 ? "in_progress" : "in_review";
+  } else {
+    status = "closed";
+  }
+
+  const priority = PRIORITY_WEIGHTS.values[pickWeighted(random, PRIORITY_WEIGHTS.cumulative)];
+  const assigneeId = status === "new" && random() < 0.6 ? null : USERS[pickWeighted(random, ASSIGNEE_WEIGHTS)];
+  const section = 1 + Math.floor(random() * 6);
+  const floor = 1 + Math.floor(random() * 25);
+  const title = `${pick(random, DEFECT_KINDS)} ${pick(random, ELEMENTS)}, секция ${section}, этаж ${floor}`;
+  const description = [
+    pick(random, FINDINGS),
+    pick(random, DETAILS).replace("{n}", String(1 + Math.floor(random() * 30))),
+    `Место: ${pick(random, PLACES)}.`,
+    pick(random, REQUIREMENTS),
+  ].join(" ");
+
+  // События после создания идут с интервалами в часы и дни, но не позже until
+  let lastMs = createdMs;
+  const after = (meanHours) => {
+    lastMs = Math.min(untilMs, lastMs + Math.floor(-Math.log(1 - random()) * meanHours * 3600 * 1000) + 60_000);
+    return new Date(lastMs).toISOString();
+  };
+
+  const history = [];
+  const comments = [];
+  const attachments = [];
+  const steps = [...STATUS_PATHS[status]];
+  // Часть дефектов возвращают на доработку после проверки
+  if (steps.includes("in_review") && random() < 0.15) {
+    steps.splice(steps.indexOf("in_review") + 1, 0, "in_progress", "in_review");
+  }
+
+  for (const step of steps) {
+    const timestamp = after(priority === "critical" ? 12 : 72);
+    history.push({
+      action: `Статус изменен на "${step}"`,
+      timestamp,
+      changes: JSON.stringify({ status: step }),
+      reason: pick(random, REASONS),
+      changedBy: pick(random, STAFF),
+    });
+    if (random() < 0.5) {
+      const author = pick(random, STAFF);
+      comments.push({
+        id: `comment_${id}_${comments.length + 1}`,
+        message: pick(random, COMMENTS),
+        authorName: author.split("@")[0],
+        createdAt: after(6),
+      });
+    }
+  }
+
+  if (random() < 0.35) {
+    const count = 1 + Math.floor(random() * 4);
+    for (let i = 1; i <= count; i++) {
+      const photo = random() < 0.8;
+      attachments.push({
+        id: `att_${id}_${i}`,
+        name: photo ? `IMG_${String(Math.floor(random() * 10000)).padStart(4, "0")}.jpg` : `Акт осмотра ${i}.pdf`,
+        size: Math.floor((photo ? 400_000 : 80_000) * Math.exp(random() * 2)),
+        type: photo ? "image/jpeg" : "application/pdf",
+        uploadedAt: new Date(Math.min(untilMs, createdMs + i * 60_000)).toISOString(),
+        uploadedBy: pick(random, STAFF),
+      });
+    }
+  }
+
+  const createdAt = new Date(createdMs).toISOString();
+  const dueDate = random() < 0.6
+    ? new Date(createdMs + (7 + Math.floor(random() * 53)) * DAY_MS).toISOString()
+    : null;
+
+  return {
+    defect: {
+      id,
+      projectId: projectIds[pickWeighted(random, projectWeights)],
+      title,
+      description,
+      priority,
+      assigneeId,
+      reporterId: pick(random, USERS),
+      status,
+      dueDate,
+      createdAt,
+      updatedAt: new Date(Math.max(lastMs, createdMs)).toISOString(),
+    },
+    history,
+    comments,
+    attachments,
+  };
+}
+
+const INSERT_DEFECTS_SQL = `
+  INSERT OR IGNORE INTO defects (id, projectId, title, description, priority, assigneeId, reporterId, status, dueDate, createdAt, updatedAt)
+  SELECT json_extract(value, '$.id'), json_extract(value, '$.projectId'), json_extract(value, '$.title'),
+         json_extract(value, '$.description'), json_extract(value, '$.priority'), json_extract(value, '$.assigneeId'),
+         json_extract(value, '$.reporterId'), json_extract(value, '$.status'), json_extract(value, '$.dueDate'),
+         json_extract(value, '$.createdAt'), json_extract(value, '$.updatedAt')
+  FROM json_each(?)
+`;
+
+const INSERT_HISTORY_SQL = `
+  INSERT INTO defect_history (defectId, action, timestamp, changes, reason, changedBy)
+  SELECT json_extract(value, '$.defectId'), json_extract(value, '$.action'), json_extract(value, '$.timestamp'),
+         json_extract(value, '$.changes'), json_extract(value, '$.reason'), json_extract(value, '$.changedBy')
+  FROM json_each(?)
+`;
+
+const INSERT_COMMENTS_SQL = `
+  INSERT OR IGNORE INTO defect_comments (id, defectId, message, authorId, authorName, createdAt)
+  SELECT json_extract(value, '$.id'), json_extract(value, '$.defectId'), json_extract(value, '$.message'),
+         NULL, json_extract(value, '$.authorName'), json_extract(value, '$.createdAt')
+  FROM json_each(?)
+`;
+
+const INSERT_ATTACHMENTS_SQL = `
+  INSERT OR IGNORE INTO defect_attachments (id, defectId, name, size, type, url, uploadedAt, uploadedBy)
+  SELECT json_extract(value, '$.id'), json_extract(value, '$.defectId'), json_extract(value, '$.name'),
+         json_extract(value, '$.size'), json_extract(value, '$.type'), NULL,
+         json_extract(value, '$.uploadedAt'), json_extract(value, '$.uploadedBy')
+  FROM json_each(?)
+`;
+
+// Строки пачки по таблицам
+function buildBatch(from, to, options) {
+  const batch = { defects: [], history: [], comments: [], attachments: [] };
+  for (let index = from; index < to; index++) {
+    const { defect, history, comments, attachments } = buildSyntheticDefect(index, options);
+    batch.defects.push(defect);
+    for (const entry of history) batch.history.push({ defectId: defect.id, ...entry });
+    for (const comment of comments) batch.comments.push({ defectId: defect.id, ...comment });
+    for (const attachment of attachments) batch.attachments.push({ defectId: defect.id, ...attachment });
+  }
+  return batch;
+}
+
+function writeBatch(db, batch) {
+  return db.transaction(async (tx) => {
+    const { changes } = await tx.run(INSERT_DEFECTS_SQL, [JSON.stringify(batch.defects)]);
+    await tx.run(INSERT_HISTORY_SQL, [JSON.stringify(batch.history)]);
+    await tx.run(INSERT_COMMENTS_SQL, [JSON.stringify(batch.comments)]);
+    await tx.run(INSERT_ATTACHMENTS_SQL, [JSON.stringify(batch.attachments)]);
+    return {
+      defects: changes,
+      history: batch.history.length,
+      comments: batch.comments.length,
+      attachments: batch.attachments.length,
+    };
+  });
+}
+
+// Номер следующего дефекта набора: пачки пишутся по порядку и целиком, поэтому
+// все номера до последнего записанного уже есть в базе
+async function nextIndex(db, seed) {
+  const prefix = datasetPrefix(seed);
+  const row = await db.get("SELECT MAX(id) AS id FROM defects WHERE id > ? AND id < ?", [prefix, `${prefix}~`]);
+  return row?.id ? Number(row.id.slice(prefix.length)) + 1 : 1;
+}
+
+export function parseDatasetSize(value) {
+  const size = DATASET_SIZES[String(value).toLowerCase()] ?? Number(value);
+  return Number.isInteger(size) && size > 0 ? size : null;
+}
+
+// Дополняет набор с данным seed до size дефектов.
+// onProgress({ written, size }) вызывается после каждой пачки.
+// Результат: { seed, size, skipped, defects, history, comments, attachments }.
+export async function generateDataset(db, {
+  size,
+  seed = 1,
+  batchSize = DEFAULT_BATCH,
+  until = DEFAULT_UNTIL,
+  days = DEFAULT_DAYS,
+  onProgress = () => {},
+}) {
+  let projectIds = (await db.all("SELECT id FROM projects ORDER BY id")).map((row) => row.id);
+  if (projectIds.length === 0) {
+    await insertMockProjects(db);
+    projectIds = (await db.all("SELECT id FROM projects ORDER BY id")).map((row) => row.id);
+  }
+
+  const options = { seed, projectIds, projectWeights: zipfWeights(projectIds.length), untilMs: Date.parse(until), days };
+  const first = await nextIndex(db, seed);
+  const totals = { seed, size, skipped: Math.min(first - 1, size), defects: 0, history: 0, comments: 0, attachments: 0 };
+
+  // Следующая пачка строится, пока предыдущая записывается
+  let pending = null;
+  for (let from = first; from <= size; from += batchSize) {
+    const batch = buildBatch(from, Math.min(from + batchSize, size + 1), options);
+    if (pending) await pending;
+    pending = writeBatch(db, batch).then((written) => {
+      for (const key of ["defects", "history", "comments", "attachments"]) totals[key] += written[key];
+      onProgress({ written: totals.skipped + totals.defects, size });
+    });
+  }
+  await pending;
+
+  return totals;
+}
+
+const isMain = process.argv[1] && fileURLToPath(import.meta.url) === process.argv[1];
+
+if (isMain) {
+  const args = process.argv.slice(2);
+  const option = (name) => args.find((arg) => arg.startsWith(`--${name}=`))?.split("=")[1];
+  const dbPath = args.find((arg) => !arg.startsWith("--")) || process.env.DATABASE_PATH || './database.db';
+
+  const fail = (err) => {
+    console.error("Ошибка при генерации набора данных:", err.message);
+    process.exit(2);
+  };
+
+  const size = parseDatasetSize(option("size") ?? "10k");
+  const seed = Number(option("seed") ?? 1);
+  const batchSize = Number(option("batch") ?? DEFAULT_BATCH);
+  const until = option("until") ?? DEFAULT_UNTIL;
+  const days = Number(option("days") ?? DEFAULT_DAYS);
+  if (!size) fail(new Error(`Недопустимый размер: ${option("size")}`));
+  if (!Number.isInteger(seed) || seed < 0) fail(new Error("seed должен быть неотрицательным целым числом"));
+  if (!Number.isInteger(batchSize) || batchSize < 1) fail(new Error("batch должен быть положительным целым числом"));
+  if (Number.isNaN(Date.parse(until))) fail(new Error("until должен быть датой ISO 8601"));
+  if (!(days > 0)) fail(new Error("days должен быть положительным числом"));
+
+  const db = new Database(dbPath, { readers: 0 });
+  const started = Date.now();
+  let reported = 0;
+
+  db.open((err) => {
+    if (err) return fail(err);
+
+    runMigrations(db.writer, (err) => {
+      if (err) return fail(err);
+
+      generateDataset(db, {
+        size,
+        seed,
+        batchSize,
+        until,
+        days,
+        onProgress: ({ written }) => {
+          if (written - reported >= 100_000 || written === size) {
+            reported = written;
+            const rate = Math.round(written / Math.max(1, (Date.now() - started) / 1000));
+            console.error(`Записано дефектов: ${written} из ${size} (${rate}/с)`);
+          }
+        },
+      })
+        .then((totals) => {
+          console.log(JSON.stringify({ ...totals, seconds: (Date.now() - started) / 1000 }, null, 2));
+          return db.close();
+        })
+        .then(() => process.exit(0), fail);
+    });
+  });
+}
@@ -0,0 +1,360 @@
+import { COUNTERS_SCHEMA_SQL, REBUILD_COUNTERS_SQL } from './defect-stats.js';
+import { CACHE_VERSIONS_SCHEMA_SQL } from './cache-versions.js';
+import { PREVIEW_JOBS_SCHEMA_SQL } from './preview-jobs.js';
+import { DEFECT_EVENTS_SCHEMA_SQL } from './defect-events.js';
+
+// Текст для полнотекстового индекса: "ё" и "Ё" заменяются на "е" и "Е"
+const foldYo = (column) => `replace(replace(${column}, 'ё', 'е'), 'Ё', 'Е')`;
+
+// Версионированные миграции схемы базы данных.
+// Каждая миграция применяется один раз в своей транзакции; примененные версии
+// записываются в schema_migrations, текущая версия дублируется в PRAGMA user_version.
+
+export const migrations = [
+  {
+    version: 1,
+    name: "initial_schema",
+    up: `
+      CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        email TEXT UNIQUE NOT NULL,
+        password TEXT NOT NULL,
+        role TEXT NOT NULL
+      );
+
+      CREATE TABLE IF NOT EXISTS projects (
+        id TEXT PRIMARY KEY,
+        name TEXT NOT NULL,
+        code TEXT NOT NULL,
+        location TEXT NOT NULL,
+        stages TEXT NOT NULL
+      );
+
+      CREATE TABLE IF NOT EXISTS defects (
+        id TEXT PRIMARY KEY,
+        projectId TEXT NOT NULL,
+        title TEXT NOT NULL,
+        description TEXT,
+        priority TEXT NOT NULL,
+        assigneeId TEXT,
+        reporterId TEXT NOT NULL,
+        status TEXT NOT NULL,
+        dueDate TEXT,
+        createdAt TEXT NOT NULL,
+        updatedAt TEXT NOT NULL,
+        attachments TEXT DEFAULT '[]',
+        history TEXT DEFAULT '[]',
+        comments TEXT DEFAULT '[]'
+      );
+    `,
+  },
+  {
+    // Индексы под реальные сочетания фильтров и сортировок /api/defects.
+    // id в конце каждого индекса нужен для стабильного порядка и курсорной пагинации.
+    version: 2,
+    name: "defect_list_indexes",
+    up: `
+      CREATE INDEX IF NOT EXISTS idx_defects_created ON defects (createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_due ON defects (dueDate, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_title ON defects (title, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_status ON defects (status, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_priority ON defects (priority, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_project ON defects (projectId, status, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_assignee ON defects (assigneeId, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_stats ON defects (status, priority, createdAt);
+    `,
+  },
+  {
+    // Полнотекстовый поиск по заголовку и описанию.
+    // unicode61 приводит кириллицу к нижнему регистру; "ё" для него отдельная буква,
+    // ее сводит к "е" миграция 11. Префиксные индексы ускоряют поиск по началу слова.
+    // Таблица хранит только индекс (content='defects'), триггеры держат ее в синхроне.
+    version: 3,
+    name: "defects_fts",
+    up: `
+      CREATE VIRTUAL TABLE IF NOT EXISTS defects_fts USING fts5(
+        title,
+        description,
+        content='defects',
+        content_rowid='rowid',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='2 3'
+      );
+
+      CREATE TRIGGER IF NOT EXISTS defects_fts_insert AFTER INSERT ON defects BEGIN
+        INSERT INTO defects_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+      END;
+
+      CREATE TRIGGER IF NOT EXISTS defects_fts_delete AFTER DELETE ON defects BEGIN
+        INSERT INTO defects_fts (defects_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+      END;
+
+      CREATE TRIGGER IF NOT EXISTS defects_fts_update AFTER UPDATE OF title, description ON defects BEGIN
+        INSERT INTO defects_fts (defects_fts, rowid, title, description) VALUES ('delete', old.rowid, old.title, old.description);
+        INSERT INTO defects_fts (rowid, title, description) VALUES (new.rowid, new.title, new.description);
+      END;
+
+      INSERT INTO defects_fts (defects_fts) VALUES ('rebuild');
+    `,
+  },
+  {
+    // История, комментарии и вложения переезжают из JSON-колонок defects в дочерние таблицы:
+    // добавление записи становится одной вставкой вместо перезаписи всей строки дефекта.
+    version: 4,
+    name: "defect_child_tables",
+    up: `
+      CREATE TABLE IF NOT EXISTS defect_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        defectId TEXT NOT NULL REFERENCES defects (id) ON DELETE CASCADE,
+        action TEXT NOT NULL,
+        timestamp TEXT NOT NULL,
+        changes TEXT,
+        reason TEXT,
+        changedBy TEXT
+      );
+      CREATE INDEX IF NOT EXISTS idx_defect_history_defect ON defect_history (defectId, id);
+
+      CREATE TABLE IF NOT EXISTS defect_comments (
+        id TEXT PRIMARY KEY,
+        defectId TEXT NOT NULL REFERENCES defects (id) ON DELETE CASCADE,
+        message TEXT NOT NULL,
+        authorId INTEGER,
+        authorName TEXT,
+        createdAt TEXT NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS idx_defect_comments_defect ON defect_comments (defectId, createdAt);
+
+      CREATE TABLE IF NOT EXISTS defect_attachments (
+        id TEXT PRIMARY KEY,
+        defectId TEXT NOT NULL REFERENCES defects (id) ON DELETE CASCADE,
+        name TEXT NOT NULL,
+        size INTEGER NOT NULL DEFAULT 0,
+        type TEXT,
+        url TEXT,
+        uploadedAt TEXT NOT NULL,
+        uploadedBy TEXT
+      );
+      CREATE INDEX IF NOT EXISTS idx_defect_attachments_defect ON defect_attachments (defectId, uploadedAt);
+
+      INSERT INTO defect_history (defectId, action, timestamp, changes, reason, changedBy)
+        SELECT d.id,
+               COALESCE(json_extract(h.value, '$.action'), ''),
+               COALESCE(json_extract(h.value, '$.timestamp'), d.updatedAt),
+               json_extract(h.value, '$.changes'),
+               json_extract(h.value, '$.reason'),
+               json_extract(h.value, '$.changedBy')
+        FROM defects d, json_each(d.history) h
+        WHERE json_valid(d.history)
+        ORDER BY d.id, h.key;
+
+      INSERT OR IGNORE INTO defect_comments (id, defectId, message, authorId, authorName, createdAt)
+        SELECT COALESCE(json_extract(c.value, '$.id'), 'comment_' || d.id || '_' || c.key),
+               d.id,
+               COALESCE(json_extract(c.value, '$.message'), ''),
+               json_extract(c.value, '$.authorId'),
+               json_extract(c.value, '$.authorName'),
+               COALESCE(json_extract(c.value, '$.createdAt'), d.updatedAt)
+        FROM defects d, json_each(d.comments) c
+        WHERE json_valid(d.comments);
+
+      INSERT OR IGNORE INTO defect_attachments (id, defectId, name, size, type, url, uploadedAt, uploadedBy)
+        SELECT COALESCE(json_extract(a.value, '$.id'), 'att_' || d.id || '_' || a.key),
+               d.id,
+               COALESCE(json_extract(a.value, '$.name'), 'uploaded_file'),
+               COALESCE(json_extract(a.value, '$.size'), 0),
+               json_extract(a.value, '$.type'),
+               json_extract(a.value, '$.url'),
+               COALESCE(json_extract(a.value, '$.uploadedAt'), d.updatedAt),
+               json_extract(a.value, '$.uploadedBy')
+        FROM defects d, json_each(d.attachments) a
+        WHERE json_valid(d.attachments);
+
+      ALTER TABLE defects DROP COLUMN attachments;
+      ALTER TABLE defects DROP COLUMN history;
+      ALTER TABLE defects DROP COLUMN comments;
+    `,
+  },
+  {
+    // Отозванные подписанные токены: "jti:<id>" или "user:<id>", время в миллисекундах
+    version: 5,
+    name: "revoked_tokens",
+    up: `
+      CREATE TABLE IF NOT EXISTS revoked_tokens (
+        id TEXT PRIMARY KEY,
+        revokedAt INTEGER NOT NULL,
+        expiresAt INTEGER NOT NULL
+      );
+      CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires ON revoked_tokens (expiresAt);
+    `,
+  },
+  {
+    // Материализованные счетчики статистики, поддерживаемые триггерами
+    version: 6,
+    name: "defect_counters",
+    up: `
+      ${COUNTERS_SCHEMA_SQL}
+      ${REBUILD_COUNTERS_SQL}
+    `,
+  },
+  {
+    // Версии таблиц projects и users для ETag
+    version: 7,
+    name: "cache_versions",
+    up: CACHE_VERSIONS_SCHEMA_SQL,
+  },
+  {
+    // Хэш содержимого вложения в файловом хранилище; по индексу ищутся ссылки на файл
+    version: 8,
+    name: "attachment_files",
+    up: `
+      ALTER TABLE defect_attachments ADD COLUMN sha256 TEXT;
+      CREATE INDEX IF NOT EXISTS idx_defect_attachments_sha256 ON defect_attachments (sha256) WHERE sha256 IS NOT NULL;
+    `,
+  },
+  {
+    // Очередь миниатюр и превью фотографий, ссылки на них во вложениях
+    version: 9,
+    name: "preview_jobs",
+    up: PREVIEW_JOBS_SCHEMA_SQL,
+  },
+  {
+    // Журнал изменений дефектов (только добавление) и архивные сегменты
+    version: 10,
+    name: "defect_events",
+    up: DEFECT_EVENTS_SCHEMA_SQL,
+  },
+  {
+    // Поиск без различия "ё" и "е": unicode61 не сводит их друг к другу,
+    // поэтому индекс строится по тексту с заменой "ё" на "е" (то же делает buildFtsQuery).
+    // Индекс хранит только термы (content=''): пересчет из defects по 'rebuild'
+    // проиндексировал бы исходный текст. Триггеры передают в 'delete' тот же нормализованный текст.
+    version: 11,
+    name: "defects_fts_yo",
+    up: `
+      DROP TRIGGER IF EXISTS defects_fts_insert;
+      DROP TRIGGER IF EXISTS defects_fts_delete;
+      DROP TRIGGER IF EXISTS defects_fts_update;
+      DROP TABLE IF EXISTS defects_fts;
+
+      CREATE VIRTUAL TABLE defects_fts USING fts5(
+        title,
+        description,
+        content='',
+        tokenize="unicode61 remove_diacritics 2",
+        prefix='2 3'
+      );
+
+      CREATE TRIGGER defects_fts_insert AFTER INSERT ON defects BEGIN
+        INSERT INTO defects_fts (rowid, title, description)
+          VALUES (new.rowid, ${foldYo("new.title")}, ${foldYo("new.description")});
+      END;
+
+      CREATE TRIGGER defects_fts_delete AFTER DELETE ON defects BEGIN
+        INSERT INTO defects_fts (defects_fts, rowid, title, description)
+          VALUES ('delete', old.rowid, ${foldYo("old.title")}, ${foldYo("old.description")});
+      END;
+
+      CREATE TRIGGER defects_fts_update AFTER UPDATE OF title, description ON defects BEGIN
+        INSERT INTO defects_fts (defects_fts, rowid, title, description)
+          VALUES ('delete', old.rowid, ${foldYo("old.title")}, ${foldYo("old.description")});
+        INSERT INTO defects_fts (rowid, title, description)
+          VALUES (new.rowid, ${foldYo("new.title")}, ${foldYo("new.description")});
+      END;
+
+      INSERT INTO defects_fts (rowid, title, description)
+        SELECT rowid, ${foldYo("title")}, ${foldYo("description")} FROM defects;
+    `,
+  },
+  {
+    // Версия карточки дефекта для ETag и кэша ответов вместо updatedAt:
+    // два изменения в одну миллисекунду дают одинаковый updatedAt, но разные версии.
+    // Любое изменение строки (в том числе обновление updatedAt при записи в дочерние
+    // таблицы) увеличивает version; вложенный UPDATE меняет только version, поэтому
+    // триггер не срабатывает повторно, а триггеры по колонкам (FTS, счетчики) не затрагиваются.
+    version: 12,
+    name: "defect_versions",
+    up: `
+      ALTER TABLE defects ADD COLUMN version INTEGER NOT NULL DEFAULT 0;
+
+      CREATE TRIGGER IF NOT EXISTS defects_version_update AFTER UPDATE ON defects
+      WHEN new.version IS old.version
+      BEGIN
+        UPDATE defects SET version = old.version + 1 WHERE rowid = new.rowid;
+      END;
+    `,
+  },
+  {
+    // Индексы под порядок списка с фильтрами: страница читается из индекса по порядку
+    // ключа сортировки (createdAt, id или priority/status, createdAt, id), а не сортирует
+    // все подходящие строки во временном B-дереве. В idx_defects_project между projectId
+    // и createdAt стоит status, поэтому список проекта без фильтра по статусу сортировался
+    // целиком. idx_defects_stats получает id в конце по той же причине.
+    // Сортировки по title и dueDate с фильтрами индексами не покрываются (см. check-query-plans.js).
+    version: 13,
+    name: "defect_list_order_indexes",
+    up: `
+      CREATE INDEX IF NOT EXISTS idx_defects_project_created ON defects (projectId, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_project_priority ON defects (projectId, priority, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_assignee_priority ON defects (assigneeId, priority, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_assignee_status ON defects (assigneeId, status, createdAt, id);
+      CREATE INDEX IF NOT EXISTS idx_defects_priority_status ON defects (priority, status, createdAt, id);
+      DROP INDEX IF EXISTS idx_defects_stats;
+      CREATE INDEX idx_defects_stats ON defects (status, priority, createdAt, id);
+    `,
+  },
+];
+
+export const LATEST_SCHEMA_VERSION = migrations[migrations.length - 1].version;
+
+const quote = (value) => `'${String(value).replace(/'/g, "''")}'`;
+
+// Применяет все непримененные миграции по порядку.
+// callback(err, { version, applied }) вызывается после завершения.
+export function runMigrations(db, callback) {
+  const createVersionTable = `
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+      version INTEGER PRIMARY KEY,
+      name TEXT NOT NULL,
+      appliedAt TEXT NOT NULL
+    );
+  `;
+
+  db.exec(createVersionTable, (err) => {
+    if (err) return callback(err);
+
+    db.all("SELECT version FROM schema_migrations", (err, rows) => {
+      if (err) return callback(err);
+
+      const appliedVersions = new Set(rows.map((row) => row.version));
+      const pending = migrations.filter((m) => !appliedVersions.has(m.version));
+
+      const applyNext = (index) => {
+        if (index === pending.length) {
+          const version = Math.max(0, ...appliedVersions, ...pending.map((m) => m.version));
+          return callback(null, { version, applied: pending.map((m) => m.version) });
+        }
+
+        const migration = pending[index];
+        const script = `
+          BEGIN;
+          ${migration.up}
+          INSERT INTO schema_migrations (version, name, appliedAt)
+            VALUES (${migration.version}, ${quote(migration.name)}, ${quote(new Date().toISOString())});
+          PRAGMA user_version = ${migration.version};
+          COMMIT;
+        `;
+
+        db.exec(script, (err) => {
+          if (err) {
+            const failure = new Error(`Миграция ${migration.version} (${migration.name}) не применена: ${err.message}`);
+            return db.exec("ROLLBACK", () => callback(failure));
+          }
+          console.log(`Миграция ${migration.version} (${migration.name}) применена`);
+          applyNext(index + 1);
+        });
+      };
+
+      applyNext(0);
+    });
+  });
+}
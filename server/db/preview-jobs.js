@@ -0,0 +1,138 @@
+import { recordDefectEvents } from './defect-events.js';
+
+// Очередь задач на миниатюры и превью фотографий вложений.
+// Задача привязана к файлу (sha256): одинаковые фото обрабатываются один раз,
+// готовые ссылки проставляются всем вложениям с этим файлом.
+// Статусы: pending -> running -> done; при ошибке — снова pending с отсрочкой, после
+// maxAttempts — failed. Зависшая задача (running с истекшей арендой) берется повторно.
+
+export const PREVIEW_JOBS_SCHEMA_SQL = `
+  CREATE TABLE IF NOT EXISTS preview_jobs (
+    sha256 TEXT PRIMARY KEY,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    runAfter INTEGER NOT NULL,
+    lockedUntil INTEGER,
+    error TEXT,
+    updatedAt TEXT NOT NULL
+  ) WITHOUT ROWID;
+  CREATE INDEX IF NOT EXISTS idx_preview_jobs_due ON preview_jobs (status, runAfter);
+
+  ALTER TABLE defect_attachments ADD COLUMN thumbnailUrl TEXT;
+  ALTER TABLE defect_attachments ADD COLUMN previewUrl TEXT;
+`;
+
+// Форматы, которые умеет читать sharp
+export const PREVIEW_TYPES = ["image/jpeg", "image/png", "image/webp", "image/gif", "image/tiff", "image/avif", "image/heic"];
+
+export const previewUrls = (defectId, attachmentId) => ({
+  thumbnailUrl: `/api/defects/${defectId}/attachments/${attachmentId}/thumbnail`,
+  previewUrl: `/api/defects/${defectId}/attachments/${attachmentId}/preview`,
+});
+
+// Ставит файл вложения в очередь внутри транзакции загрузки.
+// Если превью этого файла уже готовы, ссылки сразу записываются в attachment.
+// enqueue: false — обработать фото некому (нет sharp), новая задача не заводится.
+export async function enqueuePreview(tx, defectId, attachment, { enqueue = true } = {}) {
+  if (!attachment.sha256 || !PREVIEW_TYPES.includes(attachment.type)) return;
+
+  const job = await tx.get("SELECT status FROM preview_jobs WHERE sha256 = ?", [attachment.sha256]);
+  if (job?.status === "done") {
+    Object.assign(attachment, previewUrls(defectId, attachment.id));
+    await tx.run(
+      "UPDATE defect_attachments SET thumbnailUrl = ?, previewUrl = ? WHERE id = ?",
+      [attachment.thumbnailUrl, attachment.previewUrl, attachment.id]
+    );
+    return;
+  }
+  if (!enqueue) return;
+
+  // Повторная загрузка файла, на котором задача сдалась, дает ей еще одну серию попыток
+  await tx.run(
+    `INSERT INTO preview_jobs (sha256, status, attempts, runAfter, updatedAt) VALUES (?, 'pending', 0, ?, ?)
+     ON CONFLICT (sha256) DO UPDATE SET status = 'pending', attempts = 0, runAfter = excluded.runAfter, error = NULL
+     WHERE preview_jobs.status = 'failed'`,
+    [attachment.sha256, Date.now(), new Date().toISOString()]
+  );
+}
+
+// Забирает до limit готовых к выполнению задач и продлевает их аренду на leaseMs
+export function claimPreviewJobs(db, limit, leaseMs) {
+  return db.transaction(async (tx) => {
+    const now = Date.now();
+    const jobs = await tx.all(
+      `SELECT sha256, attempts FROM preview_jobs
+       WHERE (status = 'pending' AND runAfter <= ?) OR (status = 'running' AND lockedUntil <= ?)
+       ORDER BY runAfter LIMIT ?`,
+      [now, now, limit]
+    );
+    if (jobs.length === 0) return [];
+
+    await tx.run(
+      `UPDATE preview_jobs SET status = 'running', attempts = attempts + 1, lockedUntil = ?, updatedAt = ?
+       WHERE sha256 IN (SELECT value FROM json_each(?))`,
+      [now + leaseMs, new Date().toISOString(), JSON.stringify(jobs.map((job) => job.sha256))]
+    );
+    return jobs.map((job) => ({ sha256: job.sha256, attempts: job.attempts + 1 }));
+  });
+}
+
+// Отмечает задачу выполненной и проставляет ссылки вложениям.
+// Возвращает id затронутых дефектов или null, если задачи уже нет (файл удален).
+export function completePreviewJob(db, sha256) {
+  return db.transaction(async (tx) => {
+    const timestamp = new Date().toISOString();
+    const { changes } = await tx.run(
+      "UPDATE preview_jobs SET status = 'done', lockedUntil = NULL, error = NULL, updatedAt = ? WHERE sha256 = ?",
+      [timestamp, sha256]
+    );
+    if (changes === 0) return null;
+
+    await tx.run(
+      `UPDATE defect_attachments
+       SET thumbnailUrl = '/api/defects/' || defectId || '/attachments/' || id || '/thumbnail',
+           previewUrl = '/api/defects/' || defectId || '/attachments/' || id || '/preview'
+       WHERE sha256 = ?`,
+      [sha256]
+    );
+
+    // Изменение строки дефекта увеличивает version — версию карточки для ETag и кэша ответов
+    const rows = await tx.all("SELECT DISTINCT defectId FROM defect_attachments WHERE sha256 = ?", [sha256]);
+    const defectIds = rows.map((row) => row.defectId);
+    await tx.run(
+      "UPDATE defects SET updatedAt = ? WHERE id IN (SELECT value FROM json_each(?))",
+      [timestamp, JSON.stringify(defectIds)]
+    );
+    await recordDefectEvents(
+      tx,
+      "attachment",
+      defectIds.map((defectId) => ({ defectId, data: { action: "previews", sha256 } })),
+      { at: timestamp }
+    );
+    return defectIds;
+  });
+}
+
+// Ошибка обработки: повтор с экспоненциальной отсрочкой или окончательный отказ
+export function failPreviewJob(db, { sha256, attempts }, error, { maxAttempts, backoffMs }) {
+  const failed = attempts >= maxAttempts;
+  return db.run(
+    `UPDATE preview_jobs SET status = ?, runAfter = ?, lockedUntil = NULL, error = ?, updatedAt = ?
+     WHERE sha256 = ?`,
+    [
+      failed ? "failed" : "pending",
+      Date.now() + backoffMs * 2 ** (attempts - 1),
+      String(error).slice(0, 500),
+      new Date().toISOString(),
+      sha256,
+    ]
+  );
+}
+
+// Число задач по статусам
+export function countPreviewJobs(db, callback) {
+  db.all("SELECT status, COUNT(*) AS count FROM preview_jobs GROUP BY status", (err, rows) => {
+    if (err) return callback(err);
+    callback(null, Object.fromEntries(rows.map((row) => [row.status, row.count])));
+  });
+}
@@ -0,0 +1,231 @@
+import { LruCache } from '../cache/lru-cache.js';
+
+// Профилировщик запросов SQLite (включается заданием SLOW_QUERY_MS).
+// Запросы группируются по форме: литералы заменены на ?, списки IN (?, ?, ...) свернуты,
+// поэтому динамически собранные запросы списка и изменения дефекта с разным набором
+// фильтров и полей остаются разными формами, а с разными значениями — одной.
+//
+// По каждой форме копится число вызовов, суммарное и наибольшее время, число строк
+// и формы параметров; top(n) возвращает самые дорогие формы по суммарному времени.
+// Запросы дольше порога пишутся в журнал вместе с планом EXPLAIN QUERY PLAN.
+// План строится с NULL вместо значений параметров: значения не хранятся в памяти,
+// а без статистики STAT4 выбор плана от них не зависит.
+//
+// Таблица своя у каждого процесса кластера.
+
+const DEFAULT_TOP = 20;
+const DEFAULT_MAX_SHAPES = 1000;
+const DEFAULT_PLAN_TTL_MS = 60_000;
+const MAX_PARAM_SHAPES = 5;
+
+// Форма запроса: без значений литералов, пробелов и длины списков IN
+export const normalizeSql = (sql) => sql
+  .replace(/'(?:[^']|'')*'/g, "?")
+  .replace(/\b\d+(?:\.\d+)?\b/g, "?")
+  .replace(/\s+/g, " ")
+  .replace(/\(\s*\?(?:\s*,\s*\?)+\s*\)/g, "(?, ...)")
+  .trim();
+
+const typeOf = (value) => {
+  if (value === null || value === undefined) return "null";
+  if (Buffer.isBuffer(value)) return "blob";
+  return typeof value;
+};
+
+// Типы параметров без значений; повторы подряд сворачиваются: [string×3, number]
+export const describeParams = (params) => {
+  if (!Array.isArray(params)) {
+    return Object.entries(params ?? {}).map(([name, value]) => `${name}:${typeOf(value)}`).join(", ");
+  }
+
+  const runs = [];
+  for (const param of params) {
+    const type = typeOf(param);
+    const last = runs[runs.length - 1];
+    if (last && last.type === type) {
+      last.count++;
+    } else {
+      runs.push({ type, count: 1 });
+    }
+  }
+  return runs.map(({ type, count }) => (count > 1 ? `${type}×${count}` : type)).join(", ");
+};
+
+const countRows = (kind, result, statement) => {
+  if (kind === "all") return result?.length ?? 0;
+  if (kind === "get") return result ? 1 : 0;
+  return statement?.changes ?? 0;
+};
+
+const blankParams = (params) => {
+  if (Array.isArray(params)) return params.map(() => null);
+  return Object.fromEntries(Object.keys(params ?? {}).map((name) => [name, null]));
+};
+
+// Строки плана с отступами по вложенности (как в sqlite3 .eqp)
+export const formatPlan = (rows) => {
+  const depth = new Map();
+  return rows.map((row) => {
+    const level = depth.has(row.parent) ? depth.get(row.parent) + 1 : 0;
+    depth.set(row.id, level);
+    return `${"  ".repeat(level)}${row.detail}`;
+  });
+};
+
+const round = (value) => Math.round(value * 1000) / 1000;
+
+export class QueryProfiler {
+  // explain(sql, params, callback) строит план запроса (Database.explain)
+  constructor({
+    thresholdMs,
+    explain,
+    maxShapes = DEFAULT_MAX_SHAPES,
+    planTtlMs = DEFAULT_PLAN_TTL_MS,
+    log = (entry) => console.warn("Медленный запрос:", JSON.stringify(entry)),
+  }) {
+    this.thresholdMs = thresholdMs;
+    this.explain = explain;
+    this.maxShapes = maxShapes;
+    this.planTtlMs = planTtlMs;
+    this.log = log;
+    this.shapes = new Map();
+    // Нормализация — регулярные выражения по тексту; результат кэшируется по исходному SQL
+    this.normalized = new LruCache({ max: maxShapes * 2, ttlMs: Infinity });
+    this.startedAt = new Date();
+  }
+
+  // Подходит как Database onQuery; exec (PRAGMA, BEGIN/COMMIT) не учитывается
+  observe(sql, durationMs, err, { kind, params, result, statement }) {
+    if (kind === "exec") return;
+
+    let shape = this.normalized.get(sql);
+    if (shape === undefined) {
+      shape = normalizeSql(sql);
+      this.normalized.set(sql, shape);
+    }
+
+    const entry = this.entry(shape, sql, params);
+    const rows = err ? 0 : countRows(kind, result, statement);
+    const paramShape = describeParams(params);
+
+    entry.calls++;
+    entry.totalMs += durationMs;
+    entry.rows += rows;
+    if (err) entry.errors++;
+    if (durationMs > entry.maxMs) entry.maxMs = durationMs;
+    if (entry.paramShapes.size < MAX_PARAM_SHAPES) entry.paramShapes.add(paramShape);
+
+    if (durationMs >= this.thresholdMs) {
+      entry.slow++;
+      this.reportSlow(entry, { kind, durationMs, rows, paramShape, error: err?.message });
+    }
+  }
+
+  // При переполнении вытесняется форма с наименьшим суммарным временем
+  entry(shape, sql, params) {
+    let entry = this.shapes.get(shape);
+    if (entry) return entry;
+
+    if (this.shapes.size >= this.maxShapes) {
+      let cheapest = null;
+      for (const candidate of this.shapes.values()) {
+        if (!cheapest || candidate.totalMs < cheapest.totalMs) cheapest = candidate;
+      }
+      this.shapes.delete(cheapest.shape);
+    }
+
+    entry = {
+      shape,
+      calls: 0,
+      errors: 0,
+      slow: 0,
+      rows: 0,
+      totalMs: 0,
+      maxMs: 0,
+      paramShapes: new Set(),
+      // Пример запроса формы для построения плана, без значений параметров
+      sample: { sql, params: blankParams(params) },
+      plan: null,
+      planAt: 0,
+      lastSlow: null,
+    };
+    this.shapes.set(shape, entry);
+    return entry;
+  }
+
+  // План строится не чаще раза в planTtlMs для формы; запись в журнал — после плана
+  reportSlow(entry, { kind, durationMs, rows, paramShape, error }) {
+    const record = () => {
+      entry.lastSlow = {
+        at: new Date().toISOString(),
+        kind,
+        durationMs: round(durationMs),
+        rows,
+        params: paramShape,
+        error,
+      };
+      this.log({ sql: entry.shape, ...entry.lastSlow, plan: entry.plan });
+    };
+
+    this.explainShape(entry, record);
+  }
+
+  explainShape(entry, callback) {
+    if (entry.plan && Date.now() - entry.planAt < this.planTtlMs) return callback();
+
+    entry.planAt = Date.now();
+    this.explain(entry.sample.sql, entry.sample.params, (err, rows) => {
+      entry.plan = err ? [`EXPLAIN QUERY PLAN: ${err.message}`] : formatPlan(rows);
+      callback();
+    });
+  }
+
+  // Строит планы для самых дорогих форм, в том числе не превысивших порог
+  explainTop(limit, callback) {
+    const entries = this.mostExpensive(limit);
+    let pending = entries.length;
+    if (pending === 0) return callback();
+
+    for (const entry of entries) {
+      this.explainShape(entry, () => {
+        if (--pending === 0) callback();
+      });
+    }
+  }
+
+  mostExpensive(limit = DEFAULT_TOP) {
+    return [...this.shapes.values()].sort((a, b) => b.totalMs - a.totalMs).slice(0, limit);
+  }
+
+  // Самые дорогие формы запросов по суммарному времени
+  top(limit = DEFAULT_TOP) {
+    return this.mostExpensive(limit).map((entry) => ({
+      sql: entry.shape,
+      calls: entry.calls,
+      errors: entry.errors,
+      slow: entry.slow,
+      totalMs: round(entry.totalMs),
+      meanMs: round(entry.totalMs / entry.calls),
+      maxMs: round(entry.maxMs),
+      rows: entry.rows,
+      meanRows: round(entry.rows / entry.calls),
+      params: [...entry.paramShapes],
+      plan: entry.plan,
+      lastSlow: entry.lastSlow,
+    }));
+  }
+
+  stats(limit) {
+    return {
+      thresholdMs: this.thresholdMs,
+      since: this.startedAt.toISOString(),
+      shapes: this.shapes.size,
+      statements: this.top(limit),
+    };
+  }
+
+  reset() {
+    this.shapes.clear();
+    this.startedAt = new Date();
+  }
+}
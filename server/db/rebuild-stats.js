@@ -0,0 +1,45 @@
+import sqlite3 from 'sqlite3';
+import { fileURLToPath } from 'url';
+import { runMigrations } from './migrations.js';
+import { checkDefectCounters, rebuildDefectCounters } from './defect-stats.js';
+
+// Пересчет счетчиков статистики из таблицы defects.
+// Запуск: node server/db/rebuild-stats.js [путь к БД] [--check]
+// С флагом --check счетчики только сверяются с полным пересчетом (код выхода 1 при расхождении).
+
+const isMain = process.argv[1] && fileURLToPath(import.meta.url) === process.argv[1];
+
+if (isMain) {
+  const args = process.argv.slice(2);
+  const checkOnly = args.includes("--check");
+  const dbPath = args.find((arg) => !arg.startsWith("--")) || process.env.DATABASE_PATH || './database.db';
+  const db = new sqlite3.Database(dbPath);
+
+  const report = (err) => {
+    if (err) {
+      console.error("Ошибка при пересчете статистики:", err.message);
+      process.exit(2);
+    }
+
+    checkDefectCounters(db, (err, mismatches) => {
+      if (err) {
+        console.error("Ошибка при проверке статистики:", err.message);
+        process.exit(2);
+      }
+
+      console.log(JSON.stringify({ rebuilt: !checkOnly, mismatches }, null, 2));
+      db.close();
+      process.exit(mismatches.length > 0 ? 1 : 0);
+    });
+  };
+
+  runMigrations(db, (err) => {
+    if (err) {
+      console.error(err.message);
+      process.exit(2);
+    }
+
+    if (checkOnly) return report(null);
+    rebuildDefectCounters(db, report);
+  });
+}
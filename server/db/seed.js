@@ -0,0 +1,143 @@
+import { isoDaysAgo, seedDefects } from '../routes/utils.js';
+import { insertDefectBatch } from './defect-writer.js';
+
+// Начальное наполнение базы: проекты, дефекты и тестовые пользователи.
+// Выполняется один раз при старте (в кластере — только в основном процессе).
+// Все вставки — INSERT OR IGNORE, поэтому повторный запуск ничего не дублирует.
+
+const projects = [
+  {
+    id: "p1",
+    name: "ЖК Северный",
+    code: "NORTH-01",
+    location: "Москва",
+    stages: [
+      { id: "s1", name: "Фундамент", startDate: isoDaysAgo(120), endDate: isoDaysAgo(90) },
+      { id: "s2", name: "Каркас", startDate: isoDaysAgo(89), endDate: isoDaysAgo(30) },
+      { id: "s3", name: "Отделка", startDate: isoDaysAgo(29) },
+    ],
+  },
+  {
+    id: "p2",
+    name: "БЦ Восход",
+    code: "SUN-02",
+    location: "Санкт-Петербург",
+    stages: [
+      { id: "s4", name: "Подготовка площадки", startDate: isoDaysAgo(60), endDate: isoDaysAgo(55) },
+      { id: "s5", name: "Монтаж", startDate: isoDaysAgo(54) },
+    ],
+  },
+  {
+    id: "p3",
+    name: "ТЦ Мегаполис",
+    code: "MEGA-03",
+    location: "Казань",
+    stages: [
+      { id: "s6", name: "Проектирование", startDate: isoDaysAgo(200), endDate: isoDaysAgo(150) },
+      { id: "s7", name: "Строительство", startDate: isoDaysAgo(149), endDate: isoDaysAgo(50) },
+      { id: "s8", name: "Отделка", startDate: isoDaysAgo(49), endDate: isoDaysAgo(10) },
+      { id: "s9", name: "Запуск", startDate: isoDaysAgo(9) },
+    ],
+  },
+  {
+    id: "p4",
+    name: "ЖК Золотые Ворота",
+    code: "GOLD-04",
+    location: "Владимир",
+    stages: [
+      { id: "s10", name: "Подготовка", startDate: isoDaysAgo(80), endDate: isoDaysAgo(70) },
+      { id: "s11", name: "Строительство", startDate: isoDaysAgo(69), endDate: isoDaysAgo(20) },
+      { id: "s12", name: "Благоустройство", startDate: isoDaysAgo(19) },
+    ],
+  },
+  {
+    id: "p5",
+    name: "Офисный комплекс Сити",
+    code: "CITY-05",
+    location: "Екатеринбург",
+    stages: [
+      { id: "s13", name: "Проектирование", startDate: isoDaysAgo(150), endDate: isoDaysAgo(100) },
+      { id: "s14", name: "Фундамент", startDate: isoDaysAgo(99), endDate: isoDaysAgo(80) },
+      { id: "s15", name: "Каркас", startDate: isoDaysAgo(79), endDate: isoDaysAgo(40) },
+      { id: "s16", name: "Отделка", startDate: isoDaysAgo(39), endDate: isoDaysAgo(5) },
+      { id: "s17", name: "Сдача", startDate: isoDaysAgo(4) },
+    ],
+  },
+  {
+    id: "p6",
+    name: "Складской комплекс Логистик",
+    code: "LOG-06",
+    location: "Новосибирск",
+    stages: [
+      { id: "s18", name: "Подготовка площадки", startDate: isoDaysAgo(90), endDate: isoDaysAgo(80) },
+      { id: "s19", name: "Строительство", startDate: isoDaysAgo(79), endDate: isoDaysAgo(30) },
+      { id: "s20", name: "Монтаж оборудования", startDate: isoDaysAgo(29), endDate: isoDaysAgo(5) },
+      { id: "s21", name: "Тестирование", startDate: isoDaysAgo(4) },
+    ],
+  },
+];
+
+const testUsers = [
+  { email: "admin@example.com", password: "admin123", role: "admin" },
+  { email: "manager@example.com", password: "manager123", role: "manager" },
+  { email: "engineer@example.com", password: "engineer123", role: "engineer" },
+  { email: "user@example.com", password: "user123", role: "user" },
+  { email: "observer@example.com", password: "observer123", role: "observer" },
+  // Дополнительные инженеры для тестирования
+  { email: "ivan.petrov@example.com", password: "engineer123", role: "engineer" },
+  { email: "anna.smirnova@example.com", password: "engineer123", role: "engineer" },
+  { email: "sergey.kuznetsov@example.com", password: "engineer123", role: "engineer" },
+  { email: "elena.volkova@example.com", password: "engineer123", role: "engineer" },
+  { email: "dmitry.kozlov@example.com", password: "engineer123", role: "engineer" },
+  // Дополнительные менеджеры
+  { email: "maria.ivanova@example.com", password: "manager123", role: "manager" },
+  { email: "alexey.sidorov@example.com", password: "manager123", role: "manager" },
+  // Дополнительные пользователи
+  { email: "olga.nikolaeva@example.com", password: "user123", role: "user" },
+  { email: "pavel.morozov@example.com", password: "user123", role: "user" }
+];
+
+// Добавление моковых данных проектов в базу данных (также для генератора набора данных)
+export const insertMockProjects = (db) => Promise.all(projects.map((project) =>
+  db.run(
+    "INSERT OR IGNORE INTO projects (id, name, code, location, stages) VALUES (?, ?, ?, ?, ?)",
+    [project.id, project.name, project.code, project.location, JSON.stringify(project.stages)]
+  ).catch((err) => {
+    console.error("Ошибка при добавлении проекта:", err.message);
+  })
+));
+
+// Добавление моковых данных дефектов в базу данных одной пачкой
+const insertMockDefects = async (db) => {
+  const defects = seedDefects();
+  try {
+    const { inserted, errors } = await insertDefectBatch(db, defects, { ignoreExisting: true });
+    for (const { index, message } of errors) {
+      console.error(`Ошибка при добавлении дефекта ${defects[index].id}:`, message);
+    }
+    console.log(`Добавлено дефектов: ${inserted}`);
+  } catch (err) {
+    console.error("Ошибка при добавлении дефектов:", err.message);
+  }
+};
+
+// Добавление тестовых пользователей; пароли хэшируются в пуле потоков
+const insertTestUsers = (db, { hashPool, rounds }) => Promise.all(testUsers.map(async (user) => {
+  try {
+    const hashedPassword = await hashPool.hash(user.password, rounds);
+    await db.run(
+      "INSERT OR IGNORE INTO users (email, password, role) VALUES (?, ?, ?)",
+      [user.email, hashedPassword, user.role]
+    );
+    console.log(`Тестовый пользователь ${user.email} добавлен`);
+  } catch (err) {
+    console.error("Ошибка при добавлении тестового пользователя:", err.message);
+  }
+}));
+
+// Ошибки отдельных записей логируются и не прерывают наполнение
+export async function seedDatabase(db, { hashPool, rounds }) {
+  await insertMockProjects(db);
+  await insertMockDefects(db);
+  await insertTestUsers(db, { hashPool, rounds });
+}
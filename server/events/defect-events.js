@@ -0,0 +1,140 @@
+import { readEventsAfter } from '../db/defect-events.js';
+
+// Поток событий изменений дефектов для подписчиков SSE.
+// Источник — журнал defect_events: обработчики записи добавляют в него строки в своей
+// транзакции и вызывают notify(), после чего поток дочитывает хвост журнала и рассылает
+// новые события. id события — seq строки журнала: номера общие для всех процессов
+// кластера и не меняются после перезапуска, поэтому клиент может продолжить с
+// Last-Event-ID на любом процессе. Порядок рассылки — порядок фиксации изменений.
+// Последние события хранятся в кольцевом буфере; более старые читаются из журнала.
+// Подряд идущие события импорта объединяются в одно { inserted }.
+
+const toStreamEvent = (event) => ({
+  id: String(event.seq),
+  seq: event.seq,
+  type: event.type,
+  defectId: event.defectId,
+  projectId: event.projectId,
+  at: event.at,
+  data: event.data,
+});
+
+// События журнала -> события потока
+export function toStreamEvents(events) {
+  const result = [];
+  for (const event of events) {
+    const previous = result[result.length - 1];
+    if (event.type === "imported" && previous?.type === "imported") {
+      previous.id = String(event.seq);
+      previous.seq = event.seq;
+      previous.at = event.at;
+      previous.data.inserted++;
+      continue;
+    }
+    result.push(event.type === "imported"
+      ? { id: String(event.seq), seq: event.seq, type: "imported", defectId: null, projectId: null, at: event.at, data: { inserted: 1 } }
+      : toStreamEvent(event));
+  }
+  return result;
+}
+
+export class DefectEventStream {
+  constructor(db, { bufferSize = 1000, pollMs = 1000, batchSize = 500, maxReplay = 5000 } = {}) {
+    this.db = db;
+    this.bufferSize = bufferSize;
+    this.pollMs = pollMs;
+    this.batchSize = batchSize;
+    this.maxReplay = maxReplay;
+    this.buffer = [];
+    // Все события после bufferFloor есть в буфере
+    this.bufferFloor = 0;
+    this.lastSeq = null;
+    this.reading = false;
+    this.again = false;
+    this.listeners = new Map();
+  }
+
+  // Начинает чтение журнала с текущего конца; таймер подхватывает записи других процессов
+  start(callback = () => {}) {
+    this.db.get("SELECT COALESCE(MAX(seq), 0) AS seq FROM defect_events", (err, row) => {
+      if (err) return callback(err);
+
+      this.lastSeq = row.seq;
+      this.bufferFloor = row.seq;
+      this.timer = setInterval(() => this.notify(), this.pollMs);
+      this.timer.unref();
+      callback(null);
+    });
+  }
+
+  // Дочитать новые события журнала (после записи здесь или сигнала от другого процесса)
+  notify() {
+    if (this.lastSeq === null) return;
+    if (this.reading) {
+      this.again = true;
+      return;
+    }
+
+    this.reading = true;
+    this.again = false;
+    readEventsAfter(this.db, this.lastSeq, this.batchSize, (err, events) => {
+      this.reading = false;
+      if (err) {
+        return console.error("Ошибка при чтении журнала событий:", err.message);
+      }
+
+      for (const event of toStreamEvents(events)) {
+        this.publish(event);
+      }
+      if (events.length > 0) this.lastSeq = events[events.length - 1].seq;
+      if (events.length === this.batchSize || this.again) this.notify();
+    });
+  }
+
+  publish(event) {
+    this.buffer.push(event);
+    if (this.buffer.length > this.bufferSize) {
+      this.bufferFloor = this.buffer.shift().seq;
+    }
+
+    for (const listener of this.listeners.keys()) {
+      listener(event);
+    }
+  }
+
+  // callback(err, events) — события после lastEventId; null, если продолжить нельзя:
+  // id неизвестен, события уже перенесены в архив или их слишком много
+  since(lastEventId, callback) {
+    const seq = Number(lastEventId);
+    if (!Number.isInteger(seq) || seq < 1 || this.lastSeq === null) return callback(null, null);
+
+    if (seq >= this.bufferFloor && seq <= this.lastSeq) {
+      return callback(null, this.buffer.filter((event) => event.seq > seq));
+    }
+
+    // Читается и само событие клиента: если его нет в журнале, продолжить нельзя
+    readEventsAfter(this.db, seq - 1, this.maxReplay + 1, (err, events) => {
+      if (err) return callback(err);
+      if (events[0]?.seq !== seq || events.length > this.maxReplay) return callback(null, null);
+      callback(null, toStreamEvents(events.slice(1)));
+    });
+  }
+
+  // onClose вызывается при остановке сервера, чтобы открытые потоки не держали его
+  subscribe(listener, { onClose } = {}) {
+    this.listeners.set(listener, onClose);
+    return () => this.listeners.delete(listener);
+  }
+
+  close() {
+    clearInterval(this.timer);
+    for (const onClose of [...this.listeners.values()]) {
+      onClose?.();
+    }
+    this.listeners.clear();
+  }
+
+  stats() {
+    return { subscribers: this.listeners.size, buffered: this.buffer.length, seq: this.lastSeq };
+  }
+}
@@ -0,0 +1,54 @@
+import { archiveDefectEvents } from '../db/event-archive.js';
+
+// Периодический перенос старых событий журнала в архивные файлы.
+// Запускается в одном процессе: в одиночном сервере или в основном процессе кластера.
+// Первый запуск — через минуту после старта, чтобы не мешать прогреву.
+
+const FIRST_RUN_DELAY_MS = 60_000;
+
+export class EventArchiver {
+  constructor(db, { dir, retainDays, intervalMs = 24 * 60 * 60 * 1000 }) {
+    this.db = db;
+    this.dir = dir;
+    this.retainDays = retainDays;
+    this.intervalMs = intervalMs;
+    this.running = null;
+    this.lastRun = null;
+  }
+
+  start() {
+    this.timer = setTimeout(() => {
+      this.run();
+      this.timer = setInterval(() => this.run(), this.intervalMs);
+      this.timer.unref();
+    }, FIRST_RUN_DELAY_MS);
+    this.timer.unref();
+  }
+
+  run() {
+    if (this.running) return this.running;
+
+    this.running = archiveDefectEvents(this.db, { dir: this.dir, retainDays: this.retainDays })
+      .then((segments) => {
+        this.lastRun = { at: new Date().toISOString(), segments: segments.length, events: segments.reduce((sum, s) => sum + s.count, 0) };
+        if (segments.length > 0) {
+          console.log(`Перенесено в архив событий: ${this.lastRun.events} (${segments.length} файлов)`);
+        }
+      })
+      .catch((err) => {
+        this.lastRun = { at: new Date().toISOString(), error: err.message };
+        console.error("Ошибка при переносе событий в архив:", err.message);
+      })
+      .finally(() => {
+        this.running = null;
+      });
+    return this.running;
+  }
+
+  // Дожидается текущего переноса, чтобы не закрыть базу посреди транзакции
+  async close() {
+    clearTimeout(this.timer);
+    clearInterval(this.timer);
+    await this.running;
+  }
+}
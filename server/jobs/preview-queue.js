@@ -0,0 +1,179 @@
+import os from 'os';
+import { Worker } from 'worker_threads';
+import { Histogram } from '../metrics/histogram.js';
+import { claimPreviewJobs, completePreviewJob, failPreviewJob } from '../db/preview-jobs.js';
+
+// Фоновая обработка фотографий вложений: миниатюра и превью для просмотра в браузере.
+// Задачи лежат в таблице preview_jobs, поэтому загрузка только добавляет строку и не ждет
+// обработки. Пул берет из таблицы не больше задач, чем у него свободных потоков;
+// остальные ждут в базе. В кластере каждый процесс запускает свой пул, задачи
+// распределяются через транзакцию захвата.
+
+const WORKER_URL = new URL('./preview-worker.js', import.meta.url);
+
+export const PREVIEW_VARIANTS = [
+  { name: "thumbnail", width: 320, quality: 70 },
+  { name: "preview", width: 1600, quality: 80 },
+];
+
+export class PreviewQueue {
+  constructor(db, {
+    fileStore,
+    size = Math.max(1, Math.min(2, os.cpus().length - 1)),
+    pollMs = 5000,
+    leaseMs = 2 * 60_000,
+    maxAttempts = 5,
+    backoffMs = 30_000,
+    onDone,
+  }) {
+    this.db = db;
+    this.fileStore = fileStore;
+    this.size = size;
+    this.pollMs = pollMs;
+    this.leaseMs = leaseMs;
+    this.retry = { maxAttempts, backoffMs };
+    this.onDone = onDone;
+    this.workers = [];
+    this.idle = [];
+    this.backend = undefined;
+    this.claiming = false;
+    this.closed = false;
+    this.processed = 0;
+    this.failures = 0;
+    this.latency = new Histogram();
+  }
+
+  start() {
+    for (let i = 0; i < this.size; i++) {
+      this.spawn();
+    }
+    this.timer = setInterval(() => this.notify(), this.pollMs);
+    this.timer.unref();
+  }
+
+  spawn() {
+    const worker = new Worker(WORKER_URL);
+    worker.currentJob = null;
+
+    worker.on("message", (message) => {
+      if (message.type === "ready") {
+        return this.ready(worker, message.backend);
+      }
+      this.finish(worker, message.error);
+    });
+
+    // Задача упавшего потока вернется в очередь по истечении аренды
+    worker.on("error", (err) => {
+      console.error("Ошибка в потоке обработки изображений:", err.message);
+      this.replace(worker);
+    });
+    worker.on("exit", (code) => {
+      if (code !== 0 && !this.closed) this.replace(worker);
+    });
+
+    this.workers.push(worker);
+  }
+
+  ready(worker, backend) {
+    if (!backend) {
+      if (this.backend === undefined) {
+        console.warn("Модуль sharp не установлен: миниатюры вложений не создаются");
+      }
+      this.backend = null;
+      return this.close();
+    }
+
+    this.backend = backend;
+    this.idle.push(worker);
+    this.notify();
+  }
+
+  // Пока потоки не сообщили о sharp, задачи принимаются: после запуска их обработают
+  get enabled() {
+    return this.backend !== null;
+  }
+
+  replace(worker) {
+    if (!this.workers.includes(worker)) return;
+
+    this.workers = this.workers.filter((w) => w !== worker);
+    this.idle = this.idle.filter((w) => w !== worker);
+    if (!this.closed) this.spawn();
+  }
+
+  // Проверить очередь сейчас (после загрузки или по таймеру)
+  notify() {
+    if (this.closed || this.claiming || this.idle.length === 0) return;
+
+    this.claiming = true;
+    claimPreviewJobs(this.db, this.idle.length, this.leaseMs)
+      .then((jobs) => {
+        for (const job of jobs) {
+          const worker = this.idle.pop();
+          worker.currentJob = { ...job, startedAt: performance.now() };
+          worker.postMessage({
+            id: job.sha256,
+            input: this.fileStore.path(job.sha256),
+            variants: PREVIEW_VARIANTS.map((variant) => ({
+              path: this.fileStore.variantPath(job.sha256, variant.name),
+              width: variant.width,
+              quality: variant.quality,
+            })),
+          });
+        }
+      })
+      .catch((err) => console.error("Ошибка при выборке задач превью:", err.message))
+      .finally(() => {
+        this.claiming = false;
+      });
+  }
+
+  finish(worker, error) {
+    const job = worker.currentJob;
+    worker.currentJob = null;
+    if (!this.closed) this.idle.push(worker);
+    if (!job) return;
+
+    this.latency.observe(performance.now() - job.startedAt);
+    const settled = error ? this.fail(job, error) : this.complete(job);
+    settled
+      .catch((err) => console.error("Ошибка при сохранении результата превью:", err.message))
+      .finally(() => this.notify());
+  }
+
+  async complete(job) {
+    const defectIds = await completePreviewJob(this.db, job.sha256);
+    if (defectIds === null) {
+      // Файл удалили, пока шла обработка
+      await this.fileStore.removeVariants(job.sha256);
+      return;
+    }
+    this.processed++;
+    if (defectIds.length > 0) this.onDone?.(defectIds);
+  }
+
+  async fail(job, error) {
+    this.failures++;
+    console.error(`Ошибка обработки изображения ${job.sha256} (попытка ${job.attempts}):`, error);
+    await failPreviewJob(this.db, job, error, this.retry);
+  }
+
+  stats() {
+    return {
+      backend: this.backend ?? null,
+      size: this.size,
+      busy: this.workers.length - this.idle.length,
+      processed: this.processed,
+      failures: this.failures,
+      latency: this.latency.snapshot(),
+    };
+  }
+
+  async close() {
+    this.closed = true;
+    clearInterval(this.timer);
+    const workers = this.workers.splice(0);
+    this.idle = [];
+    await Promise.all(workers.map((worker) => worker.terminate()));
+  }
+}
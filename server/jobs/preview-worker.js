@@ -0,0 +1,41 @@
+// Поток пула обработки изображений.
+// sharp — необязательная зависимость (optionalDependencies): если модуль не установился,
+// поток сообщает об этом, пул закрывается, а новые фото не ставятся в очередь.
+
+import fs from 'fs';
+import { parentPort, threadId } from 'worker_threads';
+
+const loadSharp = async () => {
+  try {
+    const module = await import('sharp');
+    return module.default ?? module;
+  } catch {
+    return null;
+  }
+};
+
+const sharp = await loadSharp();
+if (sharp) {
+  // Параллелизм задает пул потоков, кэш libvips между файлами не нужен
+  sharp.cache(false);
+  sharp.concurrency(1);
+}
+parentPort.postMessage({ type: "ready", backend: sharp ? "sharp" : null });
+
+// variants: [{ path, width, quality }] — файл пишется во временный и переименовывается
+parentPort.on("message", async ({ id, input, variants }) => {
+  try {
+    for (const { path, width, quality } of variants) {
+      const tmpPath = `${path}.${process.pid}-${threadId}.tmp`;
+      await sharp(input, { failOn: "error" })
+        .rotate()
+        .resize({ width, height: width, fit: "inside", withoutEnlargement: true })
+        .webp({ quality })
+        .toFile(tmpPath);
+      await fs.promises.rename(tmpPath, path);
+    }
+    parentPort.postMessage({ id });
+  } catch (err) {
+    parentPort.postMessage({ id, error: err.message });
+  }
+});
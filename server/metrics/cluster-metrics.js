@@ -0,0 +1,95 @@
+import cluster from 'cluster';
+
+// Сбор метрик всех процессов кластера.
+// Запрос /metrics попадает в случайный рабочий процесс; чтобы счетчики не скакали
+// между процессами, он просит основной процесс собрать снимки всех рабочих
+// и объединяет их. Вне кластера используется только снимок своего процесса.
+
+const CHANNEL = "metrics";
+const COLLECT_TIMEOUT_MS = 5000;
+// Основной процесс отвечает раньше, чем истечет ожидание в рабочем
+const RELAY_TIMEOUT_MS = 2000;
+
+const pending = new Map();
+let nextRequestId = 1;
+
+// В рабочем процессе: отвечать на запросы снимков и принимать собранные результаты
+export function serveClusterMetrics(registry) {
+  if (!cluster.isWorker) return;
+
+  process.on("message", (message) => {
+    if (message?.channel !== CHANNEL) return;
+
+    if (message.type === "snapshot-request") {
+      process.send({ channel: CHANNEL, type: "snapshot", id: message.id, snapshot: registry.snapshot() });
+      return;
+    }
+
+    const request = pending.get(message.id);
+    if (message.type === "result" && request) {
+      pending.delete(message.id);
+      clearTimeout(request.timer);
+      request.callback(null, message.snapshots);
+    }
+  });
+}
+
+// Снимки метрик всех процессов кластера (вне кластера — только своего)
+export function collectClusterMetrics(registry, callback) {
+  if (!cluster.isWorker || !process.connected) {
+    return callback(null, [registry.snapshot()]);
+  }
+
+  const id = nextRequestId++;
+  const timer = setTimeout(() => {
+    pending.delete(id);
+    callback(new Error("Основной процесс не ответил на запрос метрик"));
+  }, COLLECT_TIMEOUT_MS);
+
+  pending.set(id, { callback, timer });
+  process.send({ channel: CHANNEL, type: "collect", id });
+}
+
+const collections = new Map();
+let nextCollectionId = 1;
+
+const finishCollection = (collectionId) => {
+  const collection = collections.get(collectionId);
+  if (!collection) return;
+
+  collections.delete(collectionId);
+  clearTimeout(collection.timer);
+  if (collection.source.isConnected()) {
+    collection.source.send({ channel: CHANNEL, type: "result", id: collection.id, snapshots: collection.snapshots });
+  }
+};
+
+// В основном процессе: собирает снимки всех рабочих процессов для запросившего.
+// Не ответивший вовремя процесс пропускается.
+export function relayMetrics(source, message) {
+  if (message?.channel !== CHANNEL) return false;
+
+  if (message.type === "collect") {
+    const workers = Object.values(cluster.workers).filter((worker) => worker?.isConnected());
+    const collectionId = nextCollectionId++;
+    collections.set(collectionId, {
+      source,
+      id: message.id,
+      waiting: workers.length,
+      snapshots: [],
+      timer: setTimeout(() => finishCollection(collectionId), RELAY_TIMEOUT_MS),
+    });
+
+    for (const worker of workers) {
+      worker.send({ channel: CHANNEL, type: "snapshot-request", id: collectionId });
+    }
+    return true;
+  }
+
+  const collection = collections.get(message.id);
+  if (message.type === "snapshot" && collection) {
+    collection.snapshots.push(message.snapshot);
+    if (--collection.waiting === 0) finishCollection(message.id);
+  }
+  return true;
+}
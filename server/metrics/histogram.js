@@ -0,0 +1,62 @@
+// Гистограмма задержек с фиксированными границами корзин (в миллисекундах).
+// Наблюдение — O(число корзин), память не растет с количеством наблюдений.
+
+export const DEFAULT_LATENCY_BUCKETS = [1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000];
+
+export class Histogram {
+  constructor({ buckets = DEFAULT_LATENCY_BUCKETS } = {}) {
+    this.buckets = [...buckets].sort((a, b) => a - b);
+    this.counts = new Array(this.buckets.length + 1).fill(0);
+    this.count = 0;
+    this.sum = 0;
+    this.max = 0;
+  }
+
+  observe(value) {
+    let index = this.buckets.findIndex((bound) => value <= bound);
+    if (index === -1) index = this.buckets.length;
+
+    this.counts[index]++;
+    this.count++;
+    this.sum += value;
+    if (value > this.max) this.max = value;
+  }
+
+  // Оценка квантиля по верхней границе корзины (не больше наблюденного максимума)
+  quantile(q) {
+    if (this.count === 0) return 0;
+
+    const rank = Math.ceil(q * this.count);
+    let seen = 0;
+    for (let i = 0; i < this.counts.length; i++) {
+      seen += this.counts[i];
+      if (seen >= rank) {
+        return i < this.buckets.length ? Math.min(this.buckets[i], this.max) : this.max;
+      }
+    }
+    return this.max;
+  }
+
+  // Накопительные значения корзин, как в формате Prometheus
+  cumulative() {
+    let total = 0;
+    const result = this.buckets.map((le, i) => {
+      total += this.counts[i];
+      return { le, count: total };
+    });
+    result.push({ le: Infinity, count: this.count });
+    return result;
+  }
+
+  snapshot() {
+    return {
+      count: this.count,
+      sum: this.sum,
+      max: this.max,
+      mean: this.count > 0 ? this.sum / this.count : 0,
+      p50: this.quantile(0.5),
+      p95: this.quantile(0.95),
+      p99: this.quantile(0.99),
+    };
+  }
+}
@@ -0,0 +1,268 @@
+import { createHash } from 'crypto';
+import { monitorEventLoopDelay } from 'perf_hooks';
+import cluster from 'cluster';
+import { DEFAULT_LATENCY_BUCKETS, Histogram } from './histogram.js';
+
+// Метрики процесса для Prometheus (текстовый формат 0.0.4).
+// Запросы HTTP учитываются по шаблону маршрута (/api/defects/:id), а не по URL,
+// запросы SQLite — по тексту запроса. Наблюдение — поиск в Map и одна корзина гистограммы;
+// все остальное (память, цикл событий, кэши) собирается только при чтении метрик.
+//
+// snapshot() возвращает данные, пригодные для передачи по IPC: в кластере /metrics
+// объединяет снимки всех рабочих процессов (см. cluster-metrics.js).
+
+// Запросы SQLite короче запросов HTTP: нужны корзины меньше миллисекунды
+export const QUERY_LATENCY_BUCKETS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000];
+
+// Шаблон для ответов без маршрута (статика, index.html приложения)
+export const UNMATCHED_ROUTE = "(unmatched)";
+
+const DEFAULT_MAX_STATEMENTS = 500;
+const MAX_SQL_LABEL_LENGTH = 500;
+const EVENT_LOOP_RESOLUTION_MS = 10;
+
+const OTHER_STATEMENT = { id: "other", sql: "(other)" };
+
+// Гистограммы хранятся в миллисекундах, Prometheus ожидает секунды
+const histogramSample = (labels, histogram) => ({
+  labels,
+  buckets: histogram.buckets.map((bound) => bound / 1000),
+  counts: histogram.counts,
+  count: histogram.count,
+  sum: histogram.sum / 1000,
+});
+
+// Один и тот же запрос получает один идентификатор во всех процессах и после перезапуска
+const describeStatement = (sql) => {
+  const normalized = sql.replace(/\s+/g, " ").trim();
+  return {
+    id: createHash("sha1").update(normalized).digest("hex").slice(0, 12),
+    sql: normalized.slice(0, MAX_SQL_LABEL_LENGTH),
+  };
+};
+
+export class MetricsRegistry {
+  constructor({ maxStatements = DEFAULT_MAX_STATEMENTS } = {}) {
+    this.maxStatements = maxStatements;
+    this.routes = new Map();
+    this.statements = new Map();
+    this.statementsById = new Map();
+    this.collectors = [];
+
+    this.eventLoop = monitorEventLoopDelay({ resolution: EVENT_LOOP_RESOLUTION_MS });
+    this.eventLoop.enable();
+  }
+
+  observeRequest(method, route, status, durationMs) {
+    let methods = this.routes.get(route);
+    if (!methods) {
+      methods = new Map();
+      this.routes.set(route, methods);
+    }
+
+    let entry = methods.get(method);
+    if (!entry) {
+      entry = { latency: new Histogram({ buckets: DEFAULT_LATENCY_BUCKETS }), statuses: new Map() };
+      methods.set(method, entry);
+    }
+
+    entry.latency.observe(durationMs);
+    entry.statuses.set(status, (entry.statuses.get(status) || 0) + 1);
+  }
+
+  observeQuery(sql, durationMs, err) {
+    const entry = this.statements.get(sql) || this.statementEntry(sql);
+    entry.latency.observe(durationMs);
+    if (err) entry.errors++;
+  }
+
+  // Число разных запросов ограничено: динамически собранный SQL не раздувает метрики.
+  // Тексты, отличающиеся только пробелами, учитываются вместе.
+  statementEntry(sql) {
+    const full = this.statementsById.size >= this.maxStatements;
+    const statement = full ? OTHER_STATEMENT : describeStatement(sql);
+
+    let entry = this.statementsById.get(statement.id);
+    if (!entry) {
+      entry = { ...statement, latency: new Histogram({ buckets: QUERY_LATENCY_BUCKETS }), errors: 0 };
+      this.statementsById.set(statement.id, entry);
+    }
+    if (!full) this.statements.set(sql, entry);
+    return entry;
+  }
+
+  // collect() возвращает семейства метрик { name, help, type, samples: [{ labels, value }] }.
+  // perProcess: значения процессов кластера не складываются, а получают метку worker.
+  addCollector(collect) {
+    this.collectors.push(collect);
+  }
+
+  collectRequests() {
+    const requests = [];
+    const durations = [];
+    for (const [route, methods] of this.routes) {
+      for (const [method, entry] of methods) {
+        for (const [status, value] of entry.statuses) {
+          requests.push({ labels: { method, route, status: String(status) }, value });
+        }
+        durations.push(histogramSample({ method, route }, entry.latency));
+      }
+    }
+
+    return [
+      { name: "http_requests_total", help: "Число ответов HTTP по шаблону маршрута", type: "counter", samples: requests },
+      { name: "http_request_duration_seconds", help: "Время ответа HTTP по шаблону маршрута", type: "histogram", samples: durations },
+    ];
+  }
+
+  collectQueries() {
+    const info = [];
+    const durations = [];
+    const errors = [];
+    for (const entry of this.statementsById.values()) {
+      const labels = { statement: entry.id };
+      info.push({ labels: { statement: entry.id, sql: entry.sql }, value: 1 });
+      durations.push(histogramSample(labels, entry.latency));
+      errors.push({ labels, value: entry.errors });
+    }
+
+    return [
+      { name: "sqlite_statement_info", help: "Текст запроса SQLite по идентификатору statement", type: "gauge", samples: info },
+      { name: "sqlite_query_duration_seconds", help: "Время выполнения запроса SQLite", type: "histogram", samples: durations },
+      { name: "sqlite_query_errors_total", help: "Число ошибок запроса SQLite", type: "counter", samples: errors },
+    ];
+  }
+
+  // Память процесса и задержка цикла событий (с прошлого чтения метрик)
+  collectProcess() {
+    const memory = process.memoryUsage();
+    const gauge = (name, help, samples) => ({ name, help, type: "gauge", perProcess: true, samples });
+
+    const lag = [];
+    let lagMax = 0;
+    if (this.eventLoop.count > 0) {
+      for (const quantile of [0.5, 0.9, 0.99]) {
+        lag.push({ labels: { quantile: String(quantile) }, value: this.eventLoop.percentile(quantile * 100) / 1e9 });
+      }
+      lagMax = this.eventLoop.max / 1e9;
+    }
+    this.eventLoop.reset();
+
+    return [
+      gauge("nodejs_eventloop_lag_seconds", "Задержка цикла событий с прошлого чтения метрик", lag),
+      gauge("nodejs_eventloop_lag_max_seconds", "Наибольшая задержка цикла событий с прошлого чтения метрик", [{ labels: {}, value: lagMax }]),
+      gauge("nodejs_heap_used_bytes", "Занятая память кучи V8", [{ labels: {}, value: memory.heapUsed }]),
+      gauge("nodejs_heap_total_bytes", "Размер кучи V8", [{ labels: {}, value: memory.heapTotal }]),
+      gauge("nodejs_external_memory_bytes", "Память вне кучи V8 (буферы)", [{ labels: {}, value: memory.external }]),
+      gauge("process_resident_memory_bytes", "Резидентная память процесса", [{ labels: {}, value: memory.rss }]),
+    ];
+  }
+
+  snapshot() {
+    return {
+      worker: cluster.isWorker ? String(cluster.worker.id) : null,
+      families: [
+        ...this.collectRequests(),
+        ...this.collectQueries(),
+        ...this.collectProcess(),
+        ...this.collectors.flatMap((collect) => collect()),
+      ],
+    };
+  }
+
+  close() {
+    this.eventLoop.disable();
+  }
+}
+
+// Метрики кэшей по их stats(): { name: { size, hits, misses, evictions, hitRatio } }
+export const cacheMetrics = (caches) => {
+  const samples = (pick) => Object.entries(caches).map(([cache, stats]) => ({ labels: { cache }, value: pick(stats) }));
+  return [
+    { name: "cache_hits_total", help: "Попадания в кэш", type: "counter", samples: samples((s) => s.hits) },
+    { name: "cache_misses_total", help: "Промахи кэша", type: "counter", samples: samples((s) => s.misses) },
+    { name: "cache_evictions_total", help: "Вытеснения из кэша", type: "counter", samples: samples((s) => s.evictions) },
+    { name: "cache_entries", help: "Число записей в кэше", type: "gauge", perProcess: true, samples: samples((s) => s.size) },
+    { name: "cache_hit_ratio", help: "Доля попаданий в кэш с запуска процесса", type: "gauge", perProcess: true, samples: samples((s) => s.hitRatio) },
+  ];
+};
+
+const escapeLabel = (value) => String(value).replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, '\\"');
+
+const formatLabels = (labels) => {
+  const pairs = Object.entries(labels).map(([key, value]) => `${key}="${escapeLabel(value)}"`);
+  return pairs.length > 0 ? `{${pairs.join(",")}}` : "";
+};
+
+const formatValue = (value) => {
+  if (value === Infinity) return "+Inf";
+  if (value === -Infinity) return "-Inf";
+  return Number.isFinite(value) ? String(value) : "NaN";
+};
+
+// Объединяет снимки процессов: счетчики и гистограммы складываются,
+// значения perProcess получают метку worker, остальные берутся из первого снимка
+const mergeSnapshots = (snapshots) => {
+  const families = new Map();
+
+  for (const { worker, families: list } of snapshots) {
+    for (const family of list) {
+      let merged = families.get(family.name);
+      if (!merged) {
+        merged = { ...family, samples: new Map() };
+        families.set(family.name, merged);
+      }
+
+      for (const sample of family.samples) {
+        const labels = family.perProcess && worker !== null ? { ...sample.labels, worker } : sample.labels;
+        const key = JSON.stringify(labels);
+        const existing = merged.samples.get(key);
+
+        if (!existing) {
+          merged.samples.set(key, family.type === "histogram"
+            ? { ...sample, labels, counts: [...sample.counts] }
+            : { ...sample, labels });
+        } else if (family.type === "histogram") {
+          sample.counts.forEach((value, i) => {
+            existing.counts[i] += value;
+          });
+          existing.count += sample.count;
+          existing.sum += sample.sum;
+        } else if (family.type === "counter") {
+          existing.value += sample.value;
+        }
+      }
+    }
+  }
+
+  return families.values();
+};
+
+export const renderMetrics = (snapshots) => {
+  const lines = [];
+
+  for (const family of mergeSnapshots(snapshots)) {
+    if (family.samples.size === 0) continue;
+
+    lines.push(`# HELP ${family.name} ${family.help}`);
+    lines.push(`# TYPE ${family.name} ${family.type}`);
+
+    for (const sample of family.samples.values()) {
+      if (family.type !== "histogram") {
+        lines.push(`${family.name}${formatLabels(sample.labels)} ${formatValue(sample.value)}`);
+        continue;
+      }
+
+      let total = 0;
+      sample.buckets.forEach((le, i) => {
+        total += sample.counts[i];
+        lines.push(`${family.name}_bucket${formatLabels({ ...sample.labels, le: formatValue(le) })} ${total}`);
+      });
+      lines.push(`${family.name}_bucket${formatLabels({ ...sample.labels, le: "+Inf" })} ${sample.count}`);
+      lines.push(`${family.name}_sum${formatLabels(sample.labels)} ${formatValue(sample.sum)}`);
+      lines.push(`${family.name}_count${formatLabels(sample.labels)} ${sample.count}`);
+    }
+  }
+
+  return `${lines.join("\n")}\n`;
+};
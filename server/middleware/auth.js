@@ -62,3 +62,36 @@ export const requireAnyRole = (roles) => {
     next();
   };
 };
+
+// Установка пользователя в req.user по подписанному токену из заголовка Authorization.
+// Проверка подписи и списка отзыва выполняется без обращения к базе,
+// результат кэшируется по токену до истечения его срока действия.
+// queryTokenPaths — маршруты, где токен можно передать параметром access_token
+// (EventSource не умеет задавать заголовки).
+export const createAuthenticate = ({ sessionCache, verifyToken, revocations, queryTokenPaths = [] }) => {
+  return (req, res, next) => {
+    const authHeader = req.headers.authorization;
+    const queryToken = queryTokenPaths.includes(req.path) ? req.query.access_token : undefined;
+
+    if (!authHeader && !queryToken) {
+      req.user = null;
+      req.session = null;
+      return next();
+    }
+
+    const token = authHeader ? authHeader.replace('Bearer ', '') : String(queryToken);
+    let session = sessionCache.get(token);
+
+    if (session === undefined) {
+      const payload = verifyToken(token);
+      session = payload && !revocations.isRevoked(payload)
+        ? { token, payload, user: { id: payload.sub, email: payload.email, role: payload.role } }
+        : null;
+      sessionCache.set(token, session);
+    }
+
+    req.session = session;
+    req.user = session?.user ?? null;
+    next();
+  };
+};
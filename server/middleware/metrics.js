@@ -0,0 +1,31 @@
+import { performance } from 'perf_hooks';
+import { timingSafeEqual } from 'crypto';
+import { UNMATCHED_ROUTE } from '../metrics/registry.js';
+import { requireAdmin } from './auth.js';
+
+// Учет ответов HTTP по шаблону маршрута. Шаблон известен только после маршрутизации,
+// поэтому он читается в момент отправки ответа. Оборванные клиентом запросы не учитываются.
+export const createRequestMetrics = (metrics) => {
+  return (req, res, next) => {
+    const started = performance.now();
+    res.once("finish", () => {
+      const route = req.route ? req.baseUrl + req.route.path : UNMATCHED_ROUTE;
+      metrics.observeRequest(req.method, route, res.statusCode, performance.now() - started);
+    });
+    next();
+  };
+};
+
+// Доступ к /metrics: сборщик метрик передает METRICS_TOKEN в заголовке Authorization,
+// без него — только администраторы
+export const requireMetricsAccess = (token) => {
+  const expected = token ? Buffer.from(`Bearer ${token}`) : null;
+
+  return (req, res, next) => {
+    const provided = Buffer.from(req.headers.authorization || "");
+    if (expected && provided.length === expected.length && timingSafeEqual(provided, expected)) {
+      return next();
+    }
+    requireAdmin(req, res, next);
+  };
+};
@@ -0,0 +1,226 @@
+import { newId } from './utils.js';
+import { getBoundary, MultipartError, readMultipart } from '../storage/multipart.js';
+import { FileTooLargeError } from '../storage/file-store.js';
+import { appendAttachments, removeAttachment } from '../db/defect-relations.js';
+import { enqueuePreview } from '../db/preview-jobs.js';
+
+// Вложения дефектов:
+// POST   /api/defects/:id/attachments                      multipart/form-data, поле file (можно несколько)
+// GET    /api/defects/:id/attachments/:attachmentId/content  файл с поддержкой Range
+// GET    /api/defects/:id/attachments/:attachmentId/thumbnail, /preview  уменьшенные копии фото
+// DELETE /api/defects/:id/attachments/:attachmentId
+// Файлы пишутся в хранилище потоком по мере чтения запроса; записи о вложениях,
+// перенос файлов на место, постановка фото в очередь превью и записи в журнал событий
+// выполняются одной транзакцией на весь запрос: добавляются либо все файлы, либо ни одного.
+
+export const MAX_FILES_PER_REQUEST = 20;
+
+// Картинки и PDF открываются в браузере, остальное скачивается (HTML и SVG — никогда inline)
+const INLINE_TYPES = ["image/png", "image/jpeg", "image/gif", "image/webp", "application/pdf"];
+
+const contentDisposition = (name, inline) => {
+  const fallback = name.replace(/[^\x20-\x7e]|["\\]/g, "_");
+  return `${inline ? "inline" : "attachment"}; filename="${fallback}"; filename*=UTF-8''${encodeURIComponent(name)}`;
+};
+
+const attachmentUrl = (defectId, attachmentId) => `/api/defects/${defectId}/attachments/${attachmentId}/content`;
+
+// Читает все файлы запроса во временные файлы хранилища; возвращает [{ filename, contentType, sha256, size, tmpPath }]
+async function receiveFiles(req, boundary, fileStore) {
+  const files = [];
+  let writer = null;
+  let current = null;
+
+  try {
+    for await (const event of readMultipart(req, boundary)) {
+      if (event.type === "part") {
+        if (!event.filename) continue;
+        if (files.length >= MAX_FILES_PER_REQUEST) {
+          throw new MultipartError(`Не более ${MAX_FILES_PER_REQUEST} файлов за один запрос`);
+        }
+        current = event;
+        writer = fileStore.createWriter();
+      } else if (event.type === "data") {
+        if (writer) await writer.write(event.chunk);
+      } else if (writer) {
+        const stored = await writer.finish();
+        files.push({ filename: current.filename, contentType: current.contentType, ...stored });
+        writer = null;
+      }
+    }
+  } catch (err) {
+    await writer?.abort();
+    await Promise.all(files.map((file) => fileStore.discard(file)));
+    throw err;
+  }
+
+  return files;
+}
+
+// onChange(defectId) вызывается после добавления или удаления вложения,
+// onEnqueue() — после загрузки, чтобы очередь превью сразу взяла новые задачи;
+// previewsEnabled() — есть ли кому строить превью (иначе задачи не заводятся)
+export function createAttachmentUploadHandler(db, { fileStore, onChange, onEnqueue, previewsEnabled = () => true }) {
+  return (req, res) => {
+    const { id } = req.params;
+    const boundary = getBoundary(req.headers["content-type"]);
+    if (!boundary) {
+      return res.status(415).json({ message: "Ожидается multipart/form-data с полем file" });
+    }
+
+    // Заведомо слишком большой запрос отклоняется до чтения тела
+    const declared = Number(req.headers["content-length"]);
+    if (declared > fileStore.maxFileSize * MAX_FILES_PER_REQUEST) {
+      res.setHeader("Connection", "close");
+      return res.status(413).json({ message: "Слишком большой запрос" });
+    }
+
+    db.get("SELECT id FROM defects WHERE id = ?", [id], async (err, defect) => {
+      if (err) {
+        return res.status(500).json({ message: "Ошибка при добавлении вложения" });
+      }
+      if (!defect) {
+        res.setHeader("Connection", "close");
+        return res.status(404).json({ message: "Дефект не найден" });
+      }
+
+      let files;
+      try {
+        files = await receiveFiles(req, boundary, fileStore);
+      } catch (err) {
+        if (err instanceof FileTooLargeError || err instanceof MultipartError) {
+          res.setHeader("Connection", "close");
+          return res.status(err.status).json({ message: err.message });
+        }
+        console.error("Ошибка при загрузке вложения:", err.message);
+        return res.status(500).json({ message: "Ошибка при добавлении вложения" });
+      }
+
+      if (files.length === 0) {
+        return res.status(400).json({ message: "Файл не передан" });
+      }
+
+      const uploadedAt = new Date().toISOString();
+      const attachments = files.map((file) => {
+        const attachmentId = newId("att");
+        return {
+          id: attachmentId,
+          name: file.filename,
+          size: file.size,
+          type: file.contentType || "application/octet-stream",
+          url: attachmentUrl(id, attachmentId),
+          uploadedAt,
+          uploadedBy: req.user.email,
+          sha256: file.sha256,
+        };
+      });
+
+      // Временные файлы удаляются, если транзакция не прошла (перенесенных на место уже нет)
+      try {
+        const found = await appendAttachments(db, id, attachments, async (tx, attachment, index) => {
+          await fileStore.commit(files[index]);
+          await enqueuePreview(tx, id, attachment, { enqueue: previewsEnabled() });
+        });
+        if (!found) {
+          await Promise.all(files.map((file) => fileStore.discard(file)));
+          return res.status(404).json({ message: "Дефект не найден" });
+        }
+      } catch (err) {
+        console.error("Ошибка при добавлении вложения:", err.message);
+        await Promise.all(files.map((file) => fileStore.discard(file)));
+        return res.status(500).json({ message: "Ошибка при добавлении вложения" });
+      }
+
+      onChange?.(id);
+      onEnqueue?.();
+      res.json({ message: "Вложение добавлено", attachment: attachments[0], attachments });
+    });
+  };
+}
+
+export function createAttachmentDownloadHandler(db, { fileStore }) {
+  return (req, res) => {
+    const { id, attachmentId } = req.params;
+
+    db.get(
+      "SELECT name, type, sha256 FROM defect_attachments WHERE id = ? AND defectId = ?",
+      [attachmentId, id],
+      (err, attachment) => {
+        if (err) {
+          return res.status(500).json({ message: "Ошибка при получении вложения" });
+        }
+        if (!attachment?.sha256) {
+          return res.status(404).json({ message: "Вложение не найдено" });
+        }
+
+        const type = attachment.type || "application/octet-stream";
+        // Содержимое по адресу вложения не меняется — ответ можно кэшировать сколько угодно
+        res.sendFile(fileStore.path(attachment.sha256), {
+          cacheControl: false,
+          headers: {
+            "Content-Type": type,
+            "Content-Disposition": contentDisposition(attachment.name, INLINE_TYPES.includes(type)),
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff",
+          },
+        }, (err) => {
+          if (err && !res.headersSent) {
+            res.status(err.status === 404 ? 404 : 500).json({ message: "Файл вложения не найден" });
+          }
+        });
+      }
+    );
+  };
+}
+
+// variant — "thumbnail" или "preview"; 404, пока копия не готова
+export function createAttachmentVariantHandler(db, { fileStore, variant }) {
+  return (req, res) => {
+    const { id, attachmentId } = req.params;
+
+    db.get(
+      "SELECT sha256, thumbnailUrl FROM defect_attachments WHERE id = ? AND defectId = ?",
+      [attachmentId, id],
+      (err, attachment) => {
+        if (err) {
+          return res.status(500).json({ message: "Ошибка при получении вложения" });
+        }
+        if (!attachment?.sha256 || !attachment.thumbnailUrl) {
+          return res.status(404).json({ message: "Превью не найдено" });
+        }
+
+        res.sendFile(fileStore.variantPath(attachment.sha256, variant), {
+          cacheControl: false,
+          headers: {
+            "Content-Type": "image/webp",
+            "Cache-Control": "private, max-age=31536000, immutable",
+            "X-Content-Type-Options": "nosniff",
+          },
+        }, (err) => {
+          if (err && !res.headersSent) {
+            res.status(err.status === 404 ? 404 : 500).json({ message: "Превью не найдено" });
+          }
+        });
+      }
+    );
+  };
+}
+
+export function createAttachmentDeleteHandler(db, { fileStore, onChange }) {
+  return (req, res) => {
+    const { id, attachmentId } = req.params;
+
+    removeAttachment(db, id, attachmentId, req.user.email, (sha256) => fileStore.remove(sha256), (err, removed) => {
+      if (err) {
+        return res.status(500).json({ message: "Ошибка при удалении вложения" });
+      }
+
+      if (!removed) {
+        return res.status(404).json({ message: "Вложение не найдено" });
+      }
+
+      onChange?.(id);
+      res.json({ message: "Вложение удалено" });
+    });
+  };
+}
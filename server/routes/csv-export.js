@@ -0,0 +1,70 @@
+import zlib from 'zlib';
+import { buildDefectExportBatchQuery, buildDefectFilters } from '../db/defect-queries.js';
+import { escapeCsv, writeWithDrain } from './utils.js';
+
+// Потоковый экспорт дефектов в CSV.
+// Строки читаются пачками по ключу (createdAt, id), каждая пачка сразу пишется в ответ;
+// при заполнении буфера сокета чтение ждет события drain. Память не зависит от объема выгрузки.
+
+export const CSV_COLUMNS = ["id", "projectId", "title", "description", "priority", "assigneeId", "reporterId", "status", "dueDate", "createdAt", "updatedAt"];
+
+const BATCH_SIZE = 1000;
+
+const toCsvLine = (row) => CSV_COLUMNS.map((c) => escapeCsv(row[c] ?? "")).join(",");
+
+export function createCsvExportHandler(db) {
+  const fetchBatch = (filters, after) => new Promise((resolve, reject) => {
+    const { sql, params } = buildDefectExportBatchQuery(filters, CSV_COLUMNS, after, BATCH_SIZE);
+    db.all(sql, params, (err, rows) => (err ? reject(err) : resolve(rows)));
+  });
+
+  return async (req, res) => {
+    const filters = buildDefectFilters(req.query);
+    const gzip = /\bgzip\b/.test(req.headers["accept-encoding"] || "");
+
+    let closed = false;
+    res.on("close", () => {
+      closed = true;
+    });
+
+    let out = res;
+
+    try {
+      // Первая пачка читается до заголовков: ошибка запроса дает обычный JSON-ответ 500
+      let rows = await fetchBatch(filters, null);
+
+      res.setHeader("Content-Type", "text/csv; charset=utf-8");
+      res.setHeader("Content-Disposition", `attachment; filename=defects.csv`);
+      res.setHeader("Vary", "Accept-Encoding");
+      if (gzip) {
+        res.setHeader("Content-Encoding", "gzip");
+        out = zlib.createGzip();
+        out.pipe(res);
+      }
+
+      await writeWithDrain(out, res, CSV_COLUMNS.join(","));
+
+      while (!closed && rows.length > 0) {
+        await writeWithDrain(out, res, "\n" + rows.map(toCsvLine).join("\n"));
+        if (rows.length < BATCH_SIZE) break;
+
+        rows = await fetchBatch(filters, rows[rows.length - 1]);
+      }
+
+      out.end();
+    } catch (err) {
+      console.error("Ошибка при экспорте дефектов:", err.message);
+      if (!res.headersSent) {
+        // gzip копит данные в буфере: заголовки еще не ушли, но ответ уже настроен под архив CSV
+        if (out !== res) {
+          out.unpipe(res);
+          out.destroy();
+        }
+        res.removeHeader("Content-Encoding");
+        res.removeHeader("Content-Disposition");
+        return res.status(500).json({ message: "Ошибка при экспорте дефектов" });
+      }
+      res.destroy(err);
+    }
+  };
+}
@@ -0,0 +1,176 @@
+import { buildDefectFilters } from '../db/defect-queries.js';
+import { validateStatusChange } from './defect-input.js';
+import { recordDefectEvents } from '../db/defect-events.js';
+
+// Пакетная смена статуса и исполнителя:
+// PATCH /api/defects/bulk/status   { ids | filter, status, reason }
+// PATCH /api/defects/bulk/assignee { ids | filter, assigneeId }
+// Дефекты задаются списком ids или фильтром (те же поля, что у GET /api/defects).
+// Изменения, записи истории и события журнала применяются одной транзакцией
+// несколькими множественными запросами; в ответе — результат по каждому id.
+
+export const MAX_BULK_DEFECTS = 5000;
+
+const FILTER_FIELDS = ["q", "status", "priority", "projectId", "assigneeId"];
+
+// Проверка ids/filter; возвращает { ids } или { filter } либо { error }
+function parseTargets({ ids, filter }) {
+  if (ids !== undefined && filter !== undefined) {
+    return { error: "Укажите ids или filter, но не оба" };
+  }
+
+  if (ids !== undefined) {
+    if (!Array.isArray(ids) || ids.length === 0 || !ids.every((id) => typeof id === "string" && id)) {
+      return { error: "ids должен быть непустым массивом строк" };
+    }
+    if (ids.length > MAX_BULK_DEFECTS) {
+      return { error: `Не более ${MAX_BULK_DEFECTS} дефектов за один запрос` };
+    }
+    return { ids: [...new Set(ids)] };
+  }
+
+  if (filter && typeof filter === "object" && FILTER_FIELDS.some((field) => filter[field])) {
+    return { filter };
+  }
+  return { error: "Нужен список ids или непустой filter" };
+}
+
+// Текущие значения поля у найденных дефектов: Map id -> значение
+async function loadTargets(tx, targets, column) {
+  if (targets.ids) {
+    const rows = await tx.all(
+      `SELECT id, ${column} AS value FROM defects WHERE id IN (SELECT value FROM json_each(?))`,
+      [JSON.stringify(targets.ids)]
+    );
+    return new Map(rows.map((row) => [row.id, row.value]));
+  }
+
+  const filters = buildDefectFilters(targets.filter);
+  const rows = await tx.all(
+    `SELECT defects.id AS id, defects.${column} AS value FROM ${filters.from} WHERE 1=1${filters.where} LIMIT ?`,
+    [...filters.params, MAX_BULK_DEFECTS + 1]
+  );
+  if (rows.length > MAX_BULK_DEFECTS) {
+    const error = new Error(`Фильтр выбирает больше ${MAX_BULK_DEFECTS} дефектов`);
+    error.status = 400;
+    throw error;
+  }
+  return new Map(rows.map((row) => [row.id, row.value]));
+}
+
+// Общая часть обработчиков: транзакция, обновление, история, журнал, отчет по id.
+// event = { type, data(value, previous, reason) } — событие журнала для каждого измененного дефекта.
+function createBulkHandler(db, { column, validate, describe, event, errorMessage, onChange }) {
+  return (req, res) => {
+    const targets = parseTargets(req.body ?? {});
+    if (targets.error) {
+      return res.status(400).json({ message: targets.error });
+    }
+
+    const validation = validate(req.body);
+    if (validation.error) {
+      return res.status(400).json({ message: validation.error });
+    }
+
+    const { value, reason } = validation;
+    const timestamp = new Date().toISOString();
+    const entry = describe(value);
+
+    db.transaction(async (tx) => {
+      const current = await loadTargets(tx, targets, column);
+      const changed = [...current].filter(([, previous]) => previous !== value).map(([id]) => id);
+      const changedJson = JSON.stringify(changed);
+
+      if (changed.length > 0) {
+        await tx.run(
+          `UPDATE defects SET ${column} = ?, updatedAt = ? WHERE id IN (SELECT value FROM json_each(?))`,
+          [value, timestamp, changedJson]
+        );
+        await tx.run(
+          `INSERT INTO defect_history (defectId, action, timestamp, changes, reason, changedBy)
+           SELECT value, ?, ?, ?, ?, ? FROM json_each(?)`,
+          [entry.action, timestamp, JSON.stringify(entry.changes), reason ?? null, req.user.email, changedJson]
+        );
+        await recordDefectEvents(
+          tx,
+          event.type,
+          changed.map((id) => ({ defectId: id, data: event.data(value, current.get(id), reason ?? null) })),
+          { actor: req.user.email, at: timestamp }
+        );
+      }
+
+      const requested = targets.ids ?? [...current.keys()];
+      return requested.map((id) => {
+        if (!current.has(id)) return { id, result: "not_found" };
+        const previous = current.get(id);
+        return previous === value
+          ? { id, result: "unchanged" }
+          : { id, result: "updated", previous };
+      });
+    }, (err, results) => {
+      if (err) {
+        if (err.status === 400) {
+          return res.status(400).json({ message: err.message });
+        }
+        console.error(`${errorMessage}:`, err.message);
+        return res.status(500).json({ message: errorMessage });
+      }
+
+      const changed = results.filter((r) => r.result === "updated").map((r) => r.id);
+      if (changed.length > 0) onChange?.(changed, value);
+
+      const count = (result) => results.filter((r) => r.result === result).length;
+      res.json({
+        updated: count("updated"),
+        unchanged: count("unchanged"),
+        notFound: count("not_found"),
+        results,
+      });
+    });
+  };
+}
+
+// onChange(ids, value) получает id измененных дефектов и новое значение
+export function createBulkStatusHandler(db, { onChange } = {}) {
+  return createBulkHandler(db, {
+    onChange,
+    column: "status",
+    validate: (body) => {
+      const error = validateStatusChange(body);
+      return error ? { error } : { value: body.status, reason: body.reason };
+    },
+    describe: (status) => ({ action: `Статус изменен на "${status}"`, changes: { status } }),
+    event: {
+      type: "status",
+      data: (status, previous, reason) => ({ status, previous, reason }),
+    },
+    errorMessage: "Ошибка при обновлении статуса",
+  });
+}
+
+export function createBulkAssigneeHandler(db, { onChange } = {}) {
+  return createBulkHandler(db, {
+    onChange,
+    column: "assigneeId",
+    validate: (body) => {
+      const { assigneeId } = body;
+      if (assigneeId === undefined) {
+        return { error: "assigneeId обязателен (null — снять исполнителя)" };
+      }
+      const valid = assigneeId === null || typeof assigneeId === "number" || (typeof assigneeId === "string" && assigneeId !== "");
+      if (!valid) {
+        return { error: "Недопустимый assigneeId" };
+      }
+      return { value: assigneeId === null ? null : String(assigneeId), reason: body.reason };
+    },
+    describe: (assigneeId) => ({
+      action: assigneeId === null ? "Исполнитель снят" : "Исполнитель изменен",
+      changes: { assigneeId },
+    }),
+    event: {
+      type: "updated",
+      data: (assigneeId, previous) => ({ changes: { assigneeId }, previous: { assigneeId: previous } }),
+    },
+    errorMessage: "Ошибка при смене исполнителя",
+  });
+}
@@ -0,0 +1,230 @@
+import { buildNewDefect, validateDefectInput } from './defect-input.js';
+import { insertDefectBatch } from '../db/defect-writer.js';
+
+// Пакетный импорт дефектов: POST /api/defects/bulk.
+// Тело читается потоком — NDJSON (по объекту на строку) или CSV с заголовком
+// (колонки как в экспорте); небольшие объемы можно передать JSON-массивом.
+// Записи проверяются теми же правилами, что и при создании одного дефекта,
+// и вставляются пачками по batchSize в отдельных транзакциях.
+// В ответе — число вставленных записей, ошибки по номерам строк и скорость импорта.
+
+const DEFAULT_BATCH_SIZE = 1000;
+const MAX_BATCH_SIZE = 10_000;
+const MAX_REPORTED_ERRORS = 1000;
+
+// Строки потока; многобайтовые символы на границе фрагментов не разрываются
+async function* readLines(stream) {
+  const decoder = new TextDecoder();
+  let buffer = "";
+
+  for await (const chunk of stream) {
+    buffer += decoder.decode(chunk, { stream: true });
+    let newline;
+    while ((newline = buffer.indexOf("\n")) !== -1) {
+      yield buffer.slice(0, newline).replace(/\r$/, "");
+      buffer = buffer.slice(newline + 1);
+    }
+  }
+
+  buffer += decoder.decode();
+  if (buffer) yield buffer.replace(/\r$/, "");
+}
+
+// NDJSON: { line, input } или { line, error }; пустые строки пропускаются
+async function* readNdjson(stream) {
+  let line = 0;
+  for await (const text of readLines(stream)) {
+    line++;
+    if (!text.trim()) continue;
+    try {
+      yield { line, input: JSON.parse(text) };
+    } catch {
+      yield { line, error: "Некорректный JSON" };
+    }
+  }
+}
+
+// CSV по RFC 4180: поля в кавычках могут содержать запятые, кавычки и переводы строк.
+// line — номер строки, с которой начинается запись.
+async function* readCsv(stream) {
+  const decoder = new TextDecoder();
+  let header = null;
+  let fields = [];
+  let field = "";
+  let quoted = false;
+  let afterQuote = false;
+  let line = 1;
+  let recordLine = 1;
+
+  function* endRecord() {
+    fields.push(field);
+    const record = fields;
+    fields = [];
+    field = "";
+
+    if (record.length === 1 && record[0] === "") return;
+    if (!header) {
+      header = record.map((name) => name.trim());
+      return;
+    }
+
+    const input = {};
+    header.forEach((name, i) => {
+      if (record[i] !== undefined && record[i] !== "") input[name] = record[i];
+    });
+    yield { line: recordLine, input };
+  }
+
+  const consume = function* (text) {
+    for (const ch of text) {
+      if (quoted) {
+        if (ch === '"') {
+          quoted = false;
+          afterQuote = true;
+        } else {
+          if (ch === "\n") line++;
+          field += ch;
+        }
+        continue;
+      }
+
+      if (ch === '"') {
+        // Удвоенная кавычка внутри поля — литеральная кавычка
+        if (afterQuote) field += '"';
+        quoted = true;
+        afterQuote = false;
+        continue;
+      }
+      afterQuote = false;
+
+      if (ch === ",") {
+        fields.push(field);
+        field = "";
+      } else if (ch === "\n") {
+        yield* endRecord();
+        line++;
+        recordLine = line;
+      } else if (ch !== "\r") {
+        field += ch;
+      }
+    }
+  };
+
+  for await (const chunk of stream) {
+    yield* consume(decoder.decode(chunk, { stream: true }));
+  }
+  yield* consume(decoder.decode());
+  if (field !== "" || fields.length > 0) {
+    yield* endRecord();
+  }
+}
+
+// Обычный JSON-массив уже разобран express.json() — записи берутся из req.body
+async function* readJsonArray(items) {
+  for (let i = 0; i < items.length; i++) {
+    yield { line: i + 1, input: items[i] };
+  }
+}
+
+const detectFormat = (req) => {
+  const type = (req.headers["content-type"] || "").toLowerCase();
+  if (type.includes("csv")) return "csv";
+  if (Array.isArray(req.body)) return "json";
+  if (type.includes("ndjson") || type.includes("jsonl") || type.includes("json-seq") || type === "") return "ndjson";
+  return null;
+};
+
+// Каждый добавленный дефект записывается в журнал событий в транзакции своей пачки.
+// onChange({ inserted }) вызывается после импорта, если добавлена хотя бы одна запись;
+// projects — каталог проектов для проверки projectId
+export function createDefectImportHandler(db, { onChange, projects } = {}) {
+  return async (req, res) => {
+    const format = detectFormat(req);
+    if (!format) {
+      return res.status(415).json({ message: "Ожидается application/x-ndjson, text/csv или JSON-массив" });
+    }
+
+    const batchSize = Math.min(Math.max(Number(req.query.batchSize) || DEFAULT_BATCH_SIZE, 1), MAX_BATCH_SIZE);
+    const records = format === "csv" ? readCsv(req)
+      : format === "json" ? readJsonArray(req.body)
+      : readNdjson(req);
+    const startedAt = performance.now();
+    const reporterId = String(req.user.id);
+
+    const errors = [];
+    let errorCount = 0;
+    let received = 0;
+    let inserted = 0;
+    let batches = 0;
+    let batch = [];
+
+    const reportError = (line, message) => {
+      errorCount++;
+      if (errors.length < MAX_REPORTED_ERRORS) {
+        errors.push({ line, message });
+      }
+    };
+
+    const flush = async () => {
+      if (batch.length === 0) return;
+      const current = batch;
+      batch = [];
+
+      const result = await insertDefectBatch(db, current.map((item) => item.defect), { event: "imported", actor: req.user.email });
+      batches++;
+      inserted += result.inserted;
+      for (const { index, message } of result.errors) {
+        reportError(current[index].line, message);
+      }
+    };
+
+    try {
+      for await (const record of records) {
+        received++;
+        if (record.error) {
+          reportError(record.line, record.error);
+          continue;
+        }
+
+        const error = validateDefectInput(record.input, { allowImportFields: true, projects });
+        if (error) {
+          reportError(record.line, error);
+          continue;
+        }
+
+        batch.push({
+          line: record.line,
+          defect: buildNewDefect(record.input, { reporterId, allowImportFields: true }),
+        });
+        if (batch.length >= batchSize) {
+          await flush();
+        }
+      }
+      await flush();
+    } catch (err) {
+      console.error("Ошибка при импорте дефектов:", err.message);
+      if (inserted > 0) onChange?.({ inserted });
+      return res.status(500).json({
+        message: "Ошибка при импорте дефектов",
+        received,
+        inserted,
+      });
+    }
+
+    if (inserted > 0) onChange?.({ inserted });
+
+    const durationMs = performance.now() - startedAt;
+    res.status(errorCount > 0 && inserted === 0 ? 400 : 200).json({
+      format,
+      received,
+      inserted,
+      failed: errorCount,
+      batches,
+      batchSize,
+      durationMs: Math.round(durationMs),
+      rowsPerSecond: durationMs > 0 ? Math.round((inserted * 1000) / durationMs) : inserted,
+      errors,
+      errorsTruncated: errorCount > errors.length,
+    });
+  };
+}
@@ -0,0 +1,76 @@
+import { isoNow, newId } from './utils.js';
+
+// Правила для новых дефектов — общие для POST /api/defects и пакетного импорта
+
+export const VALID_STATUSES = ["new", "in_progress", "in_review", "closed", "cancelled"];
+export const VALID_PRIORITIES = ["low", "medium", "high", "critical"];
+
+const isIsoDate = (value) => typeof value === "string" && !Number.isNaN(Date.parse(value));
+
+// Возвращает текст ошибки или null.
+// allowImportFields разрешает поля, которые задаются только при импорте (id, status, даты, автор).
+// projects — каталог проектов: projectId проверяется по нему без запроса к базе.
+export function validateDefectInput(input, { allowImportFields = false, projects } = {}) {
+  if (!input || typeof input !== "object" || Array.isArray(input)) {
+    return "Ожидается объект дефекта";
+  }
+
+  const { title, projectId, priority } = input;
+  if (!title || !projectId || !priority) {
+    return "title, projectId и priority обязательны";
+  }
+  if (!VALID_PRIORITIES.includes(priority)) {
+    return `Недопустимый приоритет: ${priority}`;
+  }
+  if (projects && !projects.has(projectId)) {
+    return `Проект не найден: ${projectId}`;
+  }
+
+  if (allowImportFields) {
+    if (input.status && !VALID_STATUSES.includes(input.status)) {
+      return `Недопустимый статус: ${input.status}`;
+    }
+    for (const field of ["createdAt", "updatedAt"]) {
+      if (input[field] && !isIsoDate(input[field])) {
+        return `Недопустимая дата в поле ${field}`;
+      }
+    }
+  }
+
+  if (input.dueDate && !isIsoDate(input.dueDate)) {
+    return "Недопустимая дата в поле dueDate";
+  }
+
+  return null;
+}
+
+// Собирает запись дефекта из проверенных данных
+export function buildNewDefect(input, { reporterId, allowImportFields = false, now = isoNow() }) {
+  const imported = allowImportFields ? input : {};
+  const createdAt = imported.createdAt || now;
+
+  return {
+    id: imported.id || newId("d"),
+    projectId: input.projectId,
+    title: input.title,
+    description: input.description,
+    priority: input.priority,
+    assigneeId: input.assigneeId,
+    reporterId: imported.reporterId || reporterId,
+    status: imported.status || "new",
+    dueDate: input.dueDate,
+    createdAt,
+    updatedAt: imported.updatedAt || createdAt,
+  };
+}
+
+// Проверка смены статуса (одиночной и пакетной); возвращает текст ошибки или null
+export function validateStatusChange({ status } = {}) {
+  if (!status) {
+    return "Статус обязателен";
+  }
+  if (!VALID_STATUSES.includes(status)) {
+    return "Недопустимый статус";
+  }
+  return null;
+}
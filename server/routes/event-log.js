@@ -0,0 +1,123 @@
+import zlib from 'zlib';
+import { matchesEventFilters, parseEventFilters, queryDefectEvents } from '../db/defect-events.js';
+import { listEventSegments, readEventSegment } from '../db/event-archive.js';
+import { writeWithDrain } from './utils.js';
+
+// Журнал изменений дефектов для отчетов:
+// GET /api/admin/defect-events           страница горячей части журнала (курсор nextCursor)
+// GET /api/admin/defect-events/export    NDJSON за период вместе с архивными сегментами
+// GET /api/admin/defect-events/segments  список архивных файлов
+// Фильтры: from, to (ISO-время, to не включается), defectId, projectId, type, actor.
+
+const EXPORT_BATCH = 1000;
+
+const queryPage = (db, filters) => new Promise((resolve, reject) => {
+  queryDefectEvents(db, filters, (err, page) => (err ? reject(err) : resolve(page)));
+});
+
+export function createEventLogHandler(db) {
+  return (req, res) => {
+    const { filters, error } = parseEventFilters(req.query);
+    if (error) {
+      return res.status(400).json({ message: error });
+    }
+
+    queryDefectEvents(db, filters, (err, page) => {
+      if (err) {
+        return res.status(500).json({ message: "Ошибка при чтении журнала событий" });
+      }
+
+      // Если период задевает архив, ответ об этом сообщает: полные данные дает export
+      listEventSegments(db, filters, (err, segments) => {
+        if (err) {
+          return res.status(500).json({ message: "Ошибка при чтении журнала событий" });
+        }
+        res.json({ ...page, archivedSegments: segments.length });
+      });
+    });
+  };
+}
+
+export function createEventSegmentsHandler(db) {
+  return (req, res) => {
+    const { filters, error } = parseEventFilters(req.query);
+    if (error) {
+      return res.status(400).json({ message: error });
+    }
+
+    listEventSegments(db, filters, (err, segments) => {
+      if (err) {
+        return res.status(500).json({ message: "Ошибка при чтении списка архивов" });
+      }
+      res.json(segments);
+    });
+  };
+}
+
+// Выгрузка потоком: сначала архивные сегменты периода (распаковываются и фильтруются
+// построчно), затем горячая часть журнала пачками. Память не зависит от объема.
+export function createEventLogExportHandler(db, { archiveDir }) {
+  return async (req, res) => {
+    const { filters, error } = parseEventFilters(req.query);
+    if (error) {
+      return res.status(400).json({ message: error });
+    }
+    delete filters.after;
+
+    const gzip = /\bgzip\b/.test(req.headers["accept-encoding"] || "");
+
+    let closed = false;
+    res.on("close", () => {
+      closed = true;
+    });
+
+    res.setHeader("Content-Type", "application/x-ndjson; charset=utf-8");
+    res.setHeader("Content-Disposition", "attachment; filename=defect-events.ndjson");
+    res.setHeader("Vary", "Accept-Encoding");
+
+    let out = res;
+    if (gzip) {
+      res.setHeader("Content-Encoding", "gzip");
+      out = zlib.createGzip();
+      out.pipe(res);
+    }
+
+    try {
+      const segments = await new Promise((resolve, reject) => {
+        listEventSegments(db, filters, (err, rows) => (err ? reject(err) : resolve(rows)));
+      });
+
+      for (const segment of segments) {
+        let chunk = "";
+        for await (const event of readEventSegment(archiveDir, segment)) {
+          if (closed) break;
+          if (!matchesEventFilters(event, filters)) continue;
+          chunk += `${JSON.stringify(event)}\n`;
+          if (chunk.length >= 64 * 1024) {
+            await writeWithDrain(out, res, chunk);
+            chunk = "";
+          }
+        }
+        if (chunk) await writeWithDrain(out, res, chunk);
+      }
+
+      let after = null;
+      while (!closed) {
+        const page = await queryPage(db, { ...filters, after, limit: EXPORT_BATCH });
+        if (page.items.length > 0) {
+          await writeWithDrain(out, res, page.items.map((event) => `${JSON.stringify(event)}\n`).join(""));
+        }
+        if (!page.nextCursor) break;
+        after = page.items[page.items.length - 1];
+      }
+
+      out.end();
+    } catch (err) {
+      console.error("Ошибка при выгрузке журнала событий:", err.message);
+      if (!res.headersSent) {
+        return res.status(500).json({ message: "Ошибка при выгрузке журнала событий" });
+      }
+      res.destroy(err);
+    }
+  };
+}
@@ -0,0 +1,86 @@
+// GET /api/events — Server-Sent Events с изменениями дефектов.
+// Параметры: projectId (через запятую) и types — фильтры; Last-Event-ID (заголовок,
+// его ставит EventSource при переподключении, или параметр lastEventId) — продолжение
+// с пропущенного события (id — номер события в журнале defect_events). Если продолжить
+// нельзя, первым приходит событие reset: клиент должен перезапросить данные.
+// EventSource не умеет передавать заголовки, поэтому токен допускается в access_token.
+
+const HEARTBEAT_MS = 25_000;
+// Клиент, который не успевает читать поток, отключается; он переподключится с Last-Event-ID
+const MAX_BUFFERED_BYTES = 1024 * 1024;
+
+const parseList = (value) => (value ? new Set(String(value).split(",").map((item) => item.trim()).filter(Boolean)) : null);
+
+// isSessionValid(session) проверяется с каждым heartbeat: отозванный или истекший токен закрывает поток
+export function createEventStreamHandler(events, { isSessionValid, heartbeatMs = HEARTBEAT_MS }) {
+  return (req, res) => {
+    const projects = parseList(req.query.projectId);
+    const types = parseList(req.query.types);
+
+    // События без проекта (импорт) получают все подписчики
+    const matches = (event) =>
+      (!projects || !event.projectId || projects.has(event.projectId)) &&
+      (!types || types.has(event.type));
+
+    res.writeHead(200, {
+      "Content-Type": "text/event-stream; charset=utf-8",
+      "Cache-Control": "no-cache, no-transform",
+      "Connection": "keep-alive",
+      "X-Accel-Buffering": "no",
+    });
+    res.write("retry: 3000\n\n");
+
+    let unsubscribe = () => {};
+    let heartbeat = null;
+    let closed = false;
+    const close = () => {
+      if (closed) return;
+      closed = true;
+      unsubscribe();
+      clearInterval(heartbeat);
+      res.end();
+    };
+
+    // seq последнего отправленного события: повторы (пропущенное могло прийти и из журнала,
+    // и из потока) не отправляются
+    const lastEventId = req.headers["last-event-id"] ?? req.query.lastEventId;
+    let sentSeq = Number(lastEventId) || 0;
+
+    const send = (event) => {
+      if (closed || event.seq <= sentSeq) return;
+      sentSeq = event.seq;
+      if (!matches(event)) return;
+
+      const { id, type, defectId, projectId, at, data } = event;
+      res.write(`id: ${id}\nevent: ${type}\ndata: ${JSON.stringify({ defectId, projectId, at, ...data })}\n\n`);
+      if (res.writableLength > MAX_BUFFERED_BYTES) close();
+    };
+
+    // Подписка до чтения пропущенного: новые события ждут в очереди, пока отправляется пропущенное
+    let queued = lastEventId ? [] : null;
+    unsubscribe = events.subscribe((event) => (queued ? queued.push(event) : send(event)), { onClose: close });
+
+    if (lastEventId) {
+      events.since(lastEventId, (err, missed) => {
+        if (closed) return;
+        if (err || missed === null) {
+          if (err) console.error("Ошибка при чтении пропущенных событий:", err.message);
+          sentSeq = 0;
+          res.write("event: reset\ndata: {}\n\n");
+        } else {
+          missed.forEach(send);
+        }
+        const pending = queued;
+        queued = null;
+        pending.forEach(send);
+      });
+    }
+
+    heartbeat = setInterval(() => {
+      if (!isSessionValid(req.session)) return close();
+      res.write(": ping\n\n");
+    }, heartbeatMs);
+
+    req.on("close", close);
+  };
+}
@@ -1,3 +1,5 @@
+import { once } from 'events';
+
 export function newId(prefix) {
   return `${prefix}_${Math.random().toString(36).substr(2, 9)}`;
 }
@@ -21,6 +23,22 @@ export function escapeCsv(str) {
   return s;
 }
 
+// Пишет кусок потокового ответа. Если буфер out (сам ответ или gzip-поток поверх него)
+// заполнен, ждет drain или разрыва соединения res; лишний слушатель снимается.
+export async function writeWithDrain(out, res, chunk) {
+  if (out.write(chunk)) return;
+
+  const waiting = new AbortController();
+  try {
+    await Promise.race([
+      once(out, "drain", { signal: waiting.signal }),
+      once(res, "close", { signal: waiting.signal }),
+    ]);
+  } finally {
+    waiting.abort();
+  }
+}
+
 export function seedDefects() {
   const now = isoNow();
   const users = ["u1", "u2", "u3", "u4", "u5", "u6", "u7", "u8", "u9", "u10"];
@@ -3,258 +3,189 @@ import express from 'express';
 import cors from 'cors';
 import path from 'path';
 import { fileURLToPath } from 'url';
-import sqlite3 from 'sqlite3'; // Подключаем sqlite3 для работы с базой данных
-import bcrypt from 'bcryptjs'; // Для хэширования паролей
-import { escapeCsv, isoDaysAgo, isoNow, newId, seedDefects } from './routes/utils.js';
-import { requireAuth, requireAdmin, requireManager, requireEngineer, requireActiveUser } from './middleware/auth.js';
-
-
-let projects = [
-  {
-    id: "p1",
-    name: "ЖК Северный",
-    code: "NORTH-01",
-    location: "Москва",
-    stages: [
-      { id: "s1", name: "Фундамент", startDate: isoDaysAgo(120), endDate: isoDaysAgo(90) },
-      { id: "s2", name: "Каркас", startDate: isoDaysAgo(89), endDate: isoDaysAgo(30) },
-      { id: "s3", name: "Отделка", startDate: isoDaysAgo(29) },
-    ],
+import cluster from 'cluster';
+import { buildNewDefect, validateDefectInput, validateStatusChange } from './routes/defect-input.js';
+import { createDefectImportHandler } from './routes/defect-import.js';
+import { createBulkAssigneeHandler, createBulkStatusHandler } from './routes/defect-bulk.js';
+import { createCsvExportHandler } from './routes/csv-export.js';
+import { createAttachmentDeleteHandler, createAttachmentDownloadHandler, createAttachmentUploadHandler, createAttachmentVariantHandler } from './routes/attachments.js';
+import { requireAuth, requireAdmin, requireManager, requireEngineer, requireActiveUser, createAuthenticate } from './middleware/auth.js';
+import { buildDefectListQuery, encodeCursor } from './db/defect-queries.js';
+import { Database } from './db/database.js';
+import { runMigrations } from './db/migrations.js';
+import { seedDatabase } from './db/seed.js';
+import { defectParams, INSERT_DEFECT_SQL } from './db/defect-writer.js';
+import { recordDefectEvent } from './db/defect-events.js';
+import { DEFAULT_RETAIN_DAYS } from './db/event-archive.js';
+import { readDefectStats, readStatsVersion } from './db/defect-stats.js';
+import { readCacheVersion } from './db/cache-versions.js';
+import { SessionCache } from './cache/session-cache.js';
+import { onInvalidation, publishInvalidation } from './cache/invalidation-bus.js';
+import { cachedJson, matchesEtag, ResponseCache } from './cache/response-cache.js';
+import { ProjectCatalog, validateProjectInput } from './cache/project-catalog.js';
+import { resolveTokenSecret, signToken, verifyToken } from './auth/tokens.js';
+import { RevocationList } from './auth/revocations.js';
+import { HashPool } from './auth/hash-pool.js';
+import { appendComment, changeDefectStatus, deleteDefect, loadDefectRelations } from './db/defect-relations.js';
+import { FileStore } from './storage/file-store.js';
+import { PreviewQueue } from './jobs/preview-queue.js';
+import { DefectEventStream } from './events/defect-events.js';
+import { createEventStreamHandler } from './routes/event-stream.js';
+import { createEventLogExportHandler, createEventLogHandler, createEventSegmentsHandler } from './routes/event-log.js';
+import { EventArchiver } from './jobs/event-archiver.js';
+import { countPreviewJobs } from './db/preview-jobs.js';
+import { QueryProfiler } from './db/query-profiler.js';
+import { cacheMetrics, MetricsRegistry, renderMetrics } from './metrics/registry.js';
+import { collectClusterMetrics, serveClusterMetrics } from './metrics/cluster-metrics.js';
+import { createRequestMetrics, requireMetricsAccess } from './middleware/metrics.js';
+
+
+
+const VALID_ROLES = ['admin', 'manager', 'engineer', 'user', 'observer'];
+
+// Метрики для Prometheus (/metrics): ответы по маршрутам, запросы SQLite, память, кэши
+const metrics = new MetricsRegistry();
+serveClusterMetrics(metrics);
+
+// Профилировщик запросов включается заданием SLOW_QUERY_MS — порога записи в журнал
+const queryProfiler = process.env.SLOW_QUERY_MS
+  ? new QueryProfiler({
+    thresholdMs: Number(process.env.SLOW_QUERY_MS),
+    explain: (sql, params, callback) => db.explain(sql, params, callback),
+  })
+  : null;
+
+// Одно соединение для записи и пул соединений для чтения (WAL)
+const db = new Database(process.env.DATABASE_PATH || './database.db', {
+  onQuery: (sql, durationMs, err, query) => {
+    metrics.observeQuery(sql, durationMs, err);
+    queryProfiler?.observe(sql, durationMs, err, query);
   },
-  {
-    id: "p2",
-    name: "БЦ Восход",
-    code: "SUN-02",
-    location: "Санкт-Петербург",
-    stages: [
-      { id: "s4", name: "Подготовка площадки", startDate: isoDaysAgo(60), endDate: isoDaysAgo(55) },
-      { id: "s5", name: "Монтаж", startDate: isoDaysAgo(54) },
-    ],
-  },
-  {
-    id: "p3",
-    name: "ТЦ Мегаполис",
-    code: "MEGA-03",
-    location: "Казань",
-    stages: [
-      { id: "s6", name: "Проектирование", startDate: isoDaysAgo(200), endDate: isoDaysAgo(150) },
-      { id: "s7", name: "Строительство", startDate: isoDaysAgo(149), endDate: isoDaysAgo(50) },
-      { id: "s8", name: "Отделка", startDate: isoDaysAgo(49), endDate: isoDaysAgo(10) },
-      { id: "s9", name: "Запуск", startDate: isoDaysAgo(9) },
-    ],
-  },
-  {
-    id: "p4",
-    name: "ЖК Золотые Ворота",
-    code: "GOLD-04",
-    location: "Владимир",
-    stages: [
-      { id: "s10", name: "Подготовка", startDate: isoDaysAgo(80), endDate: isoDaysAgo(70) },
-      { id: "s11", name: "Строительство", startDate: isoDaysAgo(69), endDate: isoDaysAgo(20) },
-      { id: "s12", name: "Благоустройство", startDate: isoDaysAgo(19) },
-    ],
-  },
-  {
-    id: "p5",
-    name: "Офисный комплекс Сити",
-    code: "CITY-05",
-    location: "Екатеринбург",
-    stages: [
-      { id: "s13", name: "Проектирование", startDate: isoDaysAgo(150), endDate: isoDaysAgo(100) },
-      { id: "s14", name: "Фундамент", startDate: isoDaysAgo(99), endDate: isoDaysAgo(80) },
-      { id: "s15", name: "Каркас", startDate: isoDaysAgo(79), endDate: isoDaysAgo(40) },
-      { id: "s16", name: "Отделка", startDate: isoDaysAgo(39), endDate: isoDaysAgo(5) },
-      { id: "s17", name: "Сдача", startDate: isoDaysAgo(4) },
-    ],
-  },
-  {
-    id: "p6",
-    name: "Складской комплекс Логистик",
-    code: "LOG-06",
-    location: "Новосибирск",
-    stages: [
-      { id: "s18", name: "Подготовка площадки", startDate: isoDaysAgo(90), endDate: isoDaysAgo(80) },
-      { id: "s19", name: "Строительство", startDate: isoDaysAgo(79), endDate: isoDaysAgo(30) },
-      { id: "s20", name: "Монтаж оборудования", startDate: isoDaysAgo(29), endDate: isoDaysAgo(5) },
-      { id: "s21", name: "Тестирование", startDate: isoDaysAgo(4) },
-    ],
+});
+
+// Файлы вложений: контентно-адресуемое хранилище на диске
+const fileStore = new FileStore({
+  root: process.env.ATTACHMENTS_DIR || './uploads',
+  maxFileSize: Number(process.env.ATTACHMENT_MAX_BYTES) || 100 * 1024 * 1024,
+});
+
+// Миниатюры и превью фото вложений строятся в фоне; готовые ссылки меняют карточку дефекта
+const previewQueue = new PreviewQueue(db, {
+  fileStore,
+  size: Number(process.env.PREVIEW_WORKERS) || undefined,
+  onDone: (defectIds) => {
+    invalidateDefectResponses(...defectIds);
+    notifyDefectEvents();
   },
-];
+});
 
-let defects = seedDefects();
+// События изменений дефектов для подписчиков /api/events (хвост журнала defect_events)
+const defectEvents = new DefectEventStream(db);
 
-const db = new sqlite3.Database('./database.db', (err) => {
-  if (err) {
-    console.error("Ошибка при подключении к базе данных", err.message);
-  } else {
-    console.log("Подключение к базе данных успешно");
-  }
+// Старые события журнала уходят в помесячные архивные файлы.
+// В кластере перенос выполняет основной процесс (server/cluster.js).
+const EVENT_ARCHIVE_DIR = process.env.EVENT_ARCHIVE_DIR || './archive/events';
+const eventArchiver = new EventArchiver(db, {
+  dir: EVENT_ARCHIVE_DIR,
+  retainDays: Number(process.env.EVENT_RETAIN_DAYS) || DEFAULT_RETAIN_DAYS,
 });
 
-const createUsersTable = () => {
-  const query = `
-    CREATE TABLE IF NOT EXISTS users (
-      id INTEGER PRIMARY KEY AUTOINCREMENT,
-      email TEXT UNIQUE NOT NULL,
-      password TEXT NOT NULL,
-      role TEXT NOT NULL
-    );
-  `;
-  db.run(query, (err) => {
+const startDefectEvents = () => {
+  defectEvents.start((err) => {
     if (err) {
-      console.error("Ошибка при создании таблицы:", err.message);
-    } else {
-      console.log("Таблица users создана");
+      console.error("Ошибка при чтении журнала событий:", err.message);
     }
   });
 };
 
-// Создание таблицы проектов
-const createProjectsTable = () => {
-  const query = `
-    CREATE TABLE IF NOT EXISTS projects (
-      id TEXT PRIMARY KEY,
-      name TEXT NOT NULL,
-      code TEXT NOT NULL,
-      location TEXT NOT NULL,
-      stages TEXT NOT NULL
-    );
-  `;
-  db.run(query, (err) => {
+// Проекты в памяти: список для /api/projects и проверка projectId без запросов к базе
+const projectCatalog = new ProjectCatalog(db);
+
+const loadProjectCatalog = (callback = () => {}) => {
+  projectCatalog.load((err) => {
     if (err) {
-      console.error("Ошибка при создании таблицы проектов:", err.message);
-    } else {
-      console.log("Таблица projects создана");
+      console.error("Ошибка при загрузке каталога проектов:", err.message);
     }
+    callback();
   });
 };
 
-// Создание таблицы дефектов
-const createDefectsTable = () => {
-  const query = `
-    CREATE TABLE IF NOT EXISTS defects (
-      id TEXT PRIMARY KEY,
-      projectId TEXT NOT NULL,
-      title TEXT NOT NULL,
-      description TEXT,
-      priority TEXT NOT NULL,
-      assigneeId TEXT,
-      reporterId TEXT NOT NULL,
-      status TEXT NOT NULL,
-      dueDate TEXT,
-      createdAt TEXT NOT NULL,
-      updatedAt TEXT NOT NULL,
-      attachments TEXT DEFAULT '[]',
-      history TEXT DEFAULT '[]',
-      comments TEXT DEFAULT '[]'
-    );
-  `;
-  db.run(query, (err) => {
+// Маршруты, которым нужен каталог, ждут его первой загрузки
+const projectsReady = (req, res, next) => {
+  projectCatalog.ready().then(() => next());
+};
+
+// Подписанные токены доступа
+const TOKEN_SECRET = resolveTokenSecret();
+const TOKEN_TTL_SECONDS = Number(process.env.AUTH_TOKEN_TTL) || 12 * 60 * 60;
+const revocations = new RevocationList(db);
+
+// Пул потоков для bcrypt, чтобы вход и регистрация не блокировали цикл событий
+const BCRYPT_ROUNDS = 10;
+const hashPool = new HashPool({
+  size: Number(process.env.HASH_POOL_SIZE) || undefined,
+  maxQueue: Number(process.env.HASH_POOL_QUEUE) || undefined,
+});
+
+// Ответ при ошибке пула: перегрузка — 503 с Retry-After, иначе 500
+const sendHashError = (res, err, message) => {
+  if (err.code === "HASH_POOL_SATURATED") {
+    res.setHeader("Retry-After", "1");
+    return res.status(503).json({ message: "Сервер перегружен, повторите попытку позже" });
+  }
+  res.status(500).json({ message });
+};
+
+// Сервер готов, когда слушает порт и база подготовлена (миграции, наполнение, каталог проектов).
+// Строку готовности с фактическим адресом ждут тесты: при PORT=0 порт выбирает система.
+let startupSteps = 2;
+const startupStepDone = () => {
+  if (--startupSteps === 0) {
+    console.log(`✅ Server ready on http://localhost:${server.address().port}`);
+  }
+};
+
+const loadRevocations = () => {
+  revocations.load((err, count) => {
     if (err) {
-      console.error("Ошибка при создании таблицы дефектов:", err.message);
+      console.error("Ошибка при загрузке отозванных токенов:", err.message);
     } else {
-      console.log("Таблица defects создана");
+      console.log(`Загружено отозванных токенов: ${count}`);
     }
   });
 };
 
-// Инициализация таблиц
-createUsersTable();
-createProjectsTable();
-createDefectsTable();
-
-// Добавление моковых данных проектов в базу данных
-const insertMockProjects = () => {
-  projects.forEach(project => {
-    const stagesJson = JSON.stringify(project.stages);
-    db.run(
-      "INSERT OR IGNORE INTO projects (id, name, code, location, stages) VALUES (?, ?, ?, ?, ?)",
-      [project.id, project.name, project.code, project.location, stagesJson],
-      (err) => {
-        if (err) {
-          console.error("Ошибка при добавлении проекта:", err.message);
-        }
-      }
-    );
-  });
-};
+// Включаем WAL, применяем миграции схемы и затем добавляем моковые данные.
+// Внешние ключи нужны для каскадного удаления истории, комментариев и вложений.
+// В кластере миграции и наполнение уже выполнил основной процесс (server/cluster.js).
+db.open((err) => {
+  if (err) {
+    console.error("Ошибка при подключении к базе данных", err.message);
+    process.exit(1);
+  }
+  console.log("Подключение к базе данных успешно");
 
-// Добавление моковых данных дефектов в базу данных
-const insertMockDefects = () => {
-  defects.forEach(defect => {
-    const attachmentsJson = JSON.stringify(defect.attachments || []);
-    const historyJson = JSON.stringify(defect.history || []);
-    const commentsJson = JSON.stringify(defect.comments || []);
-    
-    db.run(
-      "INSERT OR IGNORE INTO defects (id, projectId, title, description, priority, assigneeId, reporterId, status, dueDate, createdAt, updatedAt, attachments, history, comments) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
-      [
-        defect.id, defect.projectId, defect.title, defect.description, 
-        defect.priority, defect.assigneeId, defect.reporterId, defect.status, 
-        defect.dueDate, defect.createdAt, defect.updatedAt, 
-        attachmentsJson, historyJson, commentsJson
-      ],
-      (err) => {
-        if (err) {
-          console.error("Ошибка при добавлении дефекта:", err.message);
-        } else {
-          console.log(`Дефект ${defect.id} добавлен`);
-        }
-      }
-    );
-  });
-};
+  if (cluster.isWorker) {
+    loadProjectCatalog(startupStepDone);
+    previewQueue.start();
+    startDefectEvents();
+    return loadRevocations();
+  }
 
-// Добавление тестовых пользователей
-const insertTestUsers = () => {
-  const testUsers = [
-    { email: "admin@example.com", password: "admin123", role: "admin" },
-    { email: "manager@example.com", password: "manager123", role: "manager" },
-    { email: "engineer@example.com", password: "engineer123", role: "engineer" },
-    { email: "user@example.com", password: "user123", role: "user" },
-    { email: "observer@example.com", password: "observer123", role: "observer" },
-    // Дополнительные инженеры для тестирования
-    { email: "ivan.petrov@example.com", password: "engineer123", role: "engineer" },
-    { email: "anna.smirnova@example.com", password: "engineer123", role: "engineer" },
-    { email: "sergey.kuznetsov@example.com", password: "engineer123", role: "engineer" },
-    { email: "elena.volkova@example.com", password: "engineer123", role: "engineer" },
-    { email: "dmitry.kozlov@example.com", password: "engineer123", role: "engineer" },
-    // Дополнительные менеджеры
-    { email: "maria.ivanova@example.com", password: "manager123", role: "manager" },
-    { email: "alexey.sidorov@example.com", password: "manager123", role: "manager" },
-    // Дополнительные пользователи
-    { email: "olga.nikolaeva@example.com", password: "user123", role: "user" },
-    { email: "pavel.morozov@example.com", password: "user123", role: "user" }
-  ];
-
-  testUsers.forEach(user => {
-    bcrypt.hash(user.password, 10, (err, hashedPassword) => {
-      if (err) {
-        console.error("Ошибка при хэшировании пароля:", err);
-        return;
-      }
+  runMigrations(db.writer, (err, result) => {
+    if (err) {
+      console.error("Ошибка при миграции базы данных:", err.message);
+      process.exit(1);
+    }
 
-      db.run(
-        "INSERT OR IGNORE INTO users (email, password, role) VALUES (?, ?, ?)",
-        [user.email, hashedPassword, user.role],
-        (err) => {
-          if (err) {
-            console.error("Ошибка при добавлении тестового пользователя:", err.message);
-          } else {
-            console.log(`Тестовый пользователь ${user.email} добавлен`);
-          }
-        }
-      );
-    });
+    console.log(`Версия схемы базы данных: ${result.version}`);
+    loadRevocations();
+    previewQueue.start();
+    startDefectEvents();
+    eventArchiver.start();
+    seedDatabase(db, { hashPool, rounds: BCRYPT_ROUNDS }).then(() => loadProjectCatalog(startupStepDone));
   });
-};
-
-// Добавляем моковые данные
-setTimeout(() => {
-  insertMockProjects();
-  insertMockDefects();
-  insertTestUsers();
-}, 1000);
+});
 
 // Создание Express приложения
 const __filename = fileURLToPath(import.meta.url);
@@ -262,28 +193,113 @@ const __dirname = path.dirname(__filename);
 const app = express();
 
 // Middleware
+app.use(createRequestMetrics(metrics));
 app.use(cors());
 app.use(express.json());
 app.use(express.urlencoded({ extended: true }));
 
-// Middleware для установки пользователя в req.user
-app.use((req, res, next) => {
-  const authHeader = req.headers.authorization;
-  
-  if (authHeader) {
-    const token = authHeader.replace('Bearer ', '');
-    db.get("SELECT * FROM users WHERE id = ?", [token], (err, user) => {
-      req.user = user || null;
-      next();
-    });
-  } else {
-    req.user = null;
-    next();
-  }
+// Serve static files from dist/spa (статике пользователь не нужен)
+app.use(express.static(path.join(__dirname, '../dist/spa')));
+
+// Кэш сессий: проверенный токен -> пользователь
+const sessionCache = new SessionCache({
+  max: Number(process.env.SESSION_CACHE_MAX) || 10_000,
+  ttlMs: Number(process.env.SESSION_CACHE_TTL_MS) || 60_000,
 });
 
-// Serve static files from dist/spa
-app.use(express.static(path.join(__dirname, '../dist/spa')));
+// Кэш готовых ответов маршрутов чтения (проекты, инженеры, карточки дефектов, статистика)
+const responseCache = new ResponseCache({
+  max: Number(process.env.RESPONSE_CACHE_MAX) || 5000,
+});
+
+// Попадания в кэши сессий, ответов и подготовленных запросов всех соединений
+metrics.addCollector(() => {
+  const { writer, readers } = db.stats();
+  const statementCaches = [writer, ...readers].map((connection) => connection.statements);
+  const total = (key) => statementCaches.reduce((sum, stats) => sum + stats[key], 0);
+  const lookups = total("hits") + total("misses");
+
+  return cacheMetrics({
+    sessions: sessionCache.stats(),
+    responses: responseCache.stats(),
+    statements: {
+      size: total("size"),
+      hits: total("hits"),
+      misses: total("misses"),
+      evictions: total("evictions"),
+      hitRatio: lookups > 0 ? total("hits") / lookups : 0,
+    },
+  });
+});
+
+// Удаляет затронутые ответы из кэша этого и остальных процессов кластера.
+// Корректность обеспечивает версия в ETag; удаление освобождает память сразу.
+const invalidateResponses = (...tags) => {
+  for (const tag of tags) {
+    responseCache.invalidate(tag);
+  }
+  publishInvalidation({ type: "responses", tags });
+};
+
+// Изменение дефекта затрагивает его карточку и статистику
+const invalidateDefectResponses = (...ids) => {
+  invalidateResponses("stats", ...ids.map((id) => `defect:${id}`));
+};
+
+// События записаны в журнал вместе с изменением; поток этого и остальных процессов
+// кластера дочитывает их из журнала
+const notifyDefectEvents = () => {
+  defectEvents.notify();
+  publishInvalidation({ type: "defectEvents" });
+};
+
+// Middleware для установки пользователя в req.user по подписанному токену
+app.use(createAuthenticate({
+  sessionCache,
+  revocations,
+  queryTokenPaths: ["/api/events"],
+  verifyToken: (token) => verifyToken(token, { secret: TOKEN_SECRET }),
+}));
+
+// Выдача подписанного токена для пользователя
+const issueToken = (user) => {
+  const { token, payload } = signToken(user, { secret: TOKEN_SECRET, ttlSeconds: TOKEN_TTL_SECONDS });
+  return { token, expiresAt: new Date(payload.exp * 1000).toISOString() };
+};
+
+// Отзыв всех токенов пользователя (смена роли, удаление)
+const revokeUserSessions = (userId) => {
+  const revocation = revocations.revokeUser(userId, TOKEN_TTL_SECONDS);
+  sessionCache.invalidateUser(userId);
+  publishInvalidation({ type: "revokeUser", userId, revocation });
+};
+
+// Отзывы и инвалидация кэша ответов из других процессов кластера
+onInvalidation((event) => {
+  if (event.type === "projects") {
+    return loadProjectCatalog();
+  }
+
+  if (event.type === "defectEvents") {
+    return defectEvents.notify();
+  }
+
+  if (event.type === "responses") {
+    for (const tag of event.tags) {
+      responseCache.invalidate(tag);
+    }
+    return;
+  }
+
+  const { id, revokedAt, expiresAt } = event.revocation;
+  revocations.remember(id, revokedAt, expiresAt);
+
+  if (event.type === "revokeUser") {
+    sessionCache.invalidateUser(event.userId);
+  } else if (event.type === "revokeToken") {
+    sessionCache.invalidateToken(event.token);
+  }
+});
 
 // User registration
 app.post("/api/register", (req, res) => {
@@ -305,12 +321,8 @@ app.post("/api/register", (req, res) => {
       return res.status(409).json({ message: "Пользователь с таким email уже существует" });
     }
 
-    // Хэширование пароля
-    bcrypt.hash(password, 10, (err, hashedPassword) => {
-      if (err) {
-        return res.status(500).json({ message: "Ошибка при хэшировании пароля" });
-      }
-
+    // Хэширование пароля в пуле потоков
+    hashPool.hash(password, BCRYPT_ROUNDS).then((hashedPassword) => {
       // Создание нового пользователя (без имени и createdAt)
       const newUser = {
         email,
@@ -329,9 +341,10 @@ app.post("/api/register", (req, res) => {
 
           // Возвращаем успешный ответ с данными пользователя (без пароля)
           const { password, ...userWithoutPassword } = newUser;
+          invalidateResponses("users");
           res.status(201).json({ message: "Пользователь успешно зарегистрирован", user: userWithoutPassword });
         });
-    });
+    }).catch((err) => sendHashError(res, err, "Ошибка при хэшировании пароля"));
   });
 });
 
@@ -354,288 +367,251 @@ app.post("/api/login", (req, res) => {
       return res.status(401).json({ message: "Неверный email или пароль" });
     }
 
-    // Проверка пароля
-    bcrypt.compare(password, user.password, (err, result) => {
-      if (err) {
-        return res.status(500).json({ message: "Ошибка при проверке пароля" });
-      }
-
+    // Проверка пароля в пуле потоков
+    hashPool.compare(password, user.password).then((result) => {
       if (!result) {
         return res.status(401).json({ message: "Неверный email или пароль" });
       }
 
-      // Возвращаем пользователя (без пароля)
+      // Возвращаем пользователя (без пароля) и подписанный токен
       const { password, ...userWithoutPassword } = user;
-      res.json({ message: "Успешный вход", user: userWithoutPassword });
-    });
+      res.json({ message: "Успешный вход", user: userWithoutPassword, ...issueToken(userWithoutPassword) });
+    }).catch((err) => sendHashError(res, err, "Ошибка при проверке пароля"));
   });
 });
 
+// Обновление токена: текущий токен отзывается, выдается новый
+app.post("/api/token/refresh", requireAuth, (req, res) => {
+  const revocation = revocations.revokeToken(req.session.payload);
+  sessionCache.invalidateToken(req.session.token);
+  publishInvalidation({ type: "revokeToken", token: req.session.token, revocation });
+
+  res.json({ user: req.user, ...issueToken(req.user) });
+});
+
+// Выход: отзыв текущего токена
+app.post("/api/logout", requireAuth, (req, res) => {
+  const revocation = revocations.revokeToken(req.session.payload);
+  sessionCache.invalidateToken(req.session.token);
+  publishInvalidation({ type: "revokeToken", token: req.session.token, revocation });
+
+  res.status(204).end();
+});
+
 // Get current user (for authorization check)
 app.get("/api/me", (req, res) => {
-  const authHeader = req.headers.authorization;
-
-  if (!authHeader) {
+  if (!req.user) {
     return res.status(401).json({ message: "Не авторизован" });
   }
 
-  const token = authHeader.replace('Bearer ', '');
-  db.get("SELECT * FROM users WHERE id = ?", [token], (err, user) => {
-    if (err || !user) {
-      return res.status(401).json({ message: "Не авторизован" });
-    }
-
-    const { password, ...userWithoutPassword } = user;
-    res.json({ user: userWithoutPassword });
-  });
+  res.json({ user: req.user });
 });
 
 // Projects data - доступно всем авторизованным пользователям
-app.get("/api/projects", requireAuth, (req, res) => {
-  db.all("SELECT * FROM projects", (err, rows) => {
-    if (err) {
-      return res.status(500).json({ message: "Ошибка при получении проектов" });
-    }
-    
-    // Парсим stages из JSON
-    const projectsWithStages = rows.map(project => ({
-      ...project,
-      stages: JSON.parse(project.stages)
-    }));
-    
-    res.json(projectsWithStages);
-  });
-});
-
-// Статистика дефектов - доступно всем авторизованным пользователям
-app.get("/api/defects/stats", requireAuth, (req, res) => {
-  console.log("Запрос статистики от пользователя:", req.user?.email);
-  
-  db.all("SELECT status, priority, createdAt FROM defects", (err, rows) => {
-    if (err) {
-      console.error("Ошибка при получении статистики:", err);
-      return res.status(500).json({ message: "Ошибка при получении статистики" });
-    }
-
-    console.log("Найдено дефектов для статистики:", rows.length);
+// Список отдается готовым буфером из каталога; ETag — версия таблицы projects
+app.get("/api/projects", requireAuth, projectsReady, (req, res) => {
+  res.setHeader("ETag", projectCatalog.etag);
+  res.setHeader("Cache-Control", "private, max-age=60");
 
-    const byStatus = { new: 0, in_progress: 0, in_review: 0, closed: 0, cancelled: 0 };
-    const byPriority = { low: 0, medium: 0, high: 0, critical: 0 };
-    const countsMonthly = new Map();
-
-    rows.forEach(d => {
-      byStatus[d.status] = (byStatus[d.status] ?? 0) + 1;
-      byPriority[d.priority] = (byPriority[d.priority] ?? 0) + 1;
-      const month = d.createdAt.slice(0, 7);
-      countsMonthly.set(month, (countsMonthly.get(month) ?? 0) + 1);
-    });
-
-    const months = Array.from(countsMonthly.entries())
-      .sort(([a], [b]) => (a > b ? 1 : -1))
-      .map(([month, count]) => ({ month, count }));
+  if (matchesEtag(req.headers["if-none-match"], projectCatalog.etag)) {
+    return res.status(304).end();
+  }
 
-    const stats = { byStatus, byPriority, monthlyCreated: months };
-    console.log("Отправляем статистику:", stats);
-    res.json(stats);
-  });
+  res.setHeader("Content-Type", "application/json; charset=utf-8");
+  res.send(projectCatalog.body);
 });
 
-// Экспорт дефектов в CSV - только менеджеры и выше
-app.get("/api/defects/export", requireManager, (req, res) => {
-  const cols = ["id", "projectId", "title", "description", "priority", "assigneeId", "reporterId", "status", "dueDate", "createdAt", "updatedAt"];
-  const lines = [cols.join(",")];
+// Создание проекта - менеджеры и выше
+app.post("/api/projects", requireManager, projectsReady, (req, res) => {
+  const error = validateProjectInput(req.body);
+  if (error) {
+    return res.status(400).json({ message: error });
+  }
+  if (req.body.id && projectCatalog.has(req.body.id)) {
+    return res.status(409).json({ message: "Проект с таким id уже существует" });
+  }
 
-  db.all("SELECT * FROM defects", (err, defects) => {
+  projectCatalog.create(req.body, (err, project) => {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при экспорте дефектов" });
-    }
-
-    for (const d of defects) {
-      const row = cols.map((c) => escapeCsv(d[c] ?? ""));
-      lines.push(row.join(","));
+      console.error("Ошибка при создании проекта:", err.message);
+      return res.status(500).json({ message: "Ошибка при создании проекта" });
     }
 
-    const csv = lines.join("\n");
-    res.setHeader("Content-Type", "text/csv; charset=utf-8");
-    res.setHeader("Content-Disposition", `attachment; filename=defects.csv`);
-    res.send(csv);
+    publishInvalidation({ type: "projects" });
+    res.status(201).json(project);
   });
 });
 
-// Defects data - доступно всем авторизованным пользователям
-app.get("/api/defects/:id", requireAuth, (req, res) => {
-  const { id } = req.params;
-  
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
+// Изменение проекта - менеджеры и выше
+app.patch("/api/projects/:id", requireManager, projectsReady, (req, res) => {
+  const error = validateProjectInput(req.body, { partial: true });
+  if (error) {
+    return res.status(400).json({ message: error });
+  }
+
+  projectCatalog.update(req.params.id, req.body, (err, project) => {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
+      console.error("Ошибка при изменении проекта:", err.message);
+      return res.status(500).json({ message: "Ошибка при изменении проекта" });
     }
-    
-    if (!defect) {
-      return res.status(404).json({ message: "Defect not found" });
+    if (!project) {
+      return res.status(404).json({ message: "Проект не найден" });
     }
-    
-    // Парсим JSON поля
-    defect.attachments = JSON.parse(defect.attachments || '[]');
-    defect.history = JSON.parse(defect.history || '[]');
-    defect.comments = JSON.parse(defect.comments || '[]');
-    
-    res.json(defect);
+
+    publishInvalidation({ type: "projects" });
+    res.json(project);
   });
 });
 
-// Создание дефекта - только инженеры и выше
-app.post("/api/defects", requireEngineer, (req, res) => {
-  const { projectId, title, description, priority, assigneeId, dueDate } = req.body;
+// Статистика дефектов - доступно всем авторизованным пользователям
+// Статистика читается из счетчиков defect_counters (поддерживаются триггерами).
+// ETag привязан к версии счетчиков: пока дефекты не менялись, клиент получает 304.
+app.get("/api/defects/stats", requireAuth, cachedJson(responseCache, {
+  tag: "stats",
+  cacheControl: "private, no-cache",
+  readVersion: (req, callback) => readStatsVersion(db, callback),
+  load: (req, callback) => {
+    const projectId = typeof req.query.projectId === "string" ? req.query.projectId : "";
+    readDefectStats(db, projectId, callback);
+  },
+  errorMessage: "Ошибка при получении статистики",
+}));
 
-  // Валидация обязательных полей
-  if (!title || !projectId || !priority) {
-    return res.status(400).json({ message: "title, projectId и priority обязательны" });
-  }
+// Экспорт дефектов в CSV - только менеджеры и выше.
+// Принимает те же фильтры, что и /api/defects; ответ сжимается gzip, если клиент его поддерживает.
+app.get("/api/defects/export", requireManager, createCsvExportHandler(db));
 
-  const now = isoNow(); // Получаем текущее время
-  const def = {
-    id: newId("d"), // Генерация нового ID дефекта
-    projectId,
-    title,
-    description,
-    priority,
-    assigneeId,
-    reporterId: "u1", // Здесь можно использовать ID текущего пользователя
-    status: "new",
-    dueDate,
-    createdAt: now,
-    updatedAt: now,
-    attachments: [], // Вы можете добавить обработку вложений
-    history: [],
-    comments: [],
-  };
+// Defects data - доступно всем авторизованным пользователям
+// Версия карточки — defects.version: ее увеличивает триггер (миграция 12) при любом изменении строки,
+// в том числе при обновлении updatedAt из-за комментариев и вложений
+app.get("/api/defects/:id", requireAuth, cachedJson(responseCache, {
+  tag: (req) => `defect:${req.params.id}`,
+  cacheControl: "private, no-cache",
+  readVersion: (req, callback) => {
+    db.get("SELECT version FROM defects WHERE id = ?", [req.params.id], (err, row) => {
+      if (err) return callback(err);
+      callback(null, row ? row.version : null);
+    });
+  },
+  load: (req, callback) => {
+    const { id } = req.params;
 
-  // Сохраняем дефект в базу данных
-  const query = `
-    INSERT INTO defects (id, projectId, title, description, priority, assigneeId, reporterId, status, dueDate, createdAt, updatedAt, attachments, history, comments)
-    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-  `;
-
-  const attachmentsJson = JSON.stringify(def.attachments || []);
-  const historyJson = JSON.stringify(def.history || []);
-  const commentsJson = JSON.stringify(def.comments || []);
-
-  db.run(
-    query,
-    [
-      def.id,
-      def.projectId,
-      def.title,
-      def.description,
-      def.priority,
-      def.assigneeId,
-      def.reporterId,
-      def.status,
-      def.dueDate,
-      def.createdAt,
-      def.updatedAt,
-      attachmentsJson,
-      historyJson,
-      commentsJson
-    ],
-    function (err) {
-      if (err) {
-        console.error("Ошибка при добавлении дефекта:", err.message);
-        return res.status(500).json({ message: "Ошибка при добавлении дефекта" });
-      }
+    db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
+      if (err) return callback(err);
+      if (!defect) return callback(null, null);
+
+      loadDefectRelations(db, id, (err, relations) => {
+        if (err) return callback(err);
+        callback(null, { ...defect, ...relations });
+      });
+    });
+  },
+  notFoundMessage: "Defect not found",
+  errorMessage: "Ошибка при получении дефекта",
+}));
 
-      res.status(201).json(def); // Ответ с созданным дефектом
+// Создание дефекта - только инженеры и выше
+app.post("/api/defects", requireEngineer, projectsReady, (req, res) => {
+  const error = validateDefectInput(req.body, { projects: projectCatalog });
+  if (error) {
+    return res.status(400).json({ message: error });
+  }
+
+  // Здесь можно использовать ID текущего пользователя
+  const def = buildNewDefect(req.body, { reporterId: "u1" });
+
+  // Сохраняем дефект в базу данных вместе с записью в журнал событий
+  db.transaction(async (tx) => {
+    await tx.run(INSERT_DEFECT_SQL, defectParams(def));
+    await recordDefectEvent(tx, {
+      type: "created",
+      defectId: def.id,
+      projectId: def.projectId,
+      actor: req.user.email,
+      at: def.createdAt,
+      data: { defect: def },
+    });
+  }, (err) => {
+    if (err) {
+      console.error("Ошибка при добавлении дефекта:", err.message);
+      return res.status(500).json({ message: "Ошибка при добавлении дефекта" });
     }
-  );
+
+    invalidateResponses("stats");
+    notifyDefectEvents();
+    res.status(201).json({ ...def, attachments: [], history: [], comments: [] }); // Ответ с созданным дефектом
+  });
 });
 
+// Пакетный импорт дефектов (NDJSON или CSV потоком) - только менеджеры и выше
+app.post("/api/defects/bulk", requireManager, projectsReady, createDefectImportHandler(db, {
+  projects: projectCatalog,
+  onChange: () => {
+    invalidateResponses("stats");
+    notifyDefectEvents();
+  },
+}));
+
+// Пакетная смена статуса и исполнителя - инженеры и выше.
+// Регистрируются до /api/defects/:id/..., иначе "bulk" будет принят за id.
+app.patch("/api/defects/bulk/status", requireEngineer, createBulkStatusHandler(db, {
+  onChange: (ids) => {
+    invalidateDefectResponses(...ids);
+    notifyDefectEvents();
+  },
+}));
+app.patch("/api/defects/bulk/assignee", requireEngineer, createBulkAssigneeHandler(db, {
+  onChange: (ids) => {
+    invalidateDefectResponses(...ids);
+    notifyDefectEvents();
+  },
+}));
+
 // Получение списка дефектов - доступно всем авторизованным пользователям
 app.get("/api/defects", requireAuth, (req, res) => {
-  const { q, status, priority, projectId, assigneeId, sort = "createdAt", order = "desc", page = "1", pageSize = "20" } = req.query;
-
-  let query = "SELECT * FROM defects WHERE 1=1";
-  const params = [];
+  const listQuery = buildDefectListQuery(req.query);
 
-  if (q) {
-    query += " AND (title LIKE ? OR description LIKE ?)";
-    params.push(`%${q}%`, `%${q}%`);
-  }
-  if (status) {
-    query += " AND status = ?";
-    params.push(status);
-  }
-  if (priority) {
-    query += " AND priority = ?";
-    params.push(priority);
-  }
-  if (projectId) {
-    query += " AND projectId = ?";
-    params.push(projectId);
-  }
-  if (assigneeId) {
-    query += " AND assigneeId = ?";
-    params.push(assigneeId);
+  if (listQuery.error) {
+    return res.status(400).json({ message: listQuery.error });
   }
 
-  // Добавляем сортировку
-  const validSortFields = ["createdAt", "title", "priority", "status", "dueDate"];
-  const sortField = validSortFields.includes(sort) ? sort : "createdAt";
-  const sortOrder = order === "asc" ? "ASC" : "DESC";
-  query += ` ORDER BY ${sortField} ${sortOrder}`;
+  const { sql, params, countSql, countParams, sortField, sortOrder, page, pageSize, cursorMode } = listQuery;
 
-  // Добавляем пагинацию
-  const p = Number(page) || 1;
-  const ps = Number(pageSize) || 20;
-  const offset = (p - 1) * ps;
-  query += ` LIMIT ${ps} OFFSET ${offset}`;
-
-  db.all(query, params, (err, rows) => {
+  db.all(sql, params, (err, rows) => {
     if (err) {
       return res.status(500).json({ message: "Ошибка при получении дефектов" });
     }
 
-    // Получаем общее количество для пагинации
-    let countQuery = "SELECT COUNT(*) as total FROM defects WHERE 1=1";
-    const countParams = [];
-    
-    if (q) {
-      countQuery += " AND (title LIKE ? OR description LIKE ?)";
-      countParams.push(`%${q}%`, `%${q}%`);
-    }
-    if (status) {
-      countQuery += " AND status = ?";
-      countParams.push(status);
-    }
-    if (priority) {
-      countQuery += " AND priority = ?";
-      countParams.push(priority);
-    }
-    if (projectId) {
-      countQuery += " AND projectId = ?";
-      countParams.push(projectId);
-    }
-    if (assigneeId) {
-      countQuery += " AND assigneeId = ?";
-      countParams.push(assigneeId);
+    const hasMore = rows.length > pageSize;
+    const items = hasMore ? rows.slice(0, pageSize) : rows;
+    const nextCursor = hasMore ? encodeCursor(items[items.length - 1], sortField, sortOrder) : null;
+
+    const response = cursorMode
+      ? { items, nextCursor, pageSize }
+      : { items, page, pageSize, nextCursor };
+
+    // Подсчет общего количества можно отключить: includeTotal=false
+    if (req.query.includeTotal === "false") {
+      return res.json(response);
     }
 
-    db.get(countQuery, countParams, (err, countResult) => {
+    db.get(countSql, countParams, (err, countResult) => {
       if (err) {
         return res.status(500).json({ message: "Ошибка при подсчете дефектов" });
       }
 
-          const response = {
-            items: rows,
-            total: countResult.total,
-            page: p,
-            pageSize: ps
-          };
-          res.json(response);
+      response.total = countResult.total;
+      res.json(response);
     });
   });
 });
 
+// Поток изменений дефектов (SSE) - доступно всем авторизованным пользователям
+app.get("/api/events", requireAuth, createEventStreamHandler(defectEvents, {
+  isSessionValid: (session) =>
+    Boolean(session) && session.payload.exp * 1000 > Date.now() && !revocations.isRevoked(session.payload),
+}));
+
 // Получение списка пользователей - только администраторы
 app.get("/api/users", requireAdmin, (req, res) => {
   db.all("SELECT id, email, role FROM users", (err, users) => {
@@ -646,39 +622,155 @@ app.get("/api/users", requireAdmin, (req, res) => {
   });
 });
 
-// Получение списка инженеров для выбора исполнителей - доступно всем авторизованным пользователям
-app.get("/api/users/engineers", requireAuth, (req, res) => {
-  db.all("SELECT id, email, role FROM users WHERE role IN ('engineer', 'manager', 'admin')", (err, users) => {
+// Изменение роли пользователя - только администраторы
+app.patch("/api/users/:id/role", requireAdmin, (req, res) => {
+  const { id } = req.params;
+  const { role } = req.body;
+
+  if (!VALID_ROLES.includes(role)) {
+    return res.status(400).json({ message: "Недопустимая роль" });
+  }
+
+  db.run("UPDATE users SET role = ? WHERE id = ?", [role, id], function(err) {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при получении инженеров" });
+      return res.status(500).json({ message: "Ошибка при изменении роли" });
     }
-    
-    // Форматируем данные для удобства использования
-    const engineers = users.map(user => ({
-      id: user.id,
-      name: user.email.split('@')[0], // Используем часть email как имя
-      email: user.email,
-      role: user.role
-    }));
-    
-    res.json(engineers);
+
+    if (this.changes === 0) {
+      return res.status(404).json({ message: "Пользователь не найден" });
+    }
+
+    revokeUserSessions(id);
+    invalidateResponses("users");
+    res.json({ message: "Роль изменена", user: { id: Number(id), role } });
   });
 });
 
-// Обновление дефекта - только инженеры и выше
-app.patch("/api/defects/:id", requireEngineer, (req, res) => {
+// Удаление пользователя - только администраторы
+app.delete("/api/users/:id", requireAdmin, (req, res) => {
   const { id } = req.params;
-  const { projectId, title, description, priority, assigneeId, dueDate, status } = req.body;
 
-  // Получаем текущий дефект
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
+  db.run("DELETE FROM users WHERE id = ?", [id], function(err) {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
+      return res.status(500).json({ message: "Ошибка при удалении пользователя" });
     }
 
-    if (!defect) {
-      return res.status(404).json({ message: "Дефект не найден" });
+    if (this.changes === 0) {
+      return res.status(404).json({ message: "Пользователь не найден" });
+    }
+
+    revokeUserSessions(id);
+    invalidateResponses("users");
+    res.status(204).end();
+  });
+});
+
+// Состояние пула хэширования и гистограммы задержек - только администраторы
+app.get("/api/admin/hash-pool", requireAdmin, (req, res) => {
+  res.json(hashPool.stats());
+});
+
+// Состояние очереди превью - только администраторы
+app.get("/api/admin/preview-queue", requireAdmin, (req, res) => {
+  countPreviewJobs(db, (err, jobs) => {
+    if (err) {
+      return res.status(500).json({ message: "Ошибка при получении очереди превью" });
     }
+    res.json({ ...previewQueue.stats(), jobs });
+  });
+});
+
+// Статистика кэшей - только администраторы
+app.get("/api/admin/cache-stats", requireAdmin, (req, res) => {
+  res.json({
+    sessions: sessionCache.stats(),
+    responses: responseCache.stats(),
+    database: db.stats(),
+    events: defectEvents.stats(),
+  });
+});
+
+// Метрики для Prometheus - сборщик с METRICS_TOKEN или администраторы.
+// В кластере ответ объединяет метрики всех рабочих процессов.
+app.get("/metrics", requireMetricsAccess(process.env.METRICS_TOKEN), (req, res) => {
+  collectClusterMetrics(metrics, (err, snapshots) => {
+    if (err) {
+      return res.status(503).json({ message: "Метрики временно недоступны" });
+    }
+    res.set("Content-Type", "text/plain; version=0.0.4; charset=utf-8");
+    res.send(renderMetrics(snapshots));
+  });
+});
+
+// Самые дорогие формы запросов этого процесса - только администраторы.
+// explain=1 строит планы и для запросов, не превысивших порог.
+app.get("/api/admin/slow-queries", requireAdmin, (req, res) => {
+  if (!queryProfiler) {
+    return res.status(404).json({ message: "Профилировщик запросов выключен (задайте SLOW_QUERY_MS)" });
+  }
+
+  const limit = req.query.limit === undefined ? undefined : Number(req.query.limit);
+  if (limit !== undefined && (!Number.isInteger(limit) || limit < 1)) {
+    return res.status(400).json({ message: "limit должен быть положительным целым числом" });
+  }
+
+  if (req.query.explain !== "1") {
+    return res.json(queryProfiler.stats(limit));
+  }
+  queryProfiler.explainTop(limit, () => res.json(queryProfiler.stats(limit)));
+});
+
+// Сброс таблицы профилировщика - только администраторы
+app.delete("/api/admin/slow-queries", requireAdmin, (req, res) => {
+  if (!queryProfiler) {
+    return res.status(404).json({ message: "Профилировщик запросов выключен (задайте SLOW_QUERY_MS)" });
+  }
+  queryProfiler.reset();
+  res.status(204).end();
+});
+
+// Журнал изменений дефектов для отчетов - только администраторы
+app.get("/api/admin/defect-events", requireAdmin, createEventLogHandler(db));
+app.get("/api/admin/defect-events/export", requireAdmin, createEventLogExportHandler(db, { archiveDir: EVENT_ARCHIVE_DIR }));
+app.get("/api/admin/defect-events/segments", requireAdmin, createEventSegmentsHandler(db));
+
+// Получение списка инженеров для выбора исполнителей - доступно всем авторизованным пользователям
+app.get("/api/users/engineers", requireAuth, cachedJson(responseCache, {
+  tag: "users",
+  cacheControl: "private, max-age=60",
+  readVersion: (req, callback) => readCacheVersion(db, "users", callback),
+  load: (req, callback) => {
+    db.all("SELECT id, email, role FROM users WHERE role IN ('engineer', 'manager', 'admin')", (err, users) => {
+      if (err) return callback(err);
+
+      // Форматируем данные для удобства использования
+      callback(null, users.map(user => ({
+        id: user.id,
+        name: user.email.split('@')[0], // Используем часть email как имя
+        email: user.email,
+        role: user.role
+      })));
+    });
+  },
+  errorMessage: "Ошибка при получении инженеров",
+}));
+
+// Обновление дефекта - только инженеры и выше
+app.patch("/api/defects/:id", requireEngineer, projectsReady, (req, res) => {
+  const { id } = req.params;
+  const { projectId, title, description, priority, assigneeId, dueDate, status } = req.body;
+
+  if (projectId !== undefined && !projectCatalog.has(projectId)) {
+    return res.status(400).json({ message: `Проект не найден: ${projectId}` });
+  }
+
+  const fields = ["projectId", "title", "description", "priority", "assigneeId", "dueDate", "status"]
+    .filter((field) => req.body[field] !== undefined);
+
+  // Изменение и запись в журнал (новые и прежние значения полей) — одной транзакцией
+  db.transaction(async (tx) => {
+    const defect = await tx.get("SELECT * FROM defects WHERE id = ?", [id]);
+    if (!defect) return null;
 
     // Обновляем дефект
     const updateFields = [];
@@ -713,30 +805,43 @@ app.patch("/api/defects/:id", requireEngineer, (req, res) => {
       values.push(status);
     }
 
+    const timestamp = new Date().toISOString();
     updateFields.push("updatedAt = ?");
-    values.push(new Date().toISOString());
+    values.push(timestamp);
     values.push(id);
 
-    const query = `UPDATE defects SET ${updateFields.join(", ")} WHERE id = ?`;
+    await tx.run(`UPDATE defects SET ${updateFields.join(", ")} WHERE id = ?`, values);
+
+    const updatedDefect = await tx.get("SELECT * FROM defects WHERE id = ?", [id]);
+    await recordDefectEvent(tx, {
+      type: "updated",
+      defectId: id,
+      projectId: updatedDefect.projectId,
+      actor: req.user.email,
+      at: timestamp,
+      data: {
+        changes: Object.fromEntries(fields.map((field) => [field, updatedDefect[field]])),
+        previous: Object.fromEntries(fields.map((field) => [field, defect[field]])),
+      },
+    });
+    return updatedDefect;
+  }, (err, updatedDefect) => {
+    if (err) {
+      return res.status(500).json({ message: "Ошибка при обновлении дефекта" });
+    }
 
-    db.run(query, values, function(err) {
+    if (!updatedDefect) {
+      return res.status(404).json({ message: "Дефект не найден" });
+    }
+
+    loadDefectRelations(db, id, (err, relations) => {
       if (err) {
-        return res.status(500).json({ message: "Ошибка при обновлении дефекта" });
+        return res.status(500).json({ message: "Ошибка при получении обновленного дефекта" });
       }
 
-      // Получаем обновленный дефект
-      db.get("SELECT * FROM defects WHERE id = ?", [id], (err, updatedDefect) => {
-        if (err) {
-          return res.status(500).json({ message: "Ошибка при получении обновленного дефекта" });
-        }
-
-        // Парсим JSON поля
-        updatedDefect.attachments = JSON.parse(updatedDefect.attachments || '[]');
-        updatedDefect.history = JSON.parse(updatedDefect.history || '[]');
-        updatedDefect.comments = JSON.parse(updatedDefect.comments || '[]');
-
-        res.json(updatedDefect);
-      });
+      invalidateDefectResponses(id);
+      notifyDefectEvents();
+      res.json({ ...updatedDefect, ...relations });
     });
   });
 });
@@ -745,15 +850,17 @@ app.patch("/api/defects/:id", requireEngineer, (req, res) => {
 app.delete("/api/defects/:id", requireManager, (req, res) => {
   const { id } = req.params;
   
-  db.run("DELETE FROM defects WHERE id = ?", [id], function(err) {
+  deleteDefect(db, id, req.user.email, (sha256) => fileStore.remove(sha256), (err, deleted) => {
     if (err) {
       return res.status(500).json({ message: "Ошибка при удалении дефекта" });
     }
     
-    if (this.changes === 0) {
+    if (!deleted) {
       return res.status(404).json({ message: "Дефект не найден" });
     }
     
+    invalidateDefectResponses(id);
+    notifyDefectEvents();
     res.status(204).end();
   });
 });
@@ -764,49 +871,34 @@ app.patch("/api/defects/:id/status", requireAuth, requireEngineer, (req, res) =>
   const { id } = req.params;
   const { status, reason } = req.body;
 
-  if (!status) {
-    return res.status(400).json({ message: "Статус обязателен" });
+  const error = validateStatusChange(req.body);
+  if (error) {
+    return res.status(400).json({ message: error });
   }
 
-  const validStatuses = ['new', 'in_progress', 'in_review', 'closed', 'cancelled'];
-  if (!validStatuses.includes(status)) {
-    return res.status(400).json({ message: "Недопустимый статус" });
-  }
+  const timestamp = new Date().toISOString();
 
-  // Получаем текущий дефект
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
+  // Запись истории
+  const entry = {
+    action: `Статус изменен на "${status}"`,
+    timestamp,
+    changes: { status: status },
+    reason: reason,
+    changedBy: req.user.email
+  };
+
+  changeDefectStatus(db, id, status, entry, (err, found) => {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
+      return res.status(500).json({ message: "Ошибка при обновлении статуса" });
     }
 
-    if (!defect) {
+    if (!found) {
       return res.status(404).json({ message: "Дефект не найден" });
     }
 
-    // Парсим историю
-    const history = JSON.parse(defect.history || '[]');
-    
-    // Добавляем новую запись в историю
-    history.push({
-      action: `Статус изменен на "${status}"`,
-      timestamp: new Date().toISOString(),
-      changes: { status: status },
-      reason: reason,
-      changedBy: req.user.email
-    });
-
-    // Обновляем дефект
-    db.run(
-      "UPDATE defects SET status = ?, history = ?, updatedAt = ? WHERE id = ?",
-      [status, JSON.stringify(history), new Date().toISOString(), id],
-      function(err) {
-        if (err) {
-          return res.status(500).json({ message: "Ошибка при обновлении статуса" });
-        }
-
-        res.json({ message: "Статус обновлен", status });
-      }
-    );
+    invalidateDefectResponses(id);
+    notifyDefectEvents();
+    res.json({ message: "Статус обновлен", status });
   });
 });
 
@@ -819,128 +911,55 @@ app.post("/api/defects/:id/comments", requireAuth, (req, res) => {
     return res.status(400).json({ message: "Сообщение обязательно" });
   }
 
-  // Получаем текущий дефект
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
-    if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
-    }
-
-    if (!defect) {
-      return res.status(404).json({ message: "Дефект не найден" });
-    }
-
-    // Парсим комментарии
-    const comments = JSON.parse(defect.comments || '[]');
-    
-    // Добавляем новый комментарий
-    const newComment = {
-      id: `comment_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`,
-      message: message.trim(),
-      authorId: req.user.id,
-      authorName: req.user.name,
-      createdAt: new Date().toISOString()
-    };
-
-    comments.push(newComment);
-
-    // Обновляем дефект
-    db.run(
-      "UPDATE defects SET comments = ?, updatedAt = ? WHERE id = ?",
-      [JSON.stringify(comments), new Date().toISOString(), id],
-      function(err) {
-        if (err) {
-          return res.status(500).json({ message: "Ошибка при добавлении комментария" });
-        }
-
-        res.json({ message: "Комментарий добавлен", comment: newComment });
-      }
-    );
-  });
-});
-
-// Добавление вложения к дефекту
-app.post("/api/defects/:id/attachments", requireAuth, requireEngineer, (req, res) => {
-  const { id } = req.params;
+  const newComment = {
+    id: `comment_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`,
+    message: message.trim(),
+    authorId: req.user.id,
+    authorName: req.user.name,
+    createdAt: new Date().toISOString()
+  };
 
-  // Получаем текущий дефект
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
+  appendComment(db, id, newComment, req.user.email, (err, found) => {
     if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
+      return res.status(500).json({ message: "Ошибка при добавлении комментария" });
     }
 
-    if (!defect) {
+    if (!found) {
       return res.status(404).json({ message: "Дефект не найден" });
     }
 
-    // Парсим вложения
-    const attachments = JSON.parse(defect.attachments || '[]');
-    
-    // Добавляем новое вложение (в реальном приложении здесь была бы загрузка файла)
-    const newAttachment = {
-      id: `att_${Date.now()}_${Math.random().toString(36).substr(2, 9)}`,
-      name: req.body.name || "uploaded_file",
-      size: req.body.size || 0,
-      type: req.body.type || "application/octet-stream",
-      url: req.body.url || "#",
-      uploadedAt: new Date().toISOString(),
-      uploadedBy: req.user.email
-    };
-
-    attachments.push(newAttachment);
-
-    // Обновляем дефект
-    db.run(
-      "UPDATE defects SET attachments = ?, updatedAt = ? WHERE id = ?",
-      [JSON.stringify(attachments), new Date().toISOString(), id],
-      function(err) {
-        if (err) {
-          return res.status(500).json({ message: "Ошибка при добавлении вложения" });
-        }
-
-        res.json({ message: "Вложение добавлено", attachment: newAttachment });
-      }
-    );
+    invalidateDefectResponses(id);
+    notifyDefectEvents();
+    res.json({ message: "Комментарий добавлен", comment: newComment });
   });
 });
 
-// Удаление вложения из дефекта
-app.delete("/api/defects/:id/attachments/:attachmentId", requireAuth, requireEngineer, (req, res) => {
-  const { id, attachmentId } = req.params;
-
-  // Получаем текущий дефект
-  db.get("SELECT * FROM defects WHERE id = ?", [id], (err, defect) => {
-    if (err) {
-      return res.status(500).json({ message: "Ошибка при получении дефекта" });
-    }
+// Загрузка вложений (multipart/form-data, потоком в файловое хранилище)
+app.post("/api/defects/:id/attachments", requireAuth, requireEngineer, createAttachmentUploadHandler(db, {
+  fileStore,
+  onChange: (id) => {
+    invalidateDefectResponses(id);
+    notifyDefectEvents();
+  },
+  onEnqueue: () => previewQueue.notify(),
+  previewsEnabled: () => previewQueue.enabled,
+}));
 
-    if (!defect) {
-      return res.status(404).json({ message: "Дефект не найден" });
-    }
+// Скачивание файла вложения (поддерживает Range)
+app.get("/api/defects/:id/attachments/:attachmentId/content", requireAuth, createAttachmentDownloadHandler(db, { fileStore }));
 
-    // Парсим вложения
-    const attachments = JSON.parse(defect.attachments || '[]');
-    
-    // Удаляем вложение
-    const filteredAttachments = attachments.filter(att => att.id !== attachmentId);
+// Миниатюра и превью фото (готовы после фоновой обработки)
+app.get("/api/defects/:id/attachments/:attachmentId/thumbnail", requireAuth, createAttachmentVariantHandler(db, { fileStore, variant: "thumbnail" }));
+app.get("/api/defects/:id/attachments/:attachmentId/preview", requireAuth, createAttachmentVariantHandler(db, { fileStore, variant: "preview" }));
 
-    if (filteredAttachments.length === attachments.length) {
-      return res.status(404).json({ message: "Вложение не найдено" });
-    }
-
-    // Обновляем дефект
-    db.run(
-      "UPDATE defects SET attachments = ?, updatedAt = ? WHERE id = ?",
-      [JSON.stringify(filteredAttachments), new Date().toISOString(), id],
-      function(err) {
-        if (err) {
-          return res.status(500).json({ message: "Ошибка при удалении вложения" });
-        }
-
-        res.json({ message: "Вложение удалено" });
-      }
-    );
-  });
-});
+// Удаление вложения из дефекта
+app.delete("/api/defects/:id/attachments/:attachmentId", requireAuth, requireEngineer, createAttachmentDeleteHandler(db, {
+  fileStore,
+  onChange: (id) => {
+    invalidateDefectResponses(id);
+    notifyDefectEvents();
+  },
+}));
 
 
 // Catch-all handler: send back React's index.html file for any non-API routes
@@ -949,8 +968,36 @@ app.use((req, res) => {
 });
 
 const PORT = process.env.PORT || 8080;
-app.listen(PORT, () => {
-  console.log(`🚀 Server running on http://localhost:${PORT}`);
+const SHUTDOWN_TIMEOUT_MS = Number(process.env.SHUTDOWN_TIMEOUT_MS) || 10_000;
+
+const server = app.listen(PORT, () => {
+  console.log(`🚀 Server running on http://localhost:${server.address().port}`);
   console.log(`📊 API endpoints available at /api/*`);
   console.log(`🔐 Auth endpoints: /api/register, /api/login, /api/me`);
+  startupStepDone();
 });
+
+// Плавная остановка: перестаем принимать соединения, дожидаемся текущих запросов,
+// затем закрываем пул хэширования и базу данных
+let shuttingDown = false;
+const shutdown = () => {
+  if (shuttingDown) return;
+  shuttingDown = true;
+
+  setTimeout(() => process.exit(1), SHUTDOWN_TIMEOUT_MS).unref();
+  server.close(() => {
+    Promise.all([hashPool.close(), previewQueue.close(), eventArchiver.close()])
+      .then(() => db.close())
+      .catch((err) => console.error("Ошибка при остановке сервера:", err.message))
+      .finally(() => process.exit(0));
+  });
+  // Потоки SSE бесконечны — закрываем их, клиенты переподключатся к другому процессу
+  defectEvents.close();
+};
+
+process.on("SIGTERM", shutdown);
+process.on("SIGINT", shutdown);
+// В кластере основной процесс останавливает рабочий через disconnect
+if (cluster.isWorker) {
+  process.on("disconnect", shutdown);
+}
@@ -0,0 +1,100 @@
+import crypto from 'crypto';
+import fs from 'fs';
+import path from 'path';
+import { once } from 'events';
+
+// Контентно-адресуемое хранилище файлов на локальном диске.
+// Файл пишется во временный файл с подсчетом SHA-256 и размера, затем переносится
+// в <root>/<ab>/<cd>/<sha256>. Одинаковые файлы хранятся один раз; удаляет файл
+// вызывающий код, когда на хэш больше не ссылается ни одно вложение.
+
+export class FileTooLargeError extends Error {
+  constructor(maxBytes) {
+    super(`Файл больше допустимого размера (${maxBytes} байт)`);
+    this.status = 413;
+  }
+}
+
+export class FileStore {
+  constructor({ root, maxFileSize }) {
+    this.root = path.resolve(root);
+    this.tmpDir = path.join(this.root, "tmp");
+    this.maxFileSize = maxFileSize;
+    fs.mkdirSync(this.tmpDir, { recursive: true });
+  }
+
+  path(sha256) {
+    return path.join(this.root, sha256.slice(0, 2), sha256.slice(2, 4), sha256);
+  }
+
+  // Производный файл (миниатюра, превью) хранится рядом с оригиналом
+  variantPath(sha256, variant) {
+    return `${this.path(sha256)}.${variant}.webp`;
+  }
+
+  // Начинает запись файла: write(chunk) ждет drain, finish() возвращает { sha256, size, tmpPath }
+  createWriter() {
+    const tmpPath = path.join(this.tmpDir, `${process.pid}-${crypto.randomUUID()}`);
+    const out = fs.createWriteStream(tmpPath, { flags: "wx" });
+    const hash = crypto.createHash("sha256");
+    const maxFileSize = this.maxFileSize;
+    let size = 0;
+    let failure = null;
+    out.on("error", (err) => {
+      failure = err;
+    });
+
+    return {
+      async write(chunk) {
+        if (failure) throw failure;
+        size += chunk.length;
+        if (size > maxFileSize) throw new FileTooLargeError(maxFileSize);
+        hash.update(chunk);
+        if (!out.write(chunk)) await once(out, "drain");
+      },
+      async finish() {
+        if (failure) throw failure;
+        out.end();
+        await once(out, "finish");
+        return { sha256: hash.digest("hex"), size, tmpPath };
+      },
+      async abort() {
+        out.destroy();
+        await fs.promises.rm(tmpPath, { force: true });
+      },
+    };
+  }
+
+  // Переносит временный файл на место; если такой файл уже есть, временный удаляется
+  async commit({ sha256, tmpPath }) {
+    const target = this.path(sha256);
+    try {
+      await fs.promises.access(target);
+      await fs.promises.rm(tmpPath, { force: true });
+    } catch {
+      await fs.promises.mkdir(path.dirname(target), { recursive: true });
+      await fs.promises.rename(tmpPath, target);
+    }
+    return target;
+  }
+
+  // Удаляет временный файл загрузки, которая не попала в хранилище
+  async discard({ tmpPath }) {
+    await fs.promises.rm(tmpPath, { force: true });
+  }
+
+  async removeVariants(sha256) {
+    const dir = path.dirname(this.path(sha256));
+    const names = await fs.promises.readdir(dir).catch(() => []);
+    await Promise.all(
+      names
+        .filter((name) => name.startsWith(`${sha256}.`))
+        .map((name) => fs.promises.rm(path.join(dir, name), { force: true }))
+    );
+  }
+
+  async remove(sha256) {
+    await fs.promises.rm(this.path(sha256), { force: true });
+    await this.removeVariants(sha256);
+  }
+}
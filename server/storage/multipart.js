@@ -0,0 +1,109 @@
+// Потоковый разбор multipart/form-data.
+// Тело читается по фрагментам; для каждой части выдаются события
+// { type: "part", name, filename, contentType }, затем { type: "data", chunk } и { type: "end" }.
+// Следующий фрагмент запроса читается только после обработки предыдущего события,
+// поэтому файл любого размера проходит через парсер без накопления в памяти.
+
+const MAX_HEADER_BYTES = 16 * 1024;
+const HEADER_END = Buffer.from("\r\n\r\n");
+
+export class MultipartError extends Error {
+  constructor(message) {
+    super(message);
+    this.status = 400;
+  }
+}
+
+// boundary из Content-Type или null
+export function getBoundary(contentType = "") {
+  if (!/^multipart\/form-data\b/i.test(contentType)) return null;
+  const match = /\bboundary=(?:"([^"]+)"|([^;\s]+))/i.exec(contentType);
+  return match ? match[1] || match[2] : null;
+}
+
+const parseDisposition = (value = "") => {
+  const param = (key) => {
+    const match = new RegExp(`\\b${key}\\*?=(?:"((?:[^"\\\\]|\\\\.)*)"|([^;]+))`, "i").exec(value);
+    if (!match) return undefined;
+    const raw = match[1] !== undefined ? match[1].replace(/\\(.)/g, "$1") : match[2].trim();
+    // filename*=UTF-8''... (RFC 5987)
+    const extended = /^utf-8''(.*)$/i.exec(raw);
+    return extended ? decodeURIComponent(extended[1]) : raw;
+  };
+  return { name: param("name"), filename: param("filename") };
+};
+
+const parseHeaders = (block) => {
+  const headers = {};
+  for (const line of block.toString("utf8").split("\r\n")) {
+    const colon = line.indexOf(":");
+    if (colon > 0) headers[line.slice(0, colon).trim().toLowerCase()] = line.slice(colon + 1).trim();
+  }
+  return headers;
+};
+
+export async function* readMultipart(stream, boundary) {
+  // Первый разделитель не предваряется CRLF — добавляем его, чтобы искать один шаблон
+  const delimiter = Buffer.from(`\r\n--${boundary}`);
+  let buffer = Buffer.from("\r\n");
+  let state = "preamble";
+
+  const chunks = stream[Symbol.asyncIterator]();
+  const more = async () => {
+    const { value, done } = await chunks.next();
+    if (done) return false;
+    buffer = buffer.length ? Buffer.concat([buffer, value]) : value;
+    return true;
+  };
+
+  for (;;) {
+    if (state === "preamble" || state === "body") {
+      const index = buffer.indexOf(delimiter);
+      if (index === -1) {
+        // Хвост короче разделителя может оказаться его началом — он остается в буфере
+        const safe = buffer.length - delimiter.length + 1;
+        if (safe > 0) {
+          if (state === "body") yield { type: "data", chunk: buffer.subarray(0, safe) };
+          buffer = buffer.subarray(safe);
+        }
+        if (!(await more())) throw new MultipartError("Неожиданный конец multipart-тела");
+        continue;
+      }
+
+      if (state === "body") {
+        if (index > 0) yield { type: "data", chunk: buffer.subarray(0, index) };
+        yield { type: "end" };
+      }
+      buffer = buffer.subarray(index + delimiter.length);
+      state = "delimiter";
+      continue;
+    }
+
+    if (state === "delimiter") {
+      if (buffer.length < 2) {
+        if (!(await more())) throw new MultipartError("Неожиданный конец multipart-тела");
+        continue;
+      }
+      const marker = buffer.subarray(0, 2).toString("latin1");
+      if (marker === "--") return;
+      if (marker !== "\r\n") throw new MultipartError("Некорректный разделитель multipart");
+      buffer = buffer.subarray(2);
+      state = "headers";
+      continue;
+    }
+
+    // state === "headers"
+    const end = buffer.indexOf(HEADER_END);
+    if (end === -1) {
+      if (buffer.length > MAX_HEADER_BYTES) throw new MultipartError("Слишком длинные заголовки части");
+      if (!(await more())) throw new MultipartError("Неожиданный конец multipart-тела");
+      continue;
+    }
+
+    const headers = parseHeaders(buffer.subarray(0, end));
+    const { name, filename } = parseDisposition(headers["content-disposition"]);
+    buffer = buffer.subarray(end + HEADER_END.length);
+    state = "body";
+    yield { type: "part", name, filename, contentType: headers["content-type"] || null };
+  }
+}
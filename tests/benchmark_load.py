@@ -0,0 +1,252 @@
+"""
+Генератор нагрузки для бенчмарков API.
+
+HTTP/1.1-клиент на asyncio с keep-alive (одно соединение на виртуального пользователя),
+прогон сценария в замкнутом цикле с заданной конкурентностью, расчет перцентилей
+и сравнение с сохраненной базовой линией. Только стандартная библиотека.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from urllib.parse import urlsplit
+
+
+class Response:
+    """Ответ сервера: статус, заголовки (ключи в нижнем регистре) и тело"""
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body)
+
+
+class HttpClient:
+    """Одно keep-alive соединение с сервером"""
+
+    def __init__(self, base_url, timeout=10.0):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+            self.reader = self.writer = None
+
+    async def request(self, method, path, json_body=None, headers=None):
+        # Сервер мог закрыть простаивающее соединение: один повтор на новом соединении
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(self._send(method, path, json_body, headers), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            await self.close()
+            if not reused:
+                raise
+        except BaseException:
+            await self.close()
+            raise
+
+        try:
+            return await asyncio.wait_for(self._send(method, path, json_body, headers), self.timeout)
+        except BaseException:
+            await self.close()
+            raise
+
+    async def _send(self, method, path, json_body, headers):
+        if self.writer is None:
+            await self.connect()
+
+        body = b"" if json_body is None else json.dumps(json_body).encode("utf-8")
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {self.host}:{self.port}", "Connection: keep-alive"]
+        if json_body is not None:
+            lines.append("Content-Type: application/json")
+        if body or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body)}")
+        for name, value in (headers or {}).items():
+            lines.append(f"{name}: {value}")
+        self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split(" ", 2)[1])
+        response_headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                response_headers[name.strip().lower()] = value.strip()
+
+        if status in (204, 304) or method == "HEAD":
+            payload = b""
+        elif response_headers.get("transfer-encoding", "").lower() == "chunked":
+            payload = await self._read_chunked()
+        elif "content-length" in response_headers:
+            payload = await self.reader.readexactly(int(response_headers["content-length"]))
+        else:
+            payload = await self.reader.read()
+            await self.close()
+
+        if response_headers.get("connection", "").lower() == "close":
+            await self.close()
+        return Response(status, response_headers, payload)
+
+    async def _read_chunked(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readuntil(b"\r\n")).split(b";")[0], 16)
+            if size == 0:
+                # Трейлеры до пустой строки
+                while (await self.reader.readuntil(b"\r\n")) != b"\r\n":
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readexactly(2)
+
+
+def percentile(sorted_values, p):
+    """Перцентиль по ближайшему рангу для отсортированного списка"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, -(-len(sorted_values) * p // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Recorder:
+    """Накопитель измерений одного прогона"""
+
+    def __init__(self):
+        self.latencies = []
+        self.by_endpoint = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.enabled = False
+
+    def record(self, endpoint, status, latency_ms, expected):
+        if not self.enabled:
+            return
+        self.latencies.append(latency_ms)
+        self.by_endpoint[endpoint].append(latency_ms)
+        self.statuses[str(status)] += 1
+        if status not in expected:
+            self.errors[f"{endpoint} -> {status}"] += 1
+
+    def summary(self, elapsed):
+        latencies = sorted(self.latencies)
+        count = len(latencies)
+
+        def latency_stats(values):
+            return {
+                "p50": round(percentile(values, 50), 3),
+                "p95": round(percentile(values, 95), 3),
+                "p99": round(percentile(values, 99), 3),
+                "mean": round(sum(values) / len(values), 3) if values else 0.0,
+                "max": round(values[-1], 3) if values else 0.0,
+            }
+
+        return {
+            "requests": count,
+            "errors": sum(self.errors.values()),
+            "errorSamples": dict(self.errors.most_common(10)),
+            "statuses": dict(self.statuses),
+            "durationSeconds": round(elapsed, 3),
+            "throughput": round(count / elapsed, 2) if elapsed > 0 else 0.0,
+            "latencyMs": latency_stats(latencies),
+            "endpoints": {
+                endpoint: {"requests": len(values), **latency_stats(sorted(values))}
+                for endpoint, values in sorted(self.by_endpoint.items())
+            },
+        }
+
+
+class VirtualUser:
+    """Виртуальный пользователь: свое соединение, генератор случайных чисел и состояние"""
+
+    def __init__(self, index, client, recorder, context, seed):
+        self.index = index
+        self.client = client
+        self.recorder = recorder
+        self.context = context
+        self.rng = random.Random(seed * 1000 + index)
+        self.state = {}
+
+    async def call(self, method, path, endpoint=None, json_body=None, headers=None, expected=(200,)):
+        """Запрос с замером времени; endpoint — имя для разбивки (шаблон маршрута)"""
+        started = time.perf_counter()
+        try:
+            response = await self.client.request(method, path, json_body=json_body, headers=headers)
+            status = response.status
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            response = None
+            status = type(e).__name__
+        self.recorder.record(endpoint or path, status, (time.perf_counter() - started) * 1000, expected)
+        return response
+
+
+async def _run_load(base_url, scenario, context, concurrency, duration, warmup, seed):
+    recorder = Recorder()
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    measure_from = started + warmup
+    stop_at = measure_from + duration
+    finished_at = []
+
+    async def worker(index):
+        user = VirtualUser(index, HttpClient(base_url), recorder, context, seed)
+        try:
+            while loop.time() < stop_at:
+                if not recorder.enabled and loop.time() >= measure_from:
+                    recorder.enabled = True
+                await scenario.action(user)
+        finally:
+            finished_at.append(loop.time())
+            await user.client.close()
+
+    await asyncio.gather(*(worker(index) for index in range(concurrency)))
+    return recorder.summary(max(finished_at) - measure_from)
+
+
+def run_load(base_url, scenario, context, concurrency, duration, warmup=1.0, seed=1):
+    """Прогон сценария: concurrency пользователей в замкнутом цикле в течение duration секунд.
+    Первые warmup секунд не учитываются."""
+    result = asyncio.run(_run_load(base_url, scenario, context, concurrency, duration, warmup, seed))
+    result["scenario"] = scenario.name
+    result["concurrency"] = concurrency
+    return result
+
+
+def find_regressions(result, baseline, threshold, latency_floor_ms=2.0):
+    """Сравнение прогона с базовой линией.
+
+    Задержка считается ухудшившейся, если перцентиль больше базового в (1 + threshold)
+    раз и еще на latency_floor_ms (чтобы не реагировать на шум в доли миллисекунды),
+    пропускная способность — если меньше базовой в (1 - threshold) раз.
+    Возвращает список описаний регрессий (пустой, если их нет)."""
+    regressions = []
+    for key in ("p50", "p95", "p99"):
+        base = baseline["latencyMs"][key]
+        current = result["latencyMs"][key]
+        limit = base * (1 + threshold) + latency_floor_ms
+        if current > limit:
+            regressions.append(f"{key}: {current:.2f} мс > {limit:.2f} мс (база {base:.2f} мс)")
+
+    base = baseline["throughput"]
+    current = result["throughput"]
+    limit = base * (1 - threshold)
+    if current < limit:
+        regressions.append(f"throughput: {current:.1f} rps < {limit:.1f} rps (база {base:.1f} rps)")
+    return regressions
@@ -0,0 +1,100 @@
+"""
+Сценарии нагрузки для бенчмарков API.
+
+Каждый сценарий — одно действие виртуального пользователя (один или несколько запросов),
+которое генератор повторяет в замкнутом цикле. context готовит фикстура bench_context:
+токены, id дефектов для изменения статуса, проекты и учетные записи для входа.
+"""
+from urllib.parse import urlencode
+
+STATUSES = ["new", "in_progress", "in_review", "closed", "cancelled"]
+PRIORITIES = ["low", "medium", "high", "critical"]
+SORT_FIELDS = ["createdAt", "title", "priority", "status", "dueDate"]
+SEARCH_TERMS = ["трещина", "протечка", "плитки", "кровельного", "штукатурки", "оконного", "коррозия", "стяжки"]
+
+
+class Scenario:
+    """Сценарий: имя, действие и конкурентность по умолчанию"""
+
+    def __init__(self, name, action, concurrency, description):
+        self.name = name
+        self.action = action
+        self.concurrency = concurrency
+        self.description = description
+
+
+def _auth(user, role="engineer"):
+    return {"Authorization": f"Bearer {user.context['tokens'][role]}"}
+
+
+async def list_browsing(user):
+    """Просмотр списка: первая страница с фильтрами, следующая по курсору, карточка дефекта"""
+    rng = user.rng
+    query = {"sort": rng.choice(SORT_FIELDS), "order": rng.choice(["asc", "desc"]), "cursor": ""}
+    if rng.random() < 0.5:
+        query["status"] = rng.choice(STATUSES)
+    if rng.random() < 0.3:
+        query["projectId"] = rng.choice(user.context["projectIds"])
+
+    response = await user.call("GET", f"/api/defects?{urlencode(query)}", "GET /api/defects", headers=_auth(user))
+    if response is None or response.status != 200:
+        return
+    page = response.json()
+
+    if page["nextCursor"]:
+        query["cursor"] = page["nextCursor"]
+        await user.call("GET", f"/api/defects?{urlencode(query)}", "GET /api/defects (cursor)", headers=_auth(user))
+
+    if page["items"]:
+        defect_id = rng.choice(page["items"])["id"]
+        await user.call("GET", f"/api/defects/{defect_id}", "GET /api/defects/:id", headers=_auth(user))
+
+
+async def search(user):
+    """Полнотекстовый поиск по одному-двум словам, иногда с сортировкой по релевантности"""
+    rng = user.rng
+    query = {"q": " ".join(rng.sample(SEARCH_TERMS, rng.choice([1, 1, 2])))}
+    if rng.random() < 0.5:
+        query["sort"] = "relevance"
+    if rng.random() < 0.3:
+        query["priority"] = rng.choice(PRIORITIES)
+    await user.call("GET", f"/api/defects?{urlencode(query)}", "GET /api/defects?q", headers=_auth(user))
+
+
+async def stats_dashboard(user):
+    """Панель статистики: статистика, проекты и инженеры с повторной проверкой по ETag"""
+    headers = _auth(user, "manager")
+    for path in ("/api/defects/stats", "/api/projects", "/api/users/engineers"):
+        etag = user.state.get(path)
+        request_headers = {**headers, "If-None-Match": etag} if etag else headers
+        response = await user.call("GET", path, f"GET {path}", headers=request_headers, expected=(200, 304))
+        if response is not None and "etag" in response.headers:
+            user.state[path] = response.headers["etag"]
+
+
+async def status_burst(user):
+    """Серия смен статуса: несколько пользователей меняют статусы одних и тех же дефектов"""
+    rng = user.rng
+    defect_id = rng.choice(user.context["defectIds"])
+    await user.call(
+        "PATCH",
+        f"/api/defects/{defect_id}/status",
+        "PATCH /api/defects/:id/status",
+        json_body={"status": rng.choice(STATUSES), "reason": "Нагрузочный тест"},
+        headers=_auth(user),
+    )
+
+
+async def login_storm(user):
+    """Одновременные входы: проверка паролей идет в пуле потоков, при перегрузке — 503"""
+    credentials = user.rng.choice(user.context["logins"])
+    await user.call("POST", "/api/login", "POST /api/login", json_body=credentials, expected=(200, 503))
+
+
+SCENARIOS = [
+    Scenario("list_browsing", list_browsing, 8, "Список дефектов, пагинация курсором и карточка"),
+    Scenario("search", search, 8, "Полнотекстовый поиск"),
+    Scenario("stats_dashboard", stats_dashboard, 8, "Статистика, проекты и инженеры с ETag"),
+    Scenario("status_burst", status_burst, 8, "Смена статусов небольшого набора дефектов"),
+    Scenario("login_storm", login_storm, 16, "Одновременные входы в систему"),
+]
@@ -3,49 +3,83 @@
 """
 import pytest
 import requests
-import time
 import subprocess
 import os
+import re
+import shutil
 import signal
-import sys
+import threading
+import json
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from pathlib import Path
 
-# Базовый URL для API
-BASE_URL = "http://localhost:8080"
-API_BASE = f"{BASE_URL}/api"
+PROJECT_ROOT = Path(__file__).parent.parent
 
-@pytest.fixture(scope="session")
-def server_process():
-    """Запуск сервера для тестов"""
-    # Проверяем, что мы в корневой директории проекта
-    project_root = Path(__file__).parent.parent
-    os.chdir(project_root)
-    
-    # Запускаем сервер в фоновом режиме
-    process = subprocess.Popen(
-        ["node", "server/simple-server.js"],
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        preexec_fn=os.setsid if os.name != 'nt' else None
+# Каждый процесс pytest (и каждый рабочий процесс pytest-xdist) запускает свой сервер
+# на свободном порту со своей временной базой, каталогом вложений и архивом событий.
+# Сервер сообщает о готовности строкой в stdout с фактическим адресом.
+SERVER_READY = re.compile(r"Server ready on (http://\S+)")
+SERVER_START_TIMEOUT = 30
+
+# Шаблоны баз с большими наборами данных: генерируются один раз и копируются в базу сервера
+DATASETS_DIR = Path(__file__).parent / ".datasets"
+
+def generate_dataset(db_path, size, seed=1, timeout=None):
+    """Синтетический набор дефектов (server/db/generate-dataset.js); возвращает сводку генератора.
+    Повторный вызов с тем же seed только дописывает недостающие строки."""
+    result = subprocess.run(
+        ["node", "server/db/generate-dataset.js", str(db_path), f"--size={size}", f"--seed={seed}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+        timeout=timeout
     )
-    
-    # Ждем запуска сервера
-    max_attempts = 30
-    for attempt in range(max_attempts):
-        try:
-            response = requests.get(f"{BASE_URL}/api/projects", timeout=2)
-            if response.status_code in [200, 401]:  # 401 - нормально, нужна авторизация
-                break
-        except requests.exceptions.RequestException:
-            pass
-        time.sleep(1)
-    else:
-        process.terminate()
-        pytest.fail("Сервер не запустился в течение 30 секунд")
-    
-    yield process
-    
-    # Останавливаем сервер
+    if result.returncode != 0:
+        pytest.fail(f"Ошибка генерации набора данных: {result.stderr}")
+    # На новой базе сводке предшествуют сообщения о примененных миграциях
+    return json.loads(result.stdout[result.stdout.find("{"):])
+
+@contextmanager
+def _file_lock(path):
+    """Блокировка между процессами pytest-xdist (на Windows не используется)"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w") as lock:
+        if os.name != 'nt':
+            import fcntl
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        yield
+
+def dataset_template(size, seed):
+    """База-шаблон с набором данных; рабочие процессы ждут, пока ее сгенерирует первый"""
+    path = DATASETS_DIR / f"{size}-seed{seed}.db"
+    with _file_lock(path.with_suffix(".lock")):
+        summary = generate_dataset(path, size, seed)
+    print(f"\n✅ Набор данных {size}: {summary['skipped'] + summary['defects']} дефектов")
+    return path
+
+class ServerProcess:
+    """Запущенный сервер: процесс, адрес и пути его данных"""
+
+    def __init__(self, process, base_url, workdir):
+        self.process = process
+        self.base_url = base_url
+        self.api_base = f"{base_url}/api"
+        self.workdir = workdir
+        self.db_path = workdir / "database.db"
+
+def _read_output(process, ready, output):
+    """Читает stdout сервера до конца (иначе сервер встанет на заполненном канале)"""
+    for line in process.stdout:
+        output.append(line.rstrip())
+        del output[:-200]
+        match = SERVER_READY.search(line)
+        if match and "url" not in ready:
+            ready["url"] = match.group(1)
+            ready["event"].set()
+    ready["event"].set()
+
+def _stop_server(process):
     try:
         if os.name != 'nt':
             os.killpg(os.getpgid(process.pid), signal.SIGTERM)
@@ -61,54 +95,214 @@ def server_process():
         except ProcessLookupError:
             pass
 
-@pytest.fixture
-def auth_headers():
-    """Получение заголовков авторизации для тестов"""
-    # Регистрируем тестового пользователя
+@pytest.fixture(scope="session")
+def server_process(request, tmp_path_factory):
+    """Запуск сервера для тестов: свой порт и своя база для каждого процесса pytest"""
+    workdir = tmp_path_factory.mktemp("server")
+
+    # Большой набор данных копируется из шаблона до запуска сервера
+    dataset = request.config.getoption("--dataset")
+    if dataset:
+        template = dataset_template(dataset, request.config.getoption("--dataset-seed"))
+        shutil.copyfile(template, workdir / "database.db")
+
+    env = {
+        **os.environ,
+        "PORT": "0",
+        "DATABASE_PATH": str(workdir / "database.db"),
+        "ATTACHMENTS_DIR": str(workdir / "uploads"),
+        "EVENT_ARCHIVE_DIR": str(workdir / "archive"),
+        # Профилировщик запросов включен; порог высокий, чтобы не засорять вывод
+        "SLOW_QUERY_MS": "1000",
+    }
+    process = subprocess.Popen(
+        ["node", "server/simple-server.js"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        preexec_fn=os.setsid if os.name != 'nt' else None
+    )
+
+    ready = {"event": threading.Event()}
+    output = []
+    threading.Thread(target=_read_output, args=(process, ready, output), daemon=True).start()
+
+    if not ready["event"].wait(SERVER_START_TIMEOUT) or "url" not in ready:
+        _stop_server(process)
+        log = "\n".join(output[-30:])
+        pytest.fail(f"Сервер не запустился за {SERVER_START_TIMEOUT} секунд:\n{log}")
+
+    yield ServerProcess(process, ready["url"], workdir)
+
+    _stop_server(process)
+
+@pytest.fixture(scope="session")
+def base_url(server_process):
+    """Адрес сервера текущего процесса pytest"""
+    return server_process.base_url
+
+def _login(api_base, email, password):
+    response = requests.post(f"{api_base}/login", json={"email": email, "password": password})
+    assert response.status_code == 200, f"Ошибка логина {email}: {response.status_code} - {response.text}"
+    return response.json()["token"]
+
+@pytest.fixture(scope="session")
+def engineer_token(server_process):
+    """Токен тестового инженера: пользователь регистрируется один раз за сессию"""
     test_user = {
         "email": "test@example.com",
         "password": "test123",
         "role": "engineer"
     }
-    
-    # Сначала пытаемся зарегистрироваться
-    try:
-        response = requests.post(f"{API_BASE}/register", json=test_user)
-        if response.status_code not in [201, 409]:  # 409 - пользователь уже существует
-            print(f"Ошибка регистрации: {response.status_code} - {response.text}")
-    except requests.exceptions.RequestException as e:
-        print(f"Ошибка при регистрации: {e}")
-    
-    # Логинимся
-    login_data = {
-        "email": test_user["email"],
-        "password": test_user["password"]
-    }
-    
-    response = requests.post(f"{API_BASE}/login", json=login_data)
-    if response.status_code == 200:
-        user_data = response.json()["user"]
-        return {"Authorization": f"Bearer {user_data['id']}"}
-    else:
-        print(f"Ошибка логина: {response.status_code} - {response.text}")
-        return {}
+    response = requests.post(f"{server_process.api_base}/register", json=test_user)
+    assert response.status_code in [201, 409], f"Ошибка регистрации: {response.status_code} - {response.text}"
+    return _login(server_process.api_base, test_user["email"], test_user["password"])
+
+@pytest.fixture(scope="session")
+def admin_token(server_process):
+    """Токен предустановленного админа"""
+    return _login(server_process.api_base, "admin@example.com", "admin123")
 
 @pytest.fixture
-def admin_headers():
+def auth_headers(engineer_token):
+    """Получение заголовков авторизации для тестов"""
+    return {"Authorization": f"Bearer {engineer_token}"}
+
+@pytest.fixture
+def admin_headers(admin_token):
     """Получение заголовков авторизации для админа"""
-    # Используем предустановленного админа
-    login_data = {
-        "email": "admin@example.com",
-        "password": "admin123"
+    return {"Authorization": f"Bearer {admin_token}"}
+
+# Бенчмарки: базовая линия хранится в репозитории, результаты последнего прогона — нет
+BENCHMARK_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+BENCHMARK_OUTPUT = Path(__file__).parent / "benchmark_results" / "latest.json"
+BENCHMARK_DEFECTS = 20
+
+def pytest_addoption(parser):
+    """Параметры набора данных и бенчмарков"""
+    parser.addoption("--dataset", default=None,
+                     help="сгенерировать набор дефектов перед запуском сервера: 10k, 1m, 10m или число")
+    parser.addoption("--dataset-seed", type=int, default=1,
+                     help="seed генератора набора данных")
+
+    group = parser.getgroup("benchmark", "Нагрузочные бенчмарки API")
+    group.addoption("--benchmark", action="store_true", default=False,
+                    help="запустить бенчмарки (по умолчанию пропускаются)")
+    group.addoption("--benchmark-concurrency", type=int, default=None,
+                    help="число одновременных пользователей (по умолчанию — свое для каждого сценария)")
+    group.addoption("--benchmark-duration", type=float, default=10.0,
+                    help="длительность замера сценария, секунд")
+    group.addoption("--benchmark-warmup", type=float, default=2.0,
+                    help="прогрев перед замером, секунд")
+    group.addoption("--benchmark-threshold", type=float, default=0.2,
+                    help="допустимое ухудшение относительно базовой линии (0.2 = 20%%)")
+    group.addoption("--benchmark-baseline", default=str(BENCHMARK_BASELINE),
+                    help="файл базовой линии")
+    group.addoption("--benchmark-output", default=str(BENCHMARK_OUTPUT),
+                    help="файл результатов прогона")
+    group.addoption("--benchmark-save-baseline", action="store_true", default=False,
+                    help="записать результаты прогона как новую базовую линию")
+    group.addoption("--benchmark-require-baseline", action="store_true", default=False,
+                    help="падать, если сравнить с базовой линией нельзя (для CI); по умолчанию такой сценарий пропускается")
+
+@pytest.fixture(scope="session")
+def benchmark_config(request):
+    """Параметры прогона и базовая линия"""
+    config = request.config
+    baseline_path = Path(config.getoption("--benchmark-baseline"))
+    baseline = {}
+    if baseline_path.exists() and not config.getoption("--benchmark-save-baseline"):
+        baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["scenarios"]
+
+    return {
+        "dataset": config.getoption("--dataset"),
+        "concurrency": config.getoption("--benchmark-concurrency"),
+        "duration": config.getoption("--benchmark-duration"),
+        "warmup": config.getoption("--benchmark-warmup"),
+        "threshold": config.getoption("--benchmark-threshold"),
+        "baseline": baseline,
+        "baselinePath": baseline_path,
+        "saveBaseline": config.getoption("--benchmark-save-baseline"),
+        "requireBaseline": config.getoption("--benchmark-require-baseline"),
     }
-    
-    response = requests.post(f"{API_BASE}/login", json=login_data)
-    if response.status_code == 200:
-        user_data = response.json()["user"]
-        return {"Authorization": f"Bearer {user_data['id']}"}
-    else:
-        print(f"Ошибка логина админа: {response.status_code} - {response.text}")
-        return {}
+
+@pytest.fixture(scope="session")
+def benchmark_report(request, benchmark_config):
+    """Результаты сценариев; в конце сессии записываются в JSON (и в базовую линию по флагу)"""
+    results = {}
+    yield results
+
+    if not results:
+        return
+    report = {
+        "createdAt": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "dataset": benchmark_config["dataset"],
+        "duration": benchmark_config["duration"],
+        "scenarios": results,
+    }
+    output = Path(request.config.getoption("--benchmark-output"))
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n📊 Результаты бенчмарков: {output}")
+
+    if request.config.getoption("--benchmark-save-baseline"):
+        path = benchmark_config["baselinePath"]
+        path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"📌 Базовая линия обновлена: {path}")
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, timeout=5, cwd=Path(__file__).parent
+        ).stdout.strip() or None
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+
+@pytest.fixture(scope="session")
+def bench_context(server_process):
+    """Данные для сценариев: токены, проекты и отдельный набор дефектов для смены статусов"""
+    api_base = server_process.api_base
+    tokens = {
+        "engineer": _login(api_base, "engineer@example.com", "engineer123"),
+        "manager": _login(api_base, "manager@example.com", "manager123"),
+        "admin": _login(api_base, "admin@example.com", "admin123"),
+    }
+    headers = {"Authorization": f"Bearer {tokens['engineer']}"}
+
+    response = requests.get(f"{api_base}/projects", headers=headers)
+    assert response.status_code == 200
+    project_ids = [project["id"] for project in response.json()]
+
+    defect_ids = []
+    for i in range(BENCHMARK_DEFECTS):
+        response = requests.post(f"{api_base}/defects", json={
+            "projectId": project_ids[i % len(project_ids)],
+            "title": f"Нагрузочный тест: дефект {i + 1}",
+            "description": "Создан для бенчмарка смены статусов",
+            "priority": "medium",
+        }, headers=headers)
+        assert response.status_code == 201, f"Ошибка создания дефекта: {response.text}"
+        defect_ids.append(response.json()["id"])
+
+    yield {
+        "tokens": tokens,
+        "projectIds": project_ids,
+        "defectIds": defect_ids,
+        "logins": [
+            {"email": "engineer@example.com", "password": "engineer123"},
+            {"email": "manager@example.com", "password": "manager123"},
+            {"email": "ivan.petrov@example.com", "password": "engineer123"},
+            {"email": "anna.smirnova@example.com", "password": "engineer123"},
+        ],
+    }
+
+    admin = {"Authorization": f"Bearer {tokens['admin']}"}
+    for defect_id in defect_ids:
+        requests.delete(f"{api_base}/defects/{defect_id}", headers=admin)
 
 def pytest_configure(config):
     """Настройка pytest"""
@@ -118,11 +312,19 @@ def pytest_configure(config):
     config.addinivalue_line(
         "markers", "integration: mark test as integration test"
     )
+    config.addinivalue_line(
+        "markers", "benchmark: нагрузочный бенчмарк (запуск с --benchmark)"
+    )
 
 def pytest_collection_modifyitems(config, items):
     """Автоматическая маркировка тестов"""
+    skip_benchmark = pytest.mark.skip(reason="бенчмарки запускаются с --benchmark")
     for item in items:
         if "test_unit_" in item.name:
             item.add_marker(pytest.mark.unit)
         elif "test_integration_" in item.name:
             item.add_marker(pytest.mark.integration)
+        elif "test_benchmark_" in item.name:
+            item.add_marker(pytest.mark.benchmark)
+            if not config.getoption("--benchmark"):
+                item.add_marker(skip_benchmark)
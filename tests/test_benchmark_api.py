@@ -0,0 +1,96 @@
+"""
+Нагрузочные бенчмарки API.
+
+Запуск: pytest tests/test_benchmark_api.py --benchmark [--benchmark-concurrency=16] [--dataset=1m]
+Результаты пишутся в tests/benchmark_results/latest.json и сравниваются с
+tests/benchmark_baseline.json; новая базовая линия — флагом --benchmark-save-baseline.
+Без базовой линии сценарий пропускается с причиной, с --benchmark-require-baseline — падает.
+"""
+import pytest
+
+from benchmark_load import find_regressions, percentile, run_load
+from benchmark_scenarios import SCENARIOS
+
+
+class TestBenchmarkAPI:
+    """Сценарии нагрузки с проверкой p50/p95/p99 и пропускной способности"""
+
+    @pytest.mark.parametrize("scenario", SCENARIOS, ids=[scenario.name for scenario in SCENARIOS])
+    def test_benchmark_scenario(self, scenario, base_url, bench_context, benchmark_config, benchmark_report):
+        """Прогон сценария и сравнение с базовой линией"""
+        concurrency = benchmark_config["concurrency"] or scenario.concurrency
+        print(f"🔍 Сценарий {scenario.name}: {scenario.description}, пользователей: {concurrency}")
+
+        result = run_load(
+            base_url,
+            scenario,
+            bench_context,
+            concurrency=concurrency,
+            duration=benchmark_config["duration"],
+            warmup=benchmark_config["warmup"],
+        )
+        result["dataset"] = benchmark_config["dataset"]
+        benchmark_report[scenario.name] = result
+
+        latency = result["latencyMs"]
+        print(
+            f"   {result['requests']} запросов, {result['throughput']} rps, "
+            f"p50 {latency['p50']} мс, p95 {latency['p95']} мс, p99 {latency['p99']} мс"
+        )
+
+        assert result["requests"] > 0, "За время замера не выполнено ни одного запроса"
+        assert result["errors"] == 0, f"Неожиданные ответы: {result['errorSamples']}"
+
+        if benchmark_config["saveBaseline"]:
+            print("✅ Результат записан в новую базовую линию")
+            return
+
+        baseline = benchmark_config["baseline"].get(scenario.name)
+        if baseline is None:
+            reason = f"нет базовой линии для сценария в {benchmark_config['baselinePath']}"
+        elif baseline["concurrency"] != concurrency or baseline.get("dataset") != result["dataset"]:
+            reason = (
+                f"базовая линия снята при {baseline['concurrency']} пользователях "
+                f"на наборе {baseline.get('dataset') or 'по умолчанию'}"
+            )
+        else:
+            reason = None
+        if reason:
+            # Результат уже в отчете; без сравнения тест не может считаться пройденным
+            if benchmark_config["requireBaseline"]:
+                pytest.fail(f"Сравнение с базовой линией невозможно: {reason}")
+            pytest.skip(f"Сравнение с базовой линией пропущено: {reason}")
+
+        regressions = find_regressions(result, baseline, benchmark_config["threshold"])
+        assert not regressions, f"Регрессия производительности {scenario.name}: " + "; ".join(regressions)
+        print("✅ Результат в пределах базовой линии")
+
+
+class TestUnitBenchmarkReport:
+    """Расчеты генератора нагрузки без сервера"""
+
+    def test_unit_benchmark_percentiles(self):
+        """Тест перцентилей по ближайшему рангу"""
+        values = list(range(1, 101))
+        assert percentile(values, 50) == 50
+        assert percentile(values, 95) == 95
+        assert percentile(values, 99) == 99
+        assert percentile([7.5], 99) == 7.5
+        assert percentile([], 50) == 0.0
+        print("✅ Перцентили считаются верно")
+
+    def test_unit_benchmark_regressions(self):
+        """Тест сравнения с базовой линией: порог, абсолютный запас и пропускная способность"""
+        baseline = {"latencyMs": {"p50": 5.0, "p95": 20.0, "p99": 40.0}, "throughput": 1000.0}
+
+        same = {"latencyMs": {"p50": 5.5, "p95": 25.0, "p99": 49.0}, "throughput": 850.0}
+        assert find_regressions(same, baseline, threshold=0.2) == []
+
+        slower = {"latencyMs": {"p50": 5.0, "p95": 20.0, "p99": 60.0}, "throughput": 1000.0}
+        regressions = find_regressions(slower, baseline, threshold=0.2)
+        assert len(regressions) == 1 and regressions[0].startswith("p99")
+
+        fewer = {"latencyMs": {"p50": 5.0, "p95": 20.0, "p99": 40.0}, "throughput": 700.0}
+        regressions = find_regressions(fewer, baseline, threshold=0.2)
+        assert len(regressions) == 1 and regressions[0].startswith("throughput")
+        print("✅ Регрессии определяются верно")
@@ -3,13 +3,20 @@
 """
 import pytest
 import requests
+import csv
+import io
 import json
+import sqlite3
+import struct
 import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 
 class TestIntegrationAPI:
     """Интеграционные тесты API"""
     
-    def test_integration_user_registration_and_login(self, server_process, auth_headers):
+    def test_integration_user_registration_and_login(self, base_url, auth_headers):
         """Тест регистрации и входа пользователя"""
         print("🔍 Тестируем регистрацию и вход пользователя...")
         
@@ -20,7 +27,7 @@ class TestIntegrationAPI:
             "role": "engineer"
         }
         
-        response = requests.post("http://localhost:8080/api/register", json=new_user)
+        response = requests.post(f"{base_url}/api/register", json=new_user)
         assert response.status_code in [201, 409], f"Ошибка регистрации: {response.status_code} - {response.text}"
         
         # Тест входа
@@ -29,7 +36,7 @@ class TestIntegrationAPI:
             "password": new_user["password"]
         }
         
-        response = requests.post("http://localhost:8080/api/login", json=login_data)
+        response = requests.post(f"{base_url}/api/login", json=login_data)
         assert response.status_code == 200, f"Ошибка входа: {response.status_code} - {response.text}"
         
         user_data = response.json()["user"]
@@ -38,7 +45,7 @@ class TestIntegrationAPI:
         
         print("✅ Регистрация и вход работают корректно")
     
-    def test_integration_defect_crud_operations(self, server_process, auth_headers):
+    def test_integration_defect_crud_operations(self, base_url, auth_headers):
         """Тест CRUD операций с дефектами"""
         print("🔍 Тестируем CRUD операции с дефектами...")
         
@@ -53,7 +60,7 @@ class TestIntegrationAPI:
         }
         
         response = requests.post(
-            "http://localhost:8080/api/defects",
+            f"{base_url}/api/defects",
             json=new_defect,
             headers=auth_headers
         )
@@ -66,7 +73,7 @@ class TestIntegrationAPI:
         
         # Получение дефекта
         response = requests.get(
-            f"http://localhost:8080/api/defects/{defect_id}",
+            f"{base_url}/api/defects/{defect_id}",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка получения дефекта: {response.status_code} - {response.text}"
@@ -83,7 +90,7 @@ class TestIntegrationAPI:
         }
         
         response = requests.patch(
-            f"http://localhost:8080/api/defects/{defect_id}",
+            f"{base_url}/api/defects/{defect_id}",
             json=update_data,
             headers=auth_headers
         )
@@ -95,13 +102,13 @@ class TestIntegrationAPI:
         
         print("✅ CRUD операции с дефектами работают корректно")
     
-    def test_integration_defect_filtering_and_pagination(self, server_process, auth_headers):
+    def test_integration_defect_filtering_and_pagination(self, base_url, auth_headers):
         """Тест фильтрации и пагинации дефектов"""
         print("🔍 Тестируем фильтрацию и пагинацию дефектов...")
         
         # Тест получения всех дефектов
         response = requests.get(
-            "http://localhost:8080/api/defects",
+            f"{base_url}/api/defects",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка получения дефектов: {response.status_code} - {response.text}"
@@ -114,7 +121,7 @@ class TestIntegrationAPI:
         
         # Тест фильтрации по статусу
         response = requests.get(
-            "http://localhost:8080/api/defects?status=new",
+            f"{base_url}/api/defects?status=new",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка фильтрации по статусу: {response.status_code} - {response.text}"
@@ -125,14 +132,14 @@ class TestIntegrationAPI:
         
         # Тест фильтрации по приоритету
         response = requests.get(
-            "http://localhost:8080/api/defects?priority=high",
+            f"{base_url}/api/defects?priority=high",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка фильтрации по приоритету: {response.status_code} - {response.text}"
         
         # Тест пагинации
         response = requests.get(
-            "http://localhost:8080/api/defects?page=1&pageSize=5",
+            f"{base_url}/api/defects?page=1&pageSize=5",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка пагинации: {response.status_code} - {response.text}"
@@ -141,16 +148,172 @@ class TestIntegrationAPI:
         assert len(paginated_defects["items"]) <= 5
         assert paginated_defects["page"] == 1
         assert paginated_defects["pageSize"] == 5
+
+        # Слишком большая страница отклоняется, а не усекается молча
+        response = requests.get(f"{base_url}/api/defects?pageSize=100", headers=auth_headers)
+        assert response.status_code == 200
+        assert response.json()["pageSize"] == 100
+
+        response = requests.get(f"{base_url}/api/defects?pageSize=101", headers=auth_headers)
+        assert response.status_code == 400
+        assert "100" in response.json()["message"]
         
         print("✅ Фильтрация и пагинация работают корректно")
+
+    def test_integration_defect_cursor_pagination(self, base_url, auth_headers):
+        """Тест курсорной пагинации дефектов"""
+        print("🔍 Тестируем курсорную пагинацию дефектов...")
+
+        # Первая страница: пустой курсор включает курсорный режим
+        response = requests.get(
+            f"{base_url}/api/defects?cursor=&pageSize=10&includeTotal=false",
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Ошибка курсорной пагинации: {response.status_code} - {response.text}"
+
+        first_page = response.json()
+        assert "nextCursor" in first_page
+        assert "total" not in first_page
+        assert len(first_page["items"]) <= 10
+
+        # Проходим по всем страницам и проверяем, что дефекты не повторяются
+        seen_ids = [d["id"] for d in first_page["items"]]
+        cursor = first_page["nextCursor"]
+        while cursor:
+            response = requests.get(
+                f"{base_url}/api/defects",
+                params={"cursor": cursor, "pageSize": 10, "includeTotal": "false"},
+                headers=auth_headers
+            )
+            assert response.status_code == 200, f"Ошибка получения следующей страницы: {response.status_code} - {response.text}"
+            next_page = response.json()
+            seen_ids.extend(d["id"] for d in next_page["items"])
+            cursor = next_page["nextCursor"]
+
+        assert len(seen_ids) == len(set(seen_ids)), "Дефекты не должны повторяться между страницами"
+
+        response = requests.get(f"{base_url}/api/defects", headers=auth_headers)
+        assert len(seen_ids) == response.json()["total"]
+
+        # Некорректный курсор
+        response = requests.get(
+            f"{base_url}/api/defects?cursor=invalid",
+            headers=auth_headers
+        )
+        assert response.status_code == 400
+
+        print("✅ Курсорная пагинация работает корректно")
+
+    def test_integration_defect_full_text_search(self, base_url, auth_headers):
+        """Тест полнотекстового поиска дефектов"""
+        print("🔍 Тестируем полнотекстовый поиск дефектов...")
+
+        marker = f"Шумоизоляция{int(time.time())}"
+        new_defect = {
+            "projectId": "p1",
+            "title": f"{marker} перекрытия",
+            "description": "Ёмкость для раствора протекает",
+            "priority": "medium"
+        }
+        response = requests.post(f"{base_url}/api/defects", json=new_defect, headers=auth_headers)
+        assert response.status_code == 201, f"Ошибка создания дефекта: {response.status_code} - {response.text}"
+        defect_id = response.json()["id"]
+
+        # Поиск по началу слова без учета регистра
+        response = requests.get(
+            f"{base_url}/api/defects",
+            params={"q": marker[:-3].lower()},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Ошибка поиска: {response.status_code} - {response.text}"
+        assert defect_id in [d["id"] for d in response.json()["items"]]
+
+        # "ё" и "е" считаются одной буквой
+        response = requests.get(
+            f"{base_url}/api/defects",
+            params={"q": f"{marker} емкость", "sort": "relevance"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Ошибка поиска по релевантности: {response.status_code} - {response.text}"
+        found = response.json()
+        assert found["total"] == 1
+        assert found["items"][0]["id"] == defect_id
+
+        # И в обратную сторону: "ё" в запросе находит "е" в тексте
+        response = requests.get(
+            f"{base_url}/api/defects",
+            params={"q": f"{marker[:-3]} протёкает"},
+            headers=auth_headers
+        )
+        assert defect_id in [d["id"] for d in response.json()["items"]]
+
+        # Запрос без букв и цифр ничего не находит, а не возвращает всю таблицу
+        for q in ["-", "!!"]:
+            response = requests.get(f"{base_url}/api/defects", params={"q": q}, headers=auth_headers)
+            assert response.status_code == 200
+            assert response.json()["total"] == 0, f"Поиск по {q!r} вернул дефекты"
+            assert response.json()["items"] == []
+
+        print("✅ Полнотекстовый поиск работает корректно")
+
+    def test_integration_defect_history_and_comments(self, base_url, auth_headers):
+        """Тест истории статусов и параллельных комментариев"""
+        print("🔍 Тестируем историю и комментарии дефекта...")
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p1", "title": "Дефект для комментариев", "priority": "low"},
+            headers=auth_headers
+        )
+        assert response.status_code == 201, f"Ошибка создания дефекта: {response.status_code} - {response.text}"
+        defect_id = response.json()["id"]
+
+        response = requests.patch(
+            f"{base_url}/api/defects/{defect_id}/status",
+            json={"status": "in_progress", "reason": "Начаты работы"},
+            headers=auth_headers
+        )
+        assert response.status_code == 200, f"Ошибка смены статуса: {response.status_code} - {response.text}"
+
+        # Параллельные комментарии не должны теряться
+        def add_comment(index):
+            return requests.post(
+                f"{base_url}/api/defects/{defect_id}/comments",
+                json={"message": f"Комментарий {index}"},
+                headers=auth_headers
+            )
+
+        with ThreadPoolExecutor(max_workers=5) as executor:
+            responses = list(executor.map(add_comment, range(10)))
+        assert all(r.status_code == 200 for r in responses)
+
+        response = requests.get(f"{base_url}/api/defects/{defect_id}", headers=auth_headers)
+        assert response.status_code == 200
+        defect = response.json()
+
+        assert len(defect["comments"]) == 10
+        assert defect["attachments"] == []
+        assert len(defect["history"]) == 1
+        assert defect["history"][0]["changes"] == {"status": "in_progress"}
+        assert defect["history"][0]["reason"] == "Начаты работы"
+
+        # Комментарий к несуществующему дефекту
+        response = requests.post(
+            f"{base_url}/api/defects/d_missing/comments",
+            json={"message": "Текст"},
+            headers=auth_headers
+        )
+        assert response.status_code == 404
+
+        print("✅ История и комментарии работают корректно")
     
-    def test_integration_projects_and_statistics(self, server_process, auth_headers):
+    def test_integration_projects_and_statistics(self, base_url, auth_headers):
         """Тест получения проектов и статистики"""
         print("🔍 Тестируем получение проектов и статистики...")
         
         # Тест получения проектов
         response = requests.get(
-            "http://localhost:8080/api/projects",
+            f"{base_url}/api/projects",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка получения проектов: {response.status_code} - {response.text}"
@@ -169,7 +332,7 @@ class TestIntegrationAPI:
         
         # Тест получения статистики
         response = requests.get(
-            "http://localhost:8080/api/defects/stats",
+            f"{base_url}/api/defects/stats",
             headers=auth_headers
         )
         assert response.status_code == 200, f"Ошибка получения статистики: {response.status_code} - {response.text}"
@@ -186,24 +349,24 @@ class TestIntegrationAPI:
         
         print("✅ Получение проектов и статистики работает корректно")
     
-    def test_integration_authentication_and_authorization(self, server_process, admin_headers):
+    def test_integration_authentication_and_authorization(self, base_url, admin_headers):
         """Тест аутентификации и авторизации"""
         print("🔍 Тестируем аутентификацию и авторизацию...")
         
         # Тест доступа к защищенному endpoint без авторизации
-        response = requests.get("http://localhost:8080/api/projects")
+        response = requests.get(f"{base_url}/api/projects")
         assert response.status_code == 401, f"Endpoint должен требовать авторизацию: {response.status_code}"
         
         # Тест доступа с валидной авторизацией
         response = requests.get(
-            "http://localhost:8080/api/projects",
+            f"{base_url}/api/projects",
             headers=admin_headers
         )
         assert response.status_code == 200, f"Доступ с авторизацией должен работать: {response.status_code}"
         
         # Тест доступа к админскому endpoint
         response = requests.get(
-            "http://localhost:8080/api/users",
+            f"{base_url}/api/users",
             headers=admin_headers
         )
         assert response.status_code == 200, f"Админский endpoint должен быть доступен: {response.status_code}"
@@ -213,7 +376,7 @@ class TestIntegrationAPI:
         
         # Тест доступа к инженерскому endpoint
         response = requests.get(
-            "http://localhost:8080/api/users/engineers",
+            f"{base_url}/api/users/engineers",
             headers=admin_headers
         )
         assert response.status_code == 200, f"Endpoint инженеров должен быть доступен: {response.status_code}"
@@ -222,3 +385,804 @@ class TestIntegrationAPI:
         assert isinstance(engineers, list)
         
         print("✅ Аутентификация и авторизация работают корректно")
+
+    def test_integration_session_cache_invalidation(self, base_url, admin_headers):
+        """Тест подписанных токенов и их отзыва при смене роли и удалении пользователя"""
+        print("🔍 Тестируем токены и кэш сессий...")
+
+        user = {"email": f"session_{int(time.time() * 1000)}@example.com", "password": "test123", "role": "engineer"}
+        response = requests.post(f"{base_url}/api/register", json=user)
+        assert response.status_code == 201, f"Ошибка регистрации: {response.status_code} - {response.text}"
+
+        login_data = {"email": user["email"], "password": user["password"]}
+        response = requests.post(f"{base_url}/api/login", json=login_data)
+        assert response.status_code == 200
+        user_id = response.json()["user"]["id"]
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+
+        response = requests.get(f"{base_url}/api/me", headers=headers)
+        assert response.status_code == 200
+        assert response.json()["user"]["role"] == "engineer"
+
+        # Идентификатор пользователя больше не является токеном
+        response = requests.get(f"{base_url}/api/me", headers={"Authorization": f"Bearer {user_id}"})
+        assert response.status_code == 401
+
+        # Обновление токена отзывает предыдущий
+        response = requests.post(f"{base_url}/api/token/refresh", headers=headers)
+        assert response.status_code == 200, f"Ошибка обновления токена: {response.status_code} - {response.text}"
+        refreshed_headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        assert requests.get(f"{base_url}/api/me", headers=headers).status_code == 401
+        assert requests.get(f"{base_url}/api/me", headers=refreshed_headers).status_code == 200
+
+        # Смена роли отзывает выданные токены, новый вход получает новую роль
+        response = requests.patch(
+            f"{base_url}/api/users/{user_id}/role",
+            json={"role": "observer"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200, f"Ошибка смены роли: {response.status_code} - {response.text}"
+        assert requests.get(f"{base_url}/api/me", headers=refreshed_headers).status_code == 401
+
+        response = requests.post(f"{base_url}/api/login", json=login_data)
+        headers = {"Authorization": f"Bearer {response.json()['token']}"}
+        response = requests.get(f"{base_url}/api/me", headers=headers)
+        assert response.json()["user"]["role"] == "observer"
+
+        # Удаленный пользователь теряет доступ
+        response = requests.delete(f"{base_url}/api/users/{user_id}", headers=admin_headers)
+        assert response.status_code == 204
+
+        response = requests.get(f"{base_url}/api/me", headers=headers)
+        assert response.status_code == 401
+
+        response = requests.get(f"{base_url}/api/admin/cache-stats", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json()["sessions"]["hits"] >= 0
+
+        print("✅ Кэш сессий работает корректно")
+
+    def test_integration_hash_pool_stats(self, base_url, admin_headers):
+        """Тест статистики пула хэширования паролей"""
+        print("🔍 Тестируем пул хэширования...")
+
+        response = requests.get(f"{base_url}/api/admin/hash-pool", headers=admin_headers)
+        assert response.status_code == 200, f"Ошибка получения статистики пула: {response.status_code} - {response.text}"
+
+        stats = response.json()
+        assert stats["backend"] in ["bcrypt", "bcryptjs"]
+        assert stats["size"] >= 1
+        # Вход администратора в фикстуре уже прошел через пул
+        assert stats["latency"]["compare"]["count"] >= 1
+        assert stats["latency"]["compare"]["p99"] >= stats["latency"]["compare"]["p50"]
+
+        print("✅ Пул хэширования работает корректно")
+
+    def test_integration_database_read_pool(self, base_url, admin_headers):
+        """Тест параллельных чтений через пул соединений и кэш подготовленных запросов"""
+        print("🔍 Тестируем пул соединений базы данных...")
+
+        def fetch_list(_):
+            return requests.get(
+                f"{base_url}/api/defects?pageSize=5&sort=createdAt&order=desc",
+                headers=admin_headers
+            ).status_code
+
+        def update_status(_):
+            return requests.patch(
+                f"{base_url}/api/defects/d_001/status",
+                json={"status": "in_progress"},
+                headers=admin_headers
+            ).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            reads = executor.map(fetch_list, range(24))
+            writes = executor.map(update_status, range(4))
+            assert all(code == 200 for code in reads)
+            assert all(code in [200, 404] for code in writes)
+
+        response = requests.get(f"{base_url}/api/admin/cache-stats", headers=admin_headers)
+        assert response.status_code == 200
+
+        database = response.json()["database"]
+        assert len(database["readers"]) >= 1
+        # Одинаковые запросы переиспользуют подготовленные выражения
+        assert sum(reader["statements"]["hits"] for reader in database["readers"]) > 0
+
+        print("✅ Пул соединений базы данных работает корректно")
+
+    def test_integration_defect_csv_export(self, base_url, admin_headers):
+        """Тест потокового экспорта дефектов в CSV с фильтрами"""
+        print("🔍 Тестируем экспорт дефектов в CSV...")
+
+        response = requests.get(
+            f"{base_url}/api/defects/export?status=new",
+            headers={**admin_headers, "Accept-Encoding": "gzip"}
+        )
+        assert response.status_code == 200, f"Ошибка экспорта: {response.status_code} - {response.text}"
+        assert response.headers["Content-Type"].startswith("text/csv")
+        assert response.headers.get("Content-Encoding") == "gzip"
+
+        reader = csv.DictReader(io.StringIO(response.text))
+        rows = list(reader)
+        assert reader.fieldnames[0] == "id"
+        assert all(row["status"] == "new" for row in rows)
+        keys = [(row["createdAt"], row["id"]) for row in rows]
+        assert keys == sorted(keys), "Строки экспорта должны идти по (createdAt, id)"
+
+        response = requests.get(
+            f"{base_url}/api/defects?status=new&pageSize=1",
+            headers=admin_headers
+        )
+        assert len(rows) == response.json()["total"]
+
+        print("✅ Экспорт в CSV работает корректно")
+
+    def test_integration_defect_bulk_import(self, base_url, admin_headers):
+        """Тест пакетного импорта дефектов из NDJSON и CSV"""
+        print("🔍 Тестируем пакетный импорт дефектов...")
+
+        marker = f"bulk-{int(time.time() * 1000)}"
+        lines = [
+            json.dumps({"projectId": "p1", "title": f"{marker} {i}", "priority": "medium", "status": "in_progress"})
+            for i in range(25)
+        ]
+        lines.insert(3, "{not json")
+        lines.insert(7, json.dumps({"projectId": "p1", "title": f"{marker} bad", "priority": "urgent"}))
+
+        response = requests.post(
+            f"{base_url}/api/defects/bulk?batchSize=10",
+            data="\n".join(lines).encode("utf-8"),
+            headers={**admin_headers, "Content-Type": "application/x-ndjson"}
+        )
+        assert response.status_code == 200, f"Ошибка импорта: {response.status_code} - {response.text}"
+
+        report = response.json()
+        assert report["received"] == 27
+        assert report["inserted"] == 25
+        assert report["failed"] == 2
+        assert report["batches"] == 3
+        assert [error["line"] for error in report["errors"]] == [4, 8]
+        assert report["rowsPerSecond"] >= 0
+
+        csv_body = (
+            "projectId,title,description,priority\r\n"
+            f'p2,"{marker} csv","Строка с запятой, ""кавычками""\nи переводом строки",high\r\n'
+            f"p2,{marker} csv без приоритета,,\r\n"
+        )
+        response = requests.post(
+            f"{base_url}/api/defects/bulk",
+            data=csv_body.encode("utf-8"),
+            headers={**admin_headers, "Content-Type": "text/csv; charset=utf-8"}
+        )
+        assert response.status_code == 200, f"Ошибка импорта CSV: {response.status_code} - {response.text}"
+        report = response.json()
+        assert report["inserted"] == 1
+        assert report["errors"][0]["line"] == 4
+
+        response = requests.get(
+            f"{base_url}/api/defects?q={marker}&pageSize=100&fields=projectId,description",
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        imported = response.json()["items"]
+        assert len(imported) == 26
+        csv_defect = next(d for d in imported if d["projectId"] == "p2")
+        assert csv_defect["description"] == 'Строка с запятой, "кавычками"\nи переводом строки'
+
+        print("✅ Пакетный импорт дефектов работает корректно")
+
+    def test_integration_defect_bulk_status_and_assignee(self, base_url, admin_headers):
+        """Тест пакетной смены статуса и исполнителя"""
+        print("🔍 Тестируем пакетную смену статуса и исполнителя...")
+
+        ids = []
+        for i in range(3):
+            response = requests.post(
+                f"{base_url}/api/defects",
+                json={"projectId": "p3", "title": f"Пакетная смена {i}", "priority": "low"},
+                headers=admin_headers
+            )
+            assert response.status_code == 201
+            ids.append(response.json()["id"])
+
+        response = requests.patch(
+            f"{base_url}/api/defects/bulk/status",
+            json={"ids": ids + ["d_missing"], "status": "closed", "reason": "Приемка"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200, f"Ошибка пакетной смены статуса: {response.status_code} - {response.text}"
+        report = response.json()
+        assert report["updated"] == 3
+        assert report["notFound"] == 1
+        assert {r["id"]: r["result"] for r in report["results"]}["d_missing"] == "not_found"
+
+        # Повторная смена на тот же статус ничего не меняет
+        response = requests.patch(
+            f"{base_url}/api/defects/bulk/status",
+            json={"ids": ids, "status": "closed"},
+            headers=admin_headers
+        )
+        assert response.json()["unchanged"] == 3
+
+        response = requests.patch(
+            f"{base_url}/api/defects/bulk/status",
+            json={"ids": ids, "status": "done"},
+            headers=admin_headers
+        )
+        assert response.status_code == 400
+
+        response = requests.patch(
+            f"{base_url}/api/defects/bulk/assignee",
+            json={"ids": ids, "assigneeId": "u2"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["updated"] == 3
+
+        response = requests.get(f"{base_url}/api/defects/{ids[0]}", headers=admin_headers)
+        defect = response.json()
+        assert defect["status"] == "closed"
+        assert defect["assigneeId"] == "u2"
+        assert [entry["changes"] for entry in defect["history"]] == [{"status": "closed"}, {"assigneeId": "u2"}]
+        assert defect["history"][0]["reason"] == "Приемка"
+
+        # Пустой фильтр не должен затрагивать все дефекты
+        response = requests.patch(
+            f"{base_url}/api/defects/bulk/status",
+            json={"filter": {}, "status": "closed"},
+            headers=admin_headers
+        )
+        assert response.status_code == 400
+
+        print("✅ Пакетная смена статуса и исполнителя работает корректно")
+
+    def test_integration_conditional_requests(self, base_url, admin_headers, server_process):
+        """Тест ETag и ответов 304 для маршрутов чтения"""
+        print("🔍 Тестируем условные запросы...")
+
+        for url in ["/api/projects", "/api/users/engineers", "/api/defects/stats"]:
+            response = requests.get(f"{base_url}{url}", headers=admin_headers)
+            assert response.status_code == 200
+            etag = response.headers["ETag"]
+            assert etag.startswith('W/"')
+            assert "Cache-Control" in response.headers
+
+            response = requests.get(
+                f"{base_url}{url}",
+                headers={**admin_headers, "If-None-Match": etag}
+            )
+            assert response.status_code == 304, f"{url} должен вернуть 304"
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p1", "title": "Проверка ETag", "priority": "low"},
+            headers=admin_headers
+        )
+        defect_id = response.json()["id"]
+
+        response = requests.get(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+        etag = response.headers["ETag"]
+        response = requests.get(
+            f"{base_url}/api/defects/{defect_id}",
+            headers={**admin_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        # Комментарий меняет версию карточки, даже если пришел в ту же миллисекунду
+        requests.post(
+            f"{base_url}/api/defects/{defect_id}/comments",
+            json={"message": "Новый комментарий"},
+            headers=admin_headers
+        )
+        response = requests.get(
+            f"{base_url}/api/defects/{defect_id}",
+            headers={**admin_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.json()["comments"][0]["message"] == "Новый комментарий"
+
+        # Запись с тем же updatedAt (две записи в одну миллисекунду) тоже меняет версию
+        etag = response.headers["ETag"]
+        version = response.json()["version"]
+        connection = sqlite3.connect(server_process.db_path, timeout=5)
+        with connection:
+            connection.execute("UPDATE defects SET updatedAt = updatedAt WHERE id = ?", (defect_id,))
+        connection.close()
+        response = requests.get(
+            f"{base_url}/api/defects/{defect_id}",
+            headers={**admin_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200, "Версия карточки не изменилась"
+        assert response.json()["version"] > version
+
+        response = requests.get(f"{base_url}/api/defects/d_missing", headers=admin_headers)
+        assert response.status_code == 404
+
+        print("✅ Условные запросы работают корректно")
+
+    def test_integration_project_catalog(self, base_url, admin_headers):
+        """Тест создания и изменения проектов через каталог в памяти"""
+        print("🔍 Тестируем каталог проектов...")
+
+        response = requests.get(f"{base_url}/api/projects", headers=admin_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        response = requests.get(
+            f"{base_url}/api/projects",
+            headers={**admin_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        # Некорректные данные проекта
+        response = requests.post(
+            f"{base_url}/api/projects",
+            json={"name": "Без кода"},
+            headers=admin_headers
+        )
+        assert response.status_code == 400
+
+        response = requests.post(
+            f"{base_url}/api/projects",
+            json={
+                "name": "ЖК Тестовый",
+                "code": "TEST-1",
+                "location": "Москва",
+                "stages": [{"name": "Фундамент", "startDate": "2025-01-01"}],
+            },
+            headers=admin_headers
+        )
+        assert response.status_code == 201
+        project = response.json()
+        assert project["stages"][0]["name"] == "Фундамент"
+        assert project["stages"][0]["id"]
+
+        # Новый проект сразу виден в списке, ETag изменился
+        response = requests.get(
+            f"{base_url}/api/projects",
+            headers={**admin_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert any(p["id"] == project["id"] for p in response.json())
+
+        response = requests.patch(
+            f"{base_url}/api/projects/{project['id']}",
+            json={"name": "ЖК Тестовый 2"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        assert response.json()["name"] == "ЖК Тестовый 2"
+        assert response.json()["code"] == "TEST-1"
+
+        response = requests.patch(
+            f"{base_url}/api/projects/p_missing",
+            json={"name": "Нет"},
+            headers=admin_headers
+        )
+        assert response.status_code == 404
+
+        # projectId дефекта проверяется по каталогу
+        defect = {
+            "projectId": "p_missing",
+            "title": "Дефект без проекта",
+            "description": "Проверка projectId",
+            "priority": "low",
+        }
+        response = requests.post(f"{base_url}/api/defects", json=defect, headers=admin_headers)
+        assert response.status_code == 400
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={**defect, "projectId": project["id"]},
+            headers=admin_headers
+        )
+        assert response.status_code == 201
+
+        print("✅ Каталог проектов работает корректно")
+
+    def test_integration_defect_list_fields(self, base_url, admin_headers):
+        """Тест проекции полей в списке дефектов"""
+        print("🔍 Тестируем параметр fields списка дефектов...")
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p1", "title": "Проекция списка", "description": "Длинное описание", "priority": "low"},
+            headers=admin_headers
+        )
+        assert response.status_code == 201
+        defect_id = response.json()["id"]
+        requests.post(
+            f"{base_url}/api/defects/{defect_id}/comments",
+            json={"message": "Комментарий"},
+            headers=admin_headers
+        )
+
+        # По умолчанию — компактная проекция со счетчиками
+        response = requests.get(f"{base_url}/api/defects?pageSize=100", headers=admin_headers)
+        assert response.status_code == 200
+        item = next(d for d in response.json()["items"] if d["id"] == defect_id)
+        assert item["title"] == "Проекция списка"
+        assert item["commentCount"] == 1
+        assert item["attachmentCount"] == 0
+        assert "description" not in item
+        assert "reporterId" not in item
+
+        response = requests.get(
+            f"{base_url}/api/defects?pageSize=100&fields=title,description",
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        item = next(d for d in response.json()["items"] if d["id"] == defect_id)
+        assert item["description"] == "Длинное описание"
+        assert "status" not in item
+
+        response = requests.get(f"{base_url}/api/defects?fields=all", headers=admin_headers)
+        assert response.status_code == 200
+        assert "reporterId" in response.json()["items"][0]
+
+        response = requests.get(f"{base_url}/api/defects?fields=password", headers=admin_headers)
+        assert response.status_code == 400
+
+        print("✅ Проекция полей списка работает корректно")
+
+    def test_integration_attachment_storage(self, base_url, admin_headers):
+        """Тест загрузки, скачивания с Range и удаления файлов вложений"""
+        print("🔍 Тестируем хранилище вложений...")
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p1", "title": "Дефект с фото", "priority": "medium"},
+            headers=admin_headers
+        )
+        assert response.status_code == 201
+        defect_id = response.json()["id"]
+        url = f"{base_url}/api/defects/{defect_id}/attachments"
+        auth = {"Authorization": admin_headers["Authorization"]}
+        content = bytes(range(256)) * 4096
+
+        # Метаданные без файла больше не принимаются
+        response = requests.post(url, json={"name": "file.jpg"}, headers=admin_headers)
+        assert response.status_code == 415
+
+        response = requests.post(url, files={"file": ("фото.jpg", content, "image/jpeg")}, headers=auth)
+        assert response.status_code == 200, response.text
+        first = response.json()["attachment"]
+        assert first["name"] == "фото.jpg"
+        assert first["size"] == len(content)
+
+        # Тот же файл повторно — та же запись в хранилище
+        response = requests.post(url, files={"file": ("копия.jpg", content, "image/jpeg")}, headers=auth)
+        assert response.status_code == 200
+        second = response.json()["attachment"]
+        assert second["sha256"] == first["sha256"]
+
+        response = requests.get(f"{base_url}{first['url']}", headers=auth)
+        assert response.status_code == 200
+        assert response.content == content
+        assert response.headers["Content-Type"] == "image/jpeg"
+
+        response = requests.get(f"{base_url}{first['url']}", headers={**auth, "Range": "bytes=100-199"})
+        assert response.status_code == 206
+        assert response.content == content[100:200]
+        assert response.headers["Content-Range"] == f"bytes 100-199/{len(content)}"
+
+        response = requests.get(f"{base_url}{first['url']}")
+        assert response.status_code == 401
+
+        # Удаление одной из копий не трогает файл второй
+        response = requests.delete(f"{url}/{first['id']}", headers=admin_headers)
+        assert response.status_code == 200
+        response = requests.get(f"{base_url}{second['url']}", headers=auth)
+        assert response.status_code == 200
+        assert response.content == content
+
+        response = requests.get(f"{base_url}{first['url']}", headers=auth)
+        assert response.status_code == 404
+
+        response = requests.get(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+        assert [a["id"] for a in response.json()["attachments"]] == [second["id"]]
+
+        response = requests.post(
+            f"{base_url}/api/defects/d_missing/attachments",
+            files={"file": ("a.txt", b"abc", "text/plain")},
+            headers=auth
+        )
+        assert response.status_code == 404
+
+        # Несколько файлов за запрос добавляются вместе
+        response = requests.post(
+            url,
+            files=[("file", ("a.txt", b"abc", "text/plain")), ("file", ("b.txt", b"def", "text/plain"))],
+            headers=auth
+        )
+        assert response.status_code == 200, response.text
+        added = response.json()["attachments"]
+        assert [a["name"] for a in added] == ["a.txt", "b.txt"]
+
+        response = requests.get(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+        ids = {a["id"] for a in response.json()["attachments"]}
+        assert ids == {second["id"]} | {a["id"] for a in added}
+
+        print("✅ Хранилище вложений работает корректно")
+
+    def test_integration_attachment_previews(self, base_url, admin_headers):
+        """Тест фоновой очереди миниатюр для фото вложений"""
+        print("🔍 Тестируем очередь превью...")
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p2", "title": "Дефект с превью", "priority": "low"},
+            headers=admin_headers
+        )
+        defect_id = response.json()["id"]
+        auth = {"Authorization": admin_headers["Authorization"]}
+
+        # Фото 640x480 — больше миниатюры, поэтому она действительно уменьшается
+        width, height = 640, 480
+        raw = b"".join(
+            b"\x00" + bytes(v for x in range(width) for v in (x % 256, y % 256, 128))
+            for y in range(height)
+        )
+        chunk = lambda kind, data: (struct.pack(">I", len(data)) + kind + data
+                                    + struct.pack(">I", zlib.crc32(kind + data)))
+        png = (b"\x89PNG\r\n\x1a\n"
+               + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0))
+               + chunk(b"IDAT", zlib.compress(raw))
+               + chunk(b"IEND", b""))
+
+        response = requests.post(
+            f"{base_url}/api/defects/{defect_id}/attachments",
+            files={"file": ("фасад.png", png, "image/png")},
+            headers=auth
+        )
+        assert response.status_code == 200
+        attachment = response.json()["attachment"]
+
+        # sharp объявлен в optionalDependencies: без него превью не строятся вовсе
+        for _ in range(50):
+            queue = requests.get(f"{base_url}/api/admin/preview-queue", headers=admin_headers).json()
+            if queue["backend"]:
+                break
+            time.sleep(0.1)
+        assert queue["backend"] == "sharp", "sharp не установлен (npm install): превью не создаются"
+
+        defect = None
+        for _ in range(100):
+            defect = requests.get(f"{base_url}/api/defects/{defect_id}", headers=admin_headers).json()
+            if defect["attachments"][0].get("thumbnailUrl"):
+                break
+            time.sleep(0.1)
+        stored = defect["attachments"][0]
+        assert stored["id"] == attachment["id"]
+        assert stored.get("thumbnailUrl"), "Миниатюра не построена"
+
+        response = requests.get(f"{base_url}{stored['thumbnailUrl']}", headers=auth)
+        assert response.status_code == 200
+        assert response.headers["Content-Type"] == "image/webp"
+        thumbnail = response.content
+        assert thumbnail[:4] == b"RIFF" and thumbnail[8:12] == b"WEBP", "Миниатюра не в формате WebP"
+        assert 0 < len(thumbnail) < len(png)
+
+        response = requests.get(f"{base_url}{stored['previewUrl']}", headers=auth)
+        assert response.status_code == 200
+        assert response.content[8:12] == b"WEBP"
+
+        queue = requests.get(f"{base_url}/api/admin/preview-queue", headers=admin_headers).json()
+        assert queue["processed"] >= 1
+        assert queue["jobs"].get("done", 0) >= 1
+
+        print("✅ Очередь превью работает корректно")
+
+    def test_integration_defect_event_stream(self, base_url, admin_headers):
+        """Тест потока событий дефектов (SSE) с фильтром по проекту и Last-Event-ID"""
+        print("🔍 Тестируем поток событий /api/events...")
+
+        token = admin_headers["Authorization"].replace("Bearer ", "")
+
+        response = requests.get(f"{base_url}/api/events", timeout=5)
+        assert response.status_code == 401
+
+        def read_events(response, count):
+            events, event = [], {}
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("id: "):
+                    event["id"] = line[4:]
+                elif line.startswith("event: "):
+                    event["type"] = line[7:]
+                elif line.startswith("data: "):
+                    event["data"] = json.loads(line[6:])
+                elif line == "" and "type" in event:
+                    events.append(event)
+                    event = {}
+                    if len(events) == count:
+                        return events
+            return events
+
+        stream = requests.get(
+            f"{base_url}/api/events?projectId=p3&access_token={token}",
+            stream=True,
+            timeout=10
+        )
+        assert stream.status_code == 200
+        assert stream.headers["Content-Type"].startswith("text/event-stream")
+
+        def create(project_id):
+            response = requests.post(
+                f"{base_url}/api/defects",
+                json={"projectId": project_id, "title": "Событие SSE", "priority": "low"},
+                headers=admin_headers
+            )
+            assert response.status_code == 201
+            return response.json()["id"]
+
+        other_id = create("p4")
+        defect_id = create("p3")
+        requests.post(
+            f"{base_url}/api/defects/{defect_id}/comments",
+            json={"message": "Комментарий для SSE"},
+            headers=admin_headers
+        )
+
+        events = read_events(stream, 2)
+        stream.close()
+        assert [e["type"] for e in events] == ["created", "comment"]
+        assert events[0]["data"]["defectId"] == defect_id
+        assert events[1]["data"]["comment"]["message"] == "Комментарий для SSE"
+        assert all(e["data"]["defectId"] != other_id for e in events)
+
+        # Переподключение с Last-Event-ID получает пропущенные события
+        resumed = requests.get(
+            f"{base_url}/api/events?projectId=p3&access_token={token}",
+            headers={"Last-Event-ID": events[0]["id"]},
+            stream=True,
+            timeout=10
+        )
+        replay = read_events(resumed, 1)
+        resumed.close()
+        assert replay[0]["id"] == events[1]["id"]
+
+        print("✅ Поток событий работает корректно")
+
+    def test_integration_defect_event_log(self, base_url, auth_headers, admin_headers):
+        """Тест журнала событий дефектов: запись всех изменений, запросы за период, выгрузка"""
+        print("🔍 Тестируем журнал событий defect_events...")
+
+        started = datetime.now(timezone.utc).isoformat()
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={"projectId": "p1", "title": "Журнал событий", "priority": "low"},
+            headers=admin_headers
+        )
+        assert response.status_code == 201
+        defect_id = response.json()["id"]
+
+        response = requests.patch(
+            f"{base_url}/api/defects/{defect_id}",
+            json={"title": "Журнал событий (правка)"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        requests.patch(
+            f"{base_url}/api/defects/{defect_id}/status",
+            json={"status": "in_progress"},
+            headers=admin_headers
+        )
+        requests.post(
+            f"{base_url}/api/defects/{defect_id}/comments",
+            json={"message": "Комментарий в журнал"},
+            headers=admin_headers
+        )
+        response = requests.delete(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+        assert response.status_code == 204
+
+        # Журнал переживает удаление дефекта
+        response = requests.get(
+            f"{base_url}/api/admin/defect-events?defectId={defect_id}",
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        items = response.json()["items"]
+        assert [e["type"] for e in items] == ["created", "updated", "status", "comment", "deleted"]
+        assert [e["seq"] for e in items] == sorted(e["seq"] for e in items)
+        assert all(e["actor"] == "admin@example.com" for e in items)
+        assert items[1]["data"]["changes"]["title"] == "Журнал событий (правка)"
+        assert items[1]["data"]["previous"]["title"] == "Журнал событий"
+        assert items[2]["data"]["previous"] == "new"
+        assert items[4]["data"]["defect"]["title"] == "Журнал событий (правка)"
+
+        # Запрос за период и постраничное чтение
+        response = requests.get(
+            f"{base_url}/api/admin/defect-events",
+            params={"from": started, "type": "created,deleted", "limit": 1},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        page = response.json()
+        assert len(page["items"]) == 1 and page["nextCursor"]
+
+        response = requests.get(
+            f"{base_url}/api/admin/defect-events",
+            params={"to": started, "defectId": defect_id},
+            headers=admin_headers
+        )
+        assert response.json()["items"] == []
+
+        # Выгрузка NDJSON
+        response = requests.get(
+            f"{base_url}/api/admin/defect-events/export?defectId={defect_id}",
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+        exported = [json.loads(line) for line in response.text.splitlines() if line]
+        assert [e["seq"] for e in exported] == [e["seq"] for e in items]
+
+        response = requests.get(f"{base_url}/api/admin/defect-events?from=вчера", headers=admin_headers)
+        assert response.status_code == 400
+        response = requests.get(f"{base_url}/api/admin/defect-events", headers=auth_headers)
+        assert response.status_code == 403
+
+        print("✅ Журнал событий работает корректно")
+
+    def test_integration_prometheus_metrics(self, base_url, auth_headers, admin_headers):
+        """Тест метрик Prometheus: ответы по шаблонам маршрутов, запросы SQLite, память и кэши"""
+        print("🔍 Тестируем метрики Prometheus...")
+
+        for defect_id in ["d_001", "d_002", "d_missing"]:
+            requests.get(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+
+        response = requests.get(f"{base_url}/metrics", headers=admin_headers)
+        assert response.status_code == 200, f"Ошибка получения метрик: {response.status_code} - {response.text}"
+        assert response.headers["Content-Type"].startswith("text/plain; version=0.0.4")
+
+        text = response.text
+        # Один шаблон маршрута вместо отдельной серии на каждый id
+        assert 'route="/api/defects/:id"' in text
+        assert "d_missing" not in text
+        assert 'http_requests_total{method="GET",route="/api/defects/:id",status="404"}' in text
+        assert 'http_request_duration_seconds_bucket{method="GET",route="/api/defects/:id",le="+Inf"}' in text
+
+        for name in ["sqlite_query_duration_seconds_count", "sqlite_statement_info", "nodejs_heap_used_bytes",
+                     "nodejs_eventloop_lag_max_seconds", 'cache_hit_ratio{cache="sessions"}']:
+            assert name in text, f"Нет метрики {name}"
+
+        response = requests.get(f"{base_url}/metrics", headers=auth_headers)
+        assert response.status_code == 403
+
+        print("✅ Метрики Prometheus работают корректно")
+
+    def test_integration_slow_query_profiler(self, base_url, auth_headers, admin_headers):
+        """Тест профилировщика запросов: формы запросов, параметры, строки и планы"""
+        print("🔍 Тестируем профилировщик запросов...")
+
+        for params in [{"status": "new"}, {"status": "new", "priority": "high"}, {"search": "трещина"}]:
+            response = requests.get(f"{base_url}/api/defects", params=params, headers=admin_headers)
+            assert response.status_code == 200
+
+        response = requests.get(f"{base_url}/api/admin/slow-queries?limit=200&explain=1", headers=admin_headers)
+        assert response.status_code == 200, f"Ошибка получения профиля: {response.status_code} - {response.text}"
+
+        profile = response.json()
+        assert profile["thresholdMs"] == 1000
+        statements = profile["statements"]
+        assert statements, "Профилировщик не учел ни одного запроса"
+        totals = [s["totalMs"] for s in statements]
+        assert totals == sorted(totals, reverse=True), "Формы не отсортированы по суммарному времени"
+
+        defect_queries = [s for s in statements if "FROM defects" in s["sql"]]
+        assert defect_queries, "Нет запросов списка дефектов"
+        for statement in defect_queries:
+            assert statement["calls"] >= 1 and statement["meanMs"] >= 0
+            assert statement["plan"], f"Нет плана для {statement['sql']}"
+            # Значения параметров не раскрываются, только их типы
+            assert all("трещина" not in shape and "high" not in shape for shape in statement["params"])
+        assert all("'" not in s["sql"] for s in statements), "Литералы не заменены в форме запроса"
+
+        response = requests.get(f"{base_url}/api/admin/slow-queries?limit=0", headers=admin_headers)
+        assert response.status_code == 400
+        response = requests.get(f"{base_url}/api/admin/slow-queries", headers=auth_headers)
+        assert response.status_code == 403
+
+        print("✅ Профилировщик запросов работает корректно")
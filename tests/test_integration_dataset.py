@@ -0,0 +1,64 @@
+"""
+Интеграционные тесты генератора синтетического набора данных
+"""
+import json
+import sqlite3
+import subprocess
+from pathlib import Path
+
+from conftest import generate_dataset
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class TestIntegrationDataset:
+    """Проверка воспроизводимости и согласованности сгенерированного набора"""
+
+    def dump(self, db_path):
+        connection = sqlite3.connect(db_path)
+        try:
+            return [
+                connection.execute(sql).fetchall()
+                for sql in [
+                    "SELECT * FROM defects ORDER BY id",
+                    "SELECT defectId, action, timestamp, changes, reason, changedBy FROM defect_history ORDER BY defectId, timestamp, action",
+                    "SELECT * FROM defect_comments ORDER BY id",
+                    "SELECT * FROM defect_attachments ORDER BY id",
+                ]
+            ]
+        finally:
+            connection.close()
+
+    def test_integration_dataset_reproducible(self, tmp_path):
+        """Тест генерации: один seed дает одинаковые данные, повторный запуск дописывает недостающее"""
+        print("🔍 Проверяем воспроизводимость набора данных...")
+
+        first = tmp_path / "first.db"
+        summary = generate_dataset(first, 1500, seed=3, timeout=120)
+        assert summary["defects"] == 1500
+        assert summary["history"] > 0 and summary["comments"] > 0 and summary["attachments"] > 0
+
+        summary = generate_dataset(first, 2000, seed=3, timeout=120)
+        assert summary["skipped"] == 1500
+        assert summary["defects"] == 500
+
+        second = tmp_path / "second.db"
+        generate_dataset(second, 2000, seed=3, timeout=120)
+        assert self.dump(first) == self.dump(second), "Набор с тем же seed отличается"
+
+        connection = sqlite3.connect(first)
+        statuses = dict(connection.execute("SELECT status, COUNT(*) FROM defects GROUP BY status").fetchall())
+        matches = connection.execute("SELECT COUNT(*) FROM defects_fts WHERE defects_fts MATCH 'трещина'").fetchone()[0]
+        connection.close()
+        assert set(statuses) == {"new", "in_progress", "in_review", "closed", "cancelled"}
+        assert matches > 0, "Текст дефектов не попал в полнотекстовый индекс"
+
+        result = subprocess.run(
+            ["node", "server/db/rebuild-stats.js", str(first), "--check"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        assert json.loads(result.stdout)["mismatches"] == [], "Счетчики статистики не совпадают с данными"
+        print("✅ Набор данных воспроизводим и согласован")
@@ -0,0 +1,35 @@
+"""
+Интеграционные тесты планов запросов к базе данных
+"""
+import json
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class TestIntegrationQueryPlans:
+    """Проверка, что запросы списка дефектов используют индексы"""
+
+    def test_integration_list_queries_use_indexes(self, server_process):
+        """Тест отсутствия полного просмотра defects и сортировки страниц во временном B-дереве"""
+        print("🔍 Проверяем планы запросов списка дефектов...")
+
+        result = subprocess.run(
+            ["node", "server/db/check-query-plans.js", str(server_process.db_path)],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        assert result.returncode in [0, 1], f"Ошибка проверки планов: {result.stderr}"
+
+        report = json.loads(result.stdout)
+        assert report["checked"] > 0
+
+        failures = "\n".join(
+            f"{failure['name']}: {failure['plan']}" for failure in report["failures"]
+        )
+        assert not report["failures"], f"Запросы с полным просмотром таблицы или сортировкой страницы:\n{failures}"
+
+        print("✅ Все запросы списка дефектов используют индексы")
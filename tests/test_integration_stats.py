@@ -0,0 +1,97 @@
+"""
+Интеграционные тесты счетчиков статистики дефектов
+"""
+import json
+import subprocess
+from pathlib import Path
+
+import requests
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+
+class TestIntegrationStats:
+    """Проверка, что счетчики defect_counters совпадают с полным пересчетом"""
+
+    def check_counters(self, db_path):
+        result = subprocess.run(
+            ["node", "server/db/rebuild-stats.js", str(db_path), "--check"],
+            cwd=PROJECT_ROOT,
+            capture_output=True,
+            text=True,
+            timeout=60
+        )
+        assert result.returncode in [0, 1], f"Ошибка проверки счетчиков: {result.stderr}"
+        return json.loads(result.stdout)["mismatches"]
+
+    def test_integration_stats_counters_consistency(self, server_process, base_url, admin_headers):
+        """Тест согласованности счетчиков после создания, изменения и удаления дефектов"""
+        print("🔍 Проверяем согласованность счетчиков статистики...")
+
+        response = requests.get(f"{base_url}/api/defects/stats", headers=admin_headers)
+        assert response.status_code == 200
+        before = response.json()
+        etag = response.headers["ETag"]
+
+        response = requests.post(
+            f"{base_url}/api/defects",
+            json={
+                "projectId": "p1",
+                "title": "Проверка счетчиков статистики",
+                "priority": "critical",
+                "status": "new"
+            },
+            headers=admin_headers
+        )
+        assert response.status_code == 201, f"Ошибка создания дефекта: {response.text}"
+        defect_id = response.json()["id"]
+
+        response = requests.get(f"{base_url}/api/defects/stats", headers=admin_headers)
+        stats = response.json()
+        assert response.headers["ETag"] != etag
+        assert stats["byPriority"]["critical"] == before["byPriority"]["critical"] + 1
+        assert stats["byStatus"]["new"] == before["byStatus"]["new"] + 1
+
+        response = requests.patch(
+            f"{base_url}/api/defects/{defect_id}/status",
+            json={"status": "in_progress"},
+            headers=admin_headers
+        )
+        assert response.status_code == 200
+
+        response = requests.get(f"{base_url}/api/defects/stats?projectId=p1", headers=admin_headers)
+        assert response.status_code == 200
+        assert response.json()["byStatus"]["in_progress"] >= 1
+        assert not self.check_counters(server_process.db_path)
+
+        response = requests.delete(f"{base_url}/api/defects/{defect_id}", headers=admin_headers)
+        assert response.status_code in [200, 204]
+
+        response = requests.get(f"{base_url}/api/defects/stats", headers=admin_headers)
+        assert response.json() == before
+        assert not self.check_counters(server_process.db_path)
+
+        print("✅ Счетчики статистики совпадают с полным пересчетом")
+
+    def test_integration_stats_etag(self, base_url, auth_headers):
+        """Тест условного запроса статистики по ETag"""
+        print("🔍 Проверяем ETag статистики...")
+
+        response = requests.get(f"{base_url}/api/defects/stats", headers=auth_headers)
+        assert response.status_code == 200
+        etag = response.headers["ETag"]
+
+        response = requests.get(
+            f"{base_url}/api/defects/stats",
+            headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 304
+
+        response = requests.get(
+            f"{base_url}/api/defects/stats?projectId=p1",
+            headers={**auth_headers, "If-None-Match": etag}
+        )
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+
+        print("✅ ETag статистики работает корректно")